@@ -0,0 +1,107 @@
+import gc
+import hashlib
+import os
+import pickle
+
+import lox_ast
+import lox_keywords
+import lox_parser
+import lox_scanner
+import lox_token
+import lox_token_buffer
+import lox_token_type
+import resolver
+import resolving_parser
+
+
+MAGIC = b"LOXC"
+
+# The modules that decide what the resolved syntax tree of a source is. A
+# cache written by a different version of any of them is stale.
+FRONT_END = (
+    lox_ast,
+    lox_keywords,
+    lox_parser,
+    lox_scanner,
+    lox_token,
+    lox_token_buffer,
+    lox_token_type,
+    resolver,
+    resolving_parser,
+)
+
+_version = None
+
+
+def cache_path(filename):
+    """Where the cache for the script `filename` is kept, next to it."""
+    return os.path.splitext(filename)[0] + ".loxc"
+
+
+def load(path, source):
+    """Returns the resolved statements cached at `path` for `source`, or
+    None if there's no cache there or it was written for another source
+    or version of the front end.
+
+    The cache is a header of MAGIC, the version of the front end and the
+    hash of the source, followed by the pickled statements. Like a .pyc
+    file, it is trusted as much as the script next to it.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    header = cache_header(source)
+    if not data.startswith(header):
+        return None
+
+    # The tree is made of a great many objects and none of them are
+    # garbage, so don't have the collector go through them as they are
+    # created, which takes longer than creating them.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(memoryview(data)[len(header) :])
+    except Exception:
+        return None
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def store(path, source, statements):
+    """Caches the resolved `statements` of `source` at `path`, unless they
+    can't be written there, such as to a read-only directory, or are
+    nested too deeply to pickle."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+
+    try:
+        data = pickle.dumps(statements, pickle.HIGHEST_PROTOCOL)
+        with open(temporary, "wb") as f:
+            f.write(cache_header(source))
+            f.write(data)
+        os.replace(temporary, path)
+    except (OSError, RecursionError):
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+
+
+def cache_header(source):
+    return MAGIC + front_end_version() + hashlib.sha256(source.encode()).digest()
+
+
+def front_end_version():
+    global _version
+
+    if _version is None:
+        digest = hashlib.sha256()
+        for module in FRONT_END:
+            with open(module.__file__, "rb") as f:
+                digest.update(f.read())
+        _version = digest.digest()[:16]
+
+    return _version
@@ -0,0 +1,196 @@
+import io
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from lox import Lox, ENGINES
+from lox_scanner import LoxScanner
+from lox_parser import LoxParser
+from resolver import Resolver
+from resolving_parser import ResolvingParser
+
+
+BENCH_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "bench"
+)
+
+
+def bench_files(names):
+    if names:
+        return names
+
+    return sorted(
+        os.path.join(BENCH_DIR, name)
+        for name in os.listdir(BENCH_DIR)
+        if name.endswith(".lox")
+    )
+
+
+def time_script(source, engine, repeat):
+    best = None
+
+    for _ in range(repeat):
+        Lox.interpreter = ENGINES[engine]()
+        Lox.had_error = False
+        Lox.had_runtime_error = False
+
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            Lox.run(source)
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def best_time(function, repeat):
+    best = None
+
+    for _ in range(repeat):
+        Lox.had_error = False
+
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
+
+
+def parse_script(source, repeat):
+    """Returns the best times to scan source, to parse its tokens, to parse
+    and then resolve them and to do both in one pass, and the number of
+    tokens it has."""
+    scan, tokens = best_time(lambda: LoxScanner(source).scan_tokens(), repeat)
+    parse, _ = best_time(lambda: LoxParser(tokens).parse(), repeat)
+    resolve, _ = best_time(
+        lambda: Resolver().resolve(LoxParser(tokens).parse()), repeat
+    )
+    one_pass, _ = best_time(lambda: ResolvingParser(tokens).parse(), repeat)
+    return scan, parse, resolve, one_pass, len(tokens)
+
+
+def generated_source(statements):
+    """An expression-heavy program for measuring parser throughput."""
+    lines = []
+
+    for i in range(statements):
+        lines.append(
+            f"var v{i} = (a + {i}) * b - c / 2 < d == !e and f(x, y.z) or -g;"
+        )
+        lines.append(f"v{i} = o.p.q = v{i} + 1 >= {i} != (h(1)(2) or nil);")
+
+    return "\n".join(lines)
+
+
+def measure_tokens(source):
+    """Returns the memory the tokens of source take up, in bytes."""
+    tracemalloc.start()
+    tokens = LoxScanner(source).scan_tokens()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del tokens
+    return size
+
+
+def measure_script(source, engine):
+    """Returns the memory still allocated after running source, while the
+    interpreter and its globals are alive, and the peak, in bytes."""
+    Lox.interpreter = ENGINES[engine]()
+    Lox.had_error = False
+    Lox.had_runtime_error = False
+
+    tracemalloc.start()
+    with redirect_stdout(io.StringIO()):
+        Lox.run(source)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return retained, peak
+
+
+def main(argv):
+    repeat = 3
+    memory = False
+    parse = False
+    engines = []
+    names = []
+
+    for arg in argv:
+        if arg.startswith("--repeat="):
+            repeat = int(arg[len("--repeat=") :])
+        elif arg.startswith("--engine="):
+            engines.append(arg[len("--engine=") :])
+        elif arg == "--memory":
+            memory = True
+        elif arg == "--parse":
+            parse = True
+        elif arg == "--no-optimize":
+            Lox.optimize = False
+        else:
+            names.append(arg)
+
+    if parse:
+        parse_files(names, repeat, memory)
+        return
+
+    if not engines:
+        engines = list(ENGINES)
+
+    print(f"{'':<20}" + "".join(f"{engine:>12}" for engine in engines))
+
+    for filename in bench_files(names):
+        with open(filename) as f:
+            source = f.read()
+
+        row = f"{os.path.basename(filename):<20}"
+        for engine in engines:
+            if memory:
+                retained, peak = measure_script(source, engine)
+                row = row + f"{retained / 1024:8.0f} KiB"
+            else:
+                best = time_script(source, engine, repeat)
+                row = row + f"{best * 1000:9.1f} ms"
+        print(row)
+
+
+def parse_files(names, repeat, memory):
+    if memory:
+        print(f"{'':<20}{'source':>12}{'tokens':>12}")
+    else:
+        print(
+            f"{'':<20}{'scan':>12}{'parse':>12}{'+resolve':>12}{'one pass':>12}"
+            f"{'tokens/ms':>12}"
+        )
+
+    sources = []
+    for filename in bench_files(names):
+        with open(filename) as f:
+            sources.append((os.path.basename(filename), f.read()))
+
+    if not names:
+        sources.append(("generated", generated_source(2000)))
+
+    for name, source in sources:
+        if memory:
+            size = measure_tokens(source)
+            print(f"{name:<20}{len(source) / 1024:8.0f} KiB{size / 1024:8.0f} KiB")
+            continue
+
+        scan, parse, resolve, one_pass, count = parse_script(source, repeat)
+        print(
+            f"{name:<20}{scan * 1000:9.1f} ms{parse * 1000:9.1f} ms"
+            f"{resolve * 1000:9.1f} ms{one_pass * 1000:9.1f} ms"
+            f"{count / (parse * 1000):12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,705 @@
+from operator import add, ge, gt, le, lt, mul, sub, truediv
+
+from lox_ast import GetExpr
+from lox_token_type import LoxTokenType
+from lox_runtime_error import LoxRuntimeError
+from lox_function import LoxFunction
+from lox_class import LoxClass
+from lox_instance import LoxInstance
+from environment import Cell
+from resolver import Storage
+from interpreter import Interpreter
+from number_inference import NumberInference
+
+
+# Returned by compiled statements when a return statement ran. An
+# expression statement compiles to the expression itself, so the signal
+# has to be something no expression evaluates to.
+RETURNED = object()
+
+NUMBER_OPERATORS = {
+    LoxTokenType.MINUS: sub,
+    LoxTokenType.SLASH: truediv,
+    LoxTokenType.STAR: mul,
+    LoxTokenType.GREATER: gt,
+    LoxTokenType.GREATER_EQUAL: ge,
+    LoxTokenType.LESS: lt,
+    LoxTokenType.LESS_EQUAL: le,
+}
+# Operators NumberInference can prove only ever get numbers.
+UNCHECKED_OPERATORS = {**NUMBER_OPERATORS, LoxTokenType.PLUS: add}
+
+
+class ClosureInterpreter(Interpreter):
+    """Runs programs by compiling them to Python closures first.
+
+    Resolution, the global environment and every runtime object
+    (LoxFunction, LoxClass, LoxInstance, Cell) are shared with the
+    tree-walking Interpreter; only statement and expression evaluation is
+    replaced.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.compiler = ClosureCompiler(self)
+
+    def interpret(self, statements):
+        NumberInference().infer(statements)
+
+        try:
+            for statement in self.compiler.compile(statements):
+                statement(None, ())
+        except LoxRuntimeError as error:
+            from lox import Lox
+
+            Lox.runtime_error(error)
+
+    def execute_body(self, function, frame, upvalues):
+        for statement in function.compiled_body:
+            if statement(frame, upvalues) is RETURNED:
+                return True
+
+
+class ClosureCompiler:
+    """Turns resolved statements and expressions into Python closures.
+
+    Every compiled statement and expression is a function of the current
+    frame and upvalues. Compiled statements return RETURNED when a return
+    statement ran, with its value in the interpreter's return_value.
+    Anything that can be decided
+    from the syntax tree alone, such as an operator, a resolved variable
+    slot or a literal value, is decided here once instead of on every
+    evaluation.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+
+    def compile(self, statements):
+        return tuple(stmt.accept(self) for stmt in statements)
+
+    def compile_body(self, function):
+        # Kept on the declaration, where execute_body() finds it on a call.
+        function.compiled_body = self.compile(function.body)
+
+    def visit_block_stmt(self, stmt):
+        statements = self.compile(stmt.statements)
+        size = stmt.frame_size
+
+        if size is None:
+
+            def block_in_place(frame, upvalues):
+                for statement in statements:
+                    if statement(frame, upvalues) is RETURNED:
+                        return RETURNED
+
+            return block_in_place
+
+        def block(frame, upvalues):
+            inner = [None] * size
+            for statement in statements:
+                if statement(inner, ()) is RETURNED:
+                    return RETURNED
+
+        return block
+
+    def visit_class_stmt(self, stmt):
+        name = stmt.name
+        define = self.define(stmt)
+        initialize = self.initialize(stmt)
+        frame_size = stmt.frame_size
+        super_slot = getattr(stmt, "super_slot", None)
+        captures = tuple(self.capture(method) for method in stmt.methods)
+        superclass_expr = None
+        if stmt.superclass is not None:
+            superclass_expr = stmt.superclass.accept(self)
+
+        for method in stmt.methods:
+            self.compile_body(method)
+
+        def klass(frame, upvalues):
+            superclass = None
+            if superclass_expr is not None:
+                superclass = superclass_expr(frame, upvalues)
+                if not isinstance(superclass, LoxClass):
+                    raise LoxRuntimeError(
+                        stmt.superclass.name, "Superclass must be a class."
+                    )
+
+            define(frame, None)
+
+            method_frame = frame
+            if frame_size is not None:
+                method_frame = [None] * frame_size
+
+            if superclass is not None:
+                method_frame[super_slot] = superclass
+
+            methods = {}
+            for method, capture in zip(stmt.methods, captures):
+                methods[method.name.lexeme] = LoxFunction(
+                    method,
+                    capture(method_frame, upvalues),
+                    method.name.lexeme == "init",
+                )
+
+            initialize(frame, LoxClass(name.lexeme, superclass, methods))
+
+        return klass
+
+    def visit_expression_stmt(self, stmt):
+        return stmt.expression.accept(self)
+
+    def visit_function_stmt(self, stmt):
+        define = self.define(stmt)
+        initialize = self.initialize(stmt)
+        capture = self.capture(stmt)
+        self.compile_body(stmt)
+
+        def function(frame, upvalues):
+            define(frame, None)
+            initialize(frame, LoxFunction(stmt, capture(frame, upvalues), False))
+
+        return function
+
+    def visit_if_stmt(self, stmt):
+        condition = stmt.condition.accept(self)
+        then_branch = stmt.then_branch.accept(self)
+
+        if stmt.else_branch is None:
+
+            def if_then(frame, upvalues):
+                value = condition(frame, upvalues)
+                if value is not None and value is not False:
+                    return then_branch(frame, upvalues)
+
+            return if_then
+
+        else_branch = stmt.else_branch.accept(self)
+
+        def if_then_else(frame, upvalues):
+            value = condition(frame, upvalues)
+            if value is not None and value is not False:
+                return then_branch(frame, upvalues)
+            else:
+                return else_branch(frame, upvalues)
+
+        return if_then_else
+
+    def visit_print_stmt(self, stmt):
+        expression = stmt.expression.accept(self)
+        stringify = self.interpreter.stringify
+
+        def print_(frame, upvalues):
+            print(stringify(expression(frame, upvalues)))
+
+        return print_
+
+    def visit_return_stmt(self, stmt):
+        interpreter = self.interpreter
+
+        if stmt.value is None:
+
+            def return_nil(frame, upvalues):
+                interpreter.return_value = None
+                return RETURNED
+
+            return return_nil
+
+        value = stmt.value.accept(self)
+
+        def return_(frame, upvalues):
+            interpreter.return_value = value(frame, upvalues)
+            return RETURNED
+
+        return return_
+
+    def visit_var_stmt(self, stmt):
+        define = self.define(stmt)
+
+        if stmt.initializer is None:
+
+            def var_nil(frame, upvalues):
+                define(frame, None)
+
+            return var_nil
+
+        initializer = stmt.initializer.accept(self)
+        slot = stmt.slot
+
+        if stmt.storage is Storage.LOCAL:
+
+            def var_local(frame, upvalues):
+                frame[slot] = initializer(frame, upvalues)
+
+            return var_local
+
+        def var(frame, upvalues):
+            define(frame, initializer(frame, upvalues))
+
+        return var
+
+    def visit_for_stmt(self, stmt):
+        initializer = None
+        if stmt.initializer is not None:
+            initializer = stmt.initializer.accept(self)
+        condition = stmt.condition.accept(self)
+        increment = None
+        if stmt.increment is not None:
+            increment = stmt.increment.accept(self)
+        body = stmt.body.accept(self)
+        size = stmt.frame_size
+
+        def loop(frame, upvalues):
+            value = condition(frame, upvalues)
+            while value is not None and value is not False:
+                if body(frame, upvalues) is RETURNED:
+                    return RETURNED
+                if increment is not None:
+                    increment(frame, upvalues)
+                value = condition(frame, upvalues)
+
+        run = loop
+        if stmt.counted:
+            # See Interpreter.counted_loop().
+            slot = stmt.initializer.slot
+            bound_value = stmt.condition.right.accept(self)
+            compare = NUMBER_OPERATORS[stmt.condition.operator.ttype]
+            step = stmt.increment.value.right.value
+            if stmt.increment.value.operator.ttype == LoxTokenType.MINUS:
+                step = -step
+
+            def counted_loop(frame, upvalues):
+                counter = frame[slot]
+                bound = bound_value(frame, upvalues)
+                if type(counter) is not float or type(bound) is not float:
+                    return loop(frame, upvalues)
+
+                while compare(counter, bound):
+                    frame[slot] = counter
+                    if body(frame, upvalues) is RETURNED:
+                        return RETURNED
+                    counter = counter + step
+
+                frame[slot] = counter
+
+            run = counted_loop
+
+        def for_(frame, upvalues):
+            if initializer is not None:
+                initializer(frame, upvalues)
+            return run(frame, upvalues)
+
+        if size is None:
+            return for_
+
+        return lambda frame, upvalues: for_([None] * size, ())
+
+    def visit_while_stmt(self, stmt):
+        condition = stmt.condition.accept(self)
+        body = stmt.body.accept(self)
+
+        def while_(frame, upvalues):
+            value = condition(frame, upvalues)
+            while value is not None and value is not False:
+                if body(frame, upvalues) is RETURNED:
+                    return RETURNED
+                value = condition(frame, upvalues)
+
+        return while_
+
+    def visit_assign_expr(self, expr):
+        value = expr.value.accept(self)
+        name = expr.name
+        storage = expr.storage
+        slot = expr.slot
+
+        if storage is Storage.GLOBAL:
+            globals_ = self.interpreter._globals
+            values = globals_.values
+
+            def assign_global(frame, upvalues):
+                nonlocal slot
+                result = value(frame, upvalues)
+                if slot is None:
+                    slot = globals_.slot(name)
+                values[slot] = result
+                return result
+
+            return assign_global
+
+        if storage is Storage.LOCAL:
+
+            def assign_local(frame, upvalues):
+                result = value(frame, upvalues)
+                frame[slot] = result
+                return result
+
+            return assign_local
+
+        if storage is Storage.CELL:
+
+            def assign_cell(frame, upvalues):
+                result = value(frame, upvalues)
+                frame[slot].value = result
+                return result
+
+            return assign_cell
+
+        def assign_upvalue(frame, upvalues):
+            result = value(frame, upvalues)
+            upvalues[slot].value = result
+            return result
+
+        return assign_upvalue
+
+    def visit_binary_expr(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        operator = expr.operator
+        ttype = operator.ttype
+
+        if ttype in UNCHECKED_OPERATORS and expr.numeric:
+            number_operator = UNCHECKED_OPERATORS[ttype]
+
+            def unchecked(frame, upvalues):
+                return number_operator(left(frame, upvalues), right(frame, upvalues))
+
+            return unchecked
+
+        if ttype == LoxTokenType.PLUS:
+
+            def add(frame, upvalues):
+                a = left(frame, upvalues)
+                b = right(frame, upvalues)
+                if isinstance(a, float) and isinstance(b, float):
+                    return a + b
+                if isinstance(a, str) and isinstance(b, str):
+                    return a + b
+                raise LoxRuntimeError(
+                    operator, "Operands must be two numbers or two strings."
+                )
+
+            return add
+
+        if ttype == LoxTokenType.EQUAL_EQUAL:
+            return lambda frame, upvalues: left(frame, upvalues) == right(frame, upvalues)
+
+        if ttype == LoxTokenType.BANG_EQUAL:
+            return lambda frame, upvalues: not left(frame, upvalues) == right(frame, upvalues)
+
+        number_operator = NUMBER_OPERATORS[ttype]
+
+        def arithmetic(frame, upvalues):
+            a = left(frame, upvalues)
+            b = right(frame, upvalues)
+            if isinstance(a, float) and isinstance(b, float):
+                return number_operator(a, b)
+            raise LoxRuntimeError(operator, "Operands must be numbers.")
+
+        return arithmetic
+
+    def visit_call_expr(self, expr):
+        if expr.callee.__class__ is GetExpr:
+            return self.invoke(expr)
+
+        callee = expr.callee.accept(self)
+        call_value = self.call_value(expr)
+
+        def call(frame, upvalues):
+            return call_value(callee(frame, upvalues), frame, upvalues)
+
+        return call
+
+    def call_value(self, expr):
+        """Compiles calling a value with the call's arguments."""
+        arguments = tuple(argument.accept(self) for argument in expr.arguments)
+        paren = expr.paren
+        interpreter = self.interpreter
+        argc = len(arguments)
+
+        def call_value(function, frame, upvalues):
+            if not hasattr(function, "call"):
+                raise LoxRuntimeError(paren, "Can only call functions and classes.")
+
+            values = [argument(frame, upvalues) for argument in arguments]
+
+            if argc != function.arity():
+                raise LoxRuntimeError(
+                    paren, f"Expected {function.arity()} arguments but got {argc}."
+                )
+
+            return function.call(interpreter, values)
+
+        return call_value
+
+    def invoke(self, expr):
+        """Compiles a method call that doesn't bind the method first.
+
+        The method found is cached along with the receiver's class.
+        Anything other than a method of an instance is called the usual
+        way.
+        """
+        objekt = expr.callee.objekt.accept(self)
+        name = expr.callee.name
+        lexeme = name.lexeme
+        arguments = tuple(argument.accept(self) for argument in expr.arguments)
+        call_value = self.call_value(expr)
+        paren = expr.paren
+        interpreter = self.interpreter
+        argc = len(arguments)
+        cached_shape = None
+        cached_method = None
+
+        def invoke(frame, upvalues):
+            nonlocal cached_shape, cached_method
+            instance = objekt(frame, upvalues)
+
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties.")
+
+            shape = instance.shape
+            if shape is cached_shape:
+                method = cached_method
+            else:
+                slot = shape.slots.get(lexeme)
+                if slot is not None:
+                    return call_value(instance.values[slot], frame, upvalues)
+
+                method = shape.klass.find_method(lexeme)
+                if method is None:
+                    raise LoxRuntimeError(name, f"Undefined property '{lexeme}'.")
+                cached_shape = shape
+                cached_method = method
+
+            values = [argument(frame, upvalues) for argument in arguments]
+
+            if argc != method.arity():
+                raise LoxRuntimeError(
+                    paren, f"Expected {method.arity()} arguments but got {argc}."
+                )
+
+            return method.invoke(interpreter, instance, values)
+
+        return invoke
+
+    def visit_get_expr(self, expr):
+        objekt = expr.objekt.accept(self)
+        name = expr.name
+
+        lexeme = name.lexeme
+        cached_shape = None
+        cached_slot = None
+
+        def get(frame, upvalues):
+            nonlocal cached_shape, cached_slot
+            instance = objekt(frame, upvalues)
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have properties.")
+
+            shape = instance.shape
+            if shape is cached_shape:
+                return instance.values[cached_slot]
+
+            slot = shape.slots.get(lexeme)
+            if slot is None:
+                return instance.get(name)
+
+            cached_shape = shape
+            cached_slot = slot
+            return instance.values[slot]
+
+        return get
+
+    def visit_grouping_expr(self, expr):
+        return expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr):
+        value = expr.value
+        return lambda frame, upvalues: value
+
+    def visit_logical_expr(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+
+        if expr.operator.ttype == LoxTokenType.OR:
+
+            def or_(frame, upvalues):
+                value = left(frame, upvalues)
+                if value is not None and value is not False:
+                    return value
+                return right(frame, upvalues)
+
+            return or_
+
+        def and_(frame, upvalues):
+            value = left(frame, upvalues)
+            if value is None or value is False:
+                return value
+            return right(frame, upvalues)
+
+        return and_
+
+    def visit_set_expr(self, expr):
+        objekt = expr.objekt.accept(self)
+        value = expr.value.accept(self)
+        name = expr.name
+
+        lexeme = name.lexeme
+        cached_shape = None
+        cached_slot = None
+        cached_new_shape = None
+
+        def set_(frame, upvalues):
+            nonlocal cached_shape, cached_slot, cached_new_shape
+            instance = objekt(frame, upvalues)
+
+            if not isinstance(instance, LoxInstance):
+                raise LoxRuntimeError(name, "Only instances have fields.")
+
+            result = value(frame, upvalues)
+
+            shape = instance.shape
+            if shape is not cached_shape:
+                slot = shape.slots.get(lexeme)
+                if slot is None:
+                    cached_slot = len(shape.slots)
+                    cached_new_shape = shape.with_field(lexeme)
+                else:
+                    cached_slot = slot
+                    cached_new_shape = shape
+                cached_shape = shape
+
+            if cached_new_shape is shape:
+                instance.values[cached_slot] = result
+            else:
+                instance.shape = cached_new_shape
+                instance.values.append(result)
+
+            return result
+
+        return set_
+
+    def visit_super_expr(self, expr):
+        slot = expr.slot
+        this_slot = expr.this_slot
+        this_is_local = expr.this_storage is Storage.LOCAL
+        method_name = expr.method
+
+        def super_(frame, upvalues):
+            superclass = upvalues[slot]
+            if this_is_local:
+                instance = frame[this_slot]
+            else:
+                instance = upvalues[this_slot]
+            method = superclass.find_method(method_name.lexeme)
+
+            if method is None:
+                raise LoxRuntimeError(
+                    method_name, f"Undefined property '{method_name.lexeme}'."
+                )
+
+            return method.bind(instance)
+
+        return super_
+
+    def visit_this_expr(self, expr):
+        return self.variable(expr, expr.keyword)
+
+    def visit_unary_expr(self, expr):
+        right = expr.right.accept(self)
+        operator = expr.operator
+
+        if operator.ttype == LoxTokenType.MINUS and expr.numeric:
+            return lambda frame, upvalues: -right(frame, upvalues)
+
+        if operator.ttype == LoxTokenType.MINUS:
+
+            def negate(frame, upvalues):
+                value = right(frame, upvalues)
+                if isinstance(value, float):
+                    return -value
+                raise LoxRuntimeError(operator, "Operand must be a number.")
+
+            return negate
+
+        def not_(frame, upvalues):
+            value = right(frame, upvalues)
+            return value is None or value is False
+
+        return not_
+
+    def visit_variable_expr(self, expr):
+        return self.variable(expr, expr.name)
+
+    def variable(self, expr, name):
+        storage = expr.storage
+        slot = expr.slot
+
+        if storage is Storage.GLOBAL:
+            globals_ = self.interpreter._globals
+            values = globals_.values
+
+            def get_global(frame, upvalues):
+                nonlocal slot
+                if slot is None:
+                    slot = globals_.slot(name)
+                return values[slot]
+
+            return get_global
+
+        if storage is Storage.LOCAL:
+            return lambda frame, upvalues: frame[slot]
+
+        if storage is Storage.UPVALUE:
+            return lambda frame, upvalues: upvalues[slot]
+
+        if storage is Storage.CELL:
+            return lambda frame, upvalues: frame[slot].value
+
+        return lambda frame, upvalues: upvalues[slot].value
+
+    def define(self, stmt):
+        """Returns a function that defines the variable stmt declares."""
+        slot = stmt.slot
+
+        if stmt.storage is Storage.GLOBAL:
+            name = stmt.name.lexeme
+            globals_ = self.interpreter._globals
+            return lambda frame, value: globals_.define(name, value)
+
+        if stmt.storage is Storage.CELL:
+
+            def define_cell(frame, value):
+                frame[slot] = Cell(value)
+
+            return define_cell
+
+        def define_local(frame, value):
+            frame[slot] = value
+
+        return define_local
+
+    def initialize(self, stmt):
+        """Returns a function that sets the variable define() just created."""
+        if stmt.storage is not Storage.CELL:
+            return self.define(stmt)
+
+        slot = stmt.slot
+
+        def initialize_cell(frame, value):
+            frame[slot].value = value
+
+        return initialize_cell
+
+    def capture(self, function):
+        """Returns a function that builds the upvalues of a closure."""
+        captures = function.captures
+
+        def capture(frame, upvalues):
+            return tuple(
+                frame[index] if is_local else upvalues[index]
+                for is_local, index in captures
+            )
+
+        return capture
@@ -0,0 +1,447 @@
+from lox_ast import GetExpr, SuperExpr
+from lox_chunk import Function, OpCode
+from lox_token_type import LoxTokenType
+from resolver import FunctionType
+
+
+BINARY_OPCODES = {
+    LoxTokenType.PLUS: OpCode.ADD,
+    LoxTokenType.MINUS: OpCode.SUBTRACT,
+    LoxTokenType.STAR: OpCode.MULTIPLY,
+    LoxTokenType.SLASH: OpCode.DIVIDE,
+    LoxTokenType.GREATER: OpCode.GREATER,
+    LoxTokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    LoxTokenType.LESS: OpCode.LESS,
+    LoxTokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    LoxTokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    LoxTokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+}
+
+
+class Local:
+    def __init__(self, name, depth):
+        self.name = name
+        # -1 until the variable's initializer has been compiled.
+        self.depth = depth
+        self.is_captured = False
+
+
+class FunctionState:
+    """Per-function compiler state, chained to the enclosing function."""
+
+    def __init__(self, enclosing, function, fntype):
+        self.enclosing = enclosing
+        self.function = function
+        self.fntype = fntype
+        self.upvalues = []
+        self.scope_depth = 0
+
+        # Slot zero holds the callee, or the receiver for methods.
+        if fntype == FunctionType.METHOD or fntype == FunctionType.INITIALIZER:
+            self.locals = [Local("this", 0)]
+        else:
+            self.locals = [Local("", 0)]
+
+
+class Compiler:
+    """Compiles a resolved program into bytecode for the VM.
+
+    The Resolver has already reported every scope error, so the compiler
+    only has to work out where each variable lives: a stack slot in the
+    current frame, an upvalue captured from an enclosing function, or a
+    global.
+    """
+
+    def __init__(self):
+        self.state = None
+        self.line = 0
+
+    def compile(self, statements):
+        self.state = FunctionState(None, Function(None, 0), FunctionType.NONE)
+
+        for stmt in statements:
+            self.compile_stmt(stmt)
+
+        self.emit_return()
+        return self.state.function
+
+    def compile_stmt(self, stmt):
+        stmt.accept(self)
+
+    def compile_expr(self, expr):
+        expr.accept(self)
+
+    def visit_block_stmt(self, stmt):
+        self.begin_scope()
+        for statement in stmt.statements:
+            self.compile_stmt(statement)
+        self.end_scope()
+
+    def visit_class_stmt(self, stmt):
+        self.line = stmt.name.line
+        name_constant = self.make_constant(stmt.name.lexeme)
+        self.declare_variable(stmt.name.lexeme)
+        self.emit(OpCode.CLASS, name_constant)
+        self.define_variable(stmt.name.lexeme)
+
+        if stmt.superclass is not None:
+            self.compile_expr(stmt.superclass)
+            self.begin_scope()
+            self.add_local("super")
+            self.mark_initialized()
+
+            self.get_variable(stmt.name.lexeme)
+            self.line = stmt.superclass.name.line
+            self.emit(OpCode.INHERIT)
+
+        self.get_variable(stmt.name.lexeme)
+
+        for method in stmt.methods:
+            fntype = FunctionType.METHOD
+            if method.name.lexeme == "init":
+                fntype = FunctionType.INITIALIZER
+
+            self.function(method, fntype)
+            self.emit(OpCode.METHOD, self.make_constant(method.name.lexeme))
+
+        self.emit(OpCode.POP)
+
+        if stmt.superclass is not None:
+            self.end_scope()
+
+    def visit_expression_stmt(self, stmt):
+        self.compile_expr(stmt.expression)
+        self.emit(OpCode.POP)
+
+    def visit_function_stmt(self, stmt):
+        self.line = stmt.name.line
+        self.declare_variable(stmt.name.lexeme)
+        # A function may refer to itself, so its name is usable before its
+        # body is compiled.
+        self.mark_initialized()
+        self.function(stmt, FunctionType.FUNCTION)
+        self.define_variable(stmt.name.lexeme)
+
+    def visit_if_stmt(self, stmt):
+        self.compile_expr(stmt.condition)
+
+        then_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compile_stmt(stmt.then_branch)
+        else_jump = self.emit_jump(OpCode.JUMP)
+
+        self.patch_jump(then_jump)
+        self.emit(OpCode.POP)
+
+        if stmt.else_branch is not None:
+            self.compile_stmt(stmt.else_branch)
+
+        self.patch_jump(else_jump)
+
+    def visit_print_stmt(self, stmt):
+        self.compile_expr(stmt.expression)
+        self.emit(OpCode.PRINT)
+
+    def visit_return_stmt(self, stmt):
+        self.line = stmt.keyword.line
+
+        if stmt.value is None:
+            self.emit_return()
+        else:
+            self.compile_expr(stmt.value)
+            self.emit(OpCode.RETURN)
+
+    def visit_var_stmt(self, stmt):
+        self.line = stmt.name.line
+        self.declare_variable(stmt.name.lexeme)
+
+        if stmt.initializer is not None:
+            self.compile_expr(stmt.initializer)
+        else:
+            self.emit(OpCode.NIL)
+
+        self.define_variable(stmt.name.lexeme)
+
+    def visit_for_stmt(self, stmt):
+        self.begin_scope()
+        if stmt.initializer is not None:
+            self.compile_stmt(stmt.initializer)
+
+        loop_start = len(self.chunk().code)
+        self.compile_expr(stmt.condition)
+
+        exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compile_stmt(stmt.body)
+        if stmt.increment is not None:
+            self.compile_expr(stmt.increment)
+            self.emit(OpCode.POP)
+        self.emit(OpCode.JUMP, loop_start)
+
+        self.patch_jump(exit_jump)
+        self.emit(OpCode.POP)
+        self.end_scope()
+
+    def visit_while_stmt(self, stmt):
+        loop_start = len(self.chunk().code)
+        self.compile_expr(stmt.condition)
+
+        exit_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+        self.emit(OpCode.POP)
+        self.compile_stmt(stmt.body)
+        self.emit(OpCode.JUMP, loop_start)
+
+        self.patch_jump(exit_jump)
+        self.emit(OpCode.POP)
+
+    def visit_assign_expr(self, expr):
+        self.compile_expr(expr.value)
+        self.line = expr.name.line
+        self.set_variable(expr.name.lexeme)
+
+    def visit_binary_expr(self, expr):
+        self.compile_expr(expr.left)
+        self.compile_expr(expr.right)
+        self.line = expr.operator.line
+        self.emit(BINARY_OPCODES[expr.operator.ttype])
+
+    def visit_call_expr(self, expr):
+        callee = expr.callee
+
+        # Method calls skip creating a bound method object, unless the
+        # method name and the call are on different lines. A missing
+        # method is reported on the line of its name and a wrong number
+        # of arguments on the line of the call, and an instruction only
+        # has one line.
+        if isinstance(callee, GetExpr) and callee.name.line == expr.paren.line:
+            self.compile_expr(callee.objekt)
+            for argument in expr.arguments:
+                self.compile_expr(argument)
+            self.line = expr.paren.line
+            self.emit(
+                OpCode.INVOKE,
+                self.make_constant(callee.name.lexeme),
+                len(expr.arguments),
+            )
+        elif isinstance(callee, SuperExpr) and callee.method.line == expr.paren.line:
+            self.line = callee.keyword.line
+            self.get_variable("this")
+            for argument in expr.arguments:
+                self.compile_expr(argument)
+            self.get_variable("super")
+            self.line = expr.paren.line
+            self.emit(
+                OpCode.SUPER_INVOKE,
+                self.make_constant(callee.method.lexeme),
+                len(expr.arguments),
+            )
+        else:
+            self.compile_expr(callee)
+            for argument in expr.arguments:
+                self.compile_expr(argument)
+            self.line = expr.paren.line
+            self.emit(OpCode.CALL, len(expr.arguments))
+
+    def visit_get_expr(self, expr):
+        self.compile_expr(expr.objekt)
+        self.line = expr.name.line
+        self.emit(OpCode.GET_PROPERTY, self.make_constant(expr.name.lexeme))
+
+    def visit_grouping_expr(self, expr):
+        self.compile_expr(expr.expression)
+
+    def visit_literal_expr(self, expr):
+        if expr.value is None:
+            self.emit(OpCode.NIL)
+        elif expr.value is True:
+            self.emit(OpCode.TRUE)
+        elif expr.value is False:
+            self.emit(OpCode.FALSE)
+        else:
+            self.emit(OpCode.CONSTANT, self.make_constant(expr.value))
+
+    def visit_logical_expr(self, expr):
+        self.compile_expr(expr.left)
+
+        if expr.operator.ttype == LoxTokenType.OR:
+            else_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+            end_jump = self.emit_jump(OpCode.JUMP)
+            self.patch_jump(else_jump)
+            self.emit(OpCode.POP)
+            self.compile_expr(expr.right)
+            self.patch_jump(end_jump)
+        else:
+            end_jump = self.emit_jump(OpCode.JUMP_IF_FALSE)
+            self.emit(OpCode.POP)
+            self.compile_expr(expr.right)
+            self.patch_jump(end_jump)
+
+    def visit_set_expr(self, expr):
+        self.compile_expr(expr.objekt)
+        self.compile_expr(expr.value)
+        self.line = expr.name.line
+        self.emit(OpCode.SET_PROPERTY, self.make_constant(expr.name.lexeme))
+
+    def visit_super_expr(self, expr):
+        self.line = expr.keyword.line
+        self.get_variable("this")
+        self.get_variable("super")
+        self.line = expr.method.line
+        self.emit(OpCode.GET_SUPER, self.make_constant(expr.method.lexeme))
+
+    def visit_this_expr(self, expr):
+        self.line = expr.keyword.line
+        self.get_variable("this")
+
+    def visit_unary_expr(self, expr):
+        self.compile_expr(expr.right)
+        self.line = expr.operator.line
+
+        if expr.operator.ttype == LoxTokenType.MINUS:
+            self.emit(OpCode.NEGATE)
+        else:
+            self.emit(OpCode.NOT)
+
+    def visit_variable_expr(self, expr):
+        self.line = expr.name.line
+        self.get_variable(expr.name.lexeme)
+
+    def function(self, stmt, fntype):
+        function = Function(stmt.name.lexeme, len(stmt.params))
+        state = FunctionState(self.state, function, fntype)
+        self.state = state
+        self.begin_scope()
+
+        for param in stmt.params:
+            self.add_local(param.lexeme)
+            self.mark_initialized()
+
+        for statement in stmt.body:
+            self.compile_stmt(statement)
+
+        self.emit_return()
+        self.state = state.enclosing
+
+        function.upvalue_count = len(state.upvalues)
+        self.emit(OpCode.CLOSURE, self.make_constant(function))
+        for index, is_local in state.upvalues:
+            self.emit(1 if is_local else 0, index)
+
+    def get_variable(self, name):
+        slot = self.resolve_local(self.state, name)
+        if slot != -1:
+            self.emit(OpCode.GET_LOCAL, slot)
+            return
+
+        index = self.resolve_upvalue(self.state, name)
+        if index != -1:
+            self.emit(OpCode.GET_UPVALUE, index)
+            return
+
+        self.emit(OpCode.GET_GLOBAL, self.make_constant(name))
+
+    def set_variable(self, name):
+        slot = self.resolve_local(self.state, name)
+        if slot != -1:
+            self.emit(OpCode.SET_LOCAL, slot)
+            return
+
+        index = self.resolve_upvalue(self.state, name)
+        if index != -1:
+            self.emit(OpCode.SET_UPVALUE, index)
+            return
+
+        self.emit(OpCode.SET_GLOBAL, self.make_constant(name))
+
+    def resolve_local(self, state, name):
+        for i in range(len(state.locals) - 1, -1, -1):
+            local = state.locals[i]
+            if local.name == name and local.depth != -1:
+                return i
+
+        return -1
+
+    def resolve_upvalue(self, state, name):
+        if state.enclosing is None:
+            return -1
+
+        local = self.resolve_local(state.enclosing, name)
+        if local != -1:
+            state.enclosing.locals[local].is_captured = True
+            return self.add_upvalue(state, local, True)
+
+        upvalue = self.resolve_upvalue(state.enclosing, name)
+        if upvalue != -1:
+            return self.add_upvalue(state, upvalue, False)
+
+        return -1
+
+    def add_upvalue(self, state, index, is_local):
+        upvalue = (index, is_local)
+        if upvalue in state.upvalues:
+            return state.upvalues.index(upvalue)
+
+        state.upvalues.append(upvalue)
+        return len(state.upvalues) - 1
+
+    def add_local(self, name):
+        self.state.locals.append(Local(name, -1))
+
+    def declare_variable(self, name):
+        if self.state.scope_depth == 0:
+            return
+
+        self.add_local(name)
+
+    def define_variable(self, name):
+        if self.state.scope_depth > 0:
+            self.mark_initialized()
+            return
+
+        self.emit(OpCode.DEFINE_GLOBAL, self.make_constant(name))
+
+    def mark_initialized(self):
+        if self.state.scope_depth == 0:
+            return
+
+        self.state.locals[-1].depth = self.state.scope_depth
+
+    def begin_scope(self):
+        self.state.scope_depth = self.state.scope_depth + 1
+
+    def end_scope(self):
+        state = self.state
+        state.scope_depth = state.scope_depth - 1
+
+        while len(state.locals) > 0 and state.locals[-1].depth > state.scope_depth:
+            if state.locals[-1].is_captured:
+                self.emit(OpCode.CLOSE_UPVALUE)
+            else:
+                self.emit(OpCode.POP)
+            state.locals.pop()
+
+    def chunk(self):
+        return self.state.function.chunk
+
+    def make_constant(self, value):
+        return self.chunk().add_constant(value)
+
+    def emit(self, *units):
+        chunk = self.chunk()
+        for unit in units:
+            chunk.write(unit, self.line)
+
+    def emit_jump(self, op):
+        self.emit(op, 0)
+        return len(self.chunk().code) - 1
+
+    def patch_jump(self, operand):
+        self.chunk().code[operand] = len(self.chunk().code)
+
+    def emit_return(self):
+        if self.state.fntype == FunctionType.INITIALIZER:
+            self.emit(OpCode.GET_LOCAL, 0)
+        else:
+            self.emit(OpCode.NIL)
+
+        self.emit(OpCode.RETURN)
@@ -1,44 +1,53 @@
 from lox_runtime_error import LoxRuntimeError
 
 
-class Environment:
-    def __init__(self, enclosing=None):
-        self.values = {}
-        self.enclosing = enclosing
+class Cell:
+    """Holds a local variable that closures capture and that can change
+    after they do."""
+
+    def __init__(self, value):
+        self.value = value
 
-    def define(self, name, value):
-        self.values[name] = value
 
-    def get(self, name):
-        if name.lexeme in self.values:
-            return self.values[name.lexeme]
+class GlobalEnvironment:
+    """The global scope.
 
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
+    Globals are late bound: a function may refer to a global that is only
+    defined after the function is. Each global gets a slot in `values` the
+    first time it is defined. Slots are never reused, and redefining a
+    global overwrites its existing slot, so a use site can cache the slot
+    once the lookup by name succeeds.
+    """
 
-        raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+    def __init__(self):
+        self.slots = {}
+        self.values = []
+
+    def define(self, name, value):
+        slot = self.slots.get(name)
 
-    def assign(self, name, value):
-        if name.lexeme in self.values:
-            self.values[name.lexeme] = value
-            return
+        if slot is None:
+            self.slots[name] = len(self.values)
+            self.values.append(value)
+        else:
+            self.values[slot] = value
 
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
+    def slot(self, name):
+        slot = self.slots.get(name.lexeme)
 
-        raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
+        if slot is None:
+            raise LoxRuntimeError(name, f"Undefined variable {name.lexeme}.")
 
-    def get_at(self, distance, name):
-        return self.ancestor(distance).values.get(name)
+        return slot
 
-    def assign_at(self, distance, name, value):
-        self.ancestor(distance).values[name.lexeme] = value
+    def get(self, name, site):
+        if site.slot is None:
+            site.slot = self.slot(name)
 
-    def ancestor(self, distance):
-        environment = self
+        return self.values[site.slot]
 
-        for i in range(distance):
-            environment = environment.enclosing
+    def assign(self, name, site, value):
+        if site.slot is None:
+            site.slot = self.slot(name)
 
-        return environment
+        self.values[site.slot] = value
@@ -0,0 +1,220 @@
+import operator
+from collections import Counter
+
+from lox_token_type import LoxTokenType
+from lox_ast import (
+    LiteralExpr,
+    VariableExpr,
+    GetExpr,
+    ThisExpr,
+    BinaryExpr,
+    IncrementLocalExpr,
+    CompareLocalExpr,
+    FieldUpdateExpr,
+)
+from resolver import Storage
+
+
+COMPARISONS = {
+    LoxTokenType.GREATER: operator.gt,
+    LoxTokenType.GREATER_EQUAL: operator.ge,
+    LoxTokenType.LESS: operator.lt,
+    LoxTokenType.LESS_EQUAL: operator.le,
+}
+SIGNS = {LoxTokenType.PLUS: 1.0, LoxTokenType.MINUS: -1.0}
+
+
+class Fuser:
+    """Replaces common idioms in a resolved syntax tree with fused nodes
+    the tree interpreter runs in a single visit.
+
+    The fused nodes are variants of the node they replace, with the
+    operands the idiom is made of stored on the node:
+
+    - IncrementLocalExpr: `i = i + 1` or `i = i - 1` on a local, with
+      `increment`.
+    - CompareLocalExpr: `i < 10` and the other ordering comparisons of a
+      local with a number literal, with `compare` and `constant`.
+    - FieldUpdateExpr: `x.f = x.f + 1` or `x.f = x.f - 1` where `x` is a
+      variable or `this`, with `increment`.
+
+    The operands of every idiom are free of side effects, so when a fused
+    node finds a value of the wrong type it just runs the node it
+    replaced instead. `fused` counts the nodes rewritten, by variant name,
+    as the program is fused and not as it runs.
+    """
+
+    def __init__(self):
+        self.fused = Counter()
+
+    def fuse(self, statements):
+        for stmt in statements:
+            stmt.accept(self)
+
+    def report(self):
+        if not self.fused:
+            return "No nodes were rewritten."
+
+        return "\n".join(
+            f"{name}: {count}" for name, count in sorted(self.fused.items())
+        )
+
+    def rewrite(self, node, variant):
+        node.__class__ = variant
+        self.fused[variant.__name__] += 1
+
+    def visit_block_stmt(self, stmt):
+        self.fuse(stmt.statements)
+
+    def visit_class_stmt(self, stmt):
+        self.fuse(stmt.methods)
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_for_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        stmt.condition.accept(self)
+
+        if stmt.increment is not None:
+            stmt.increment.accept(self)
+
+        stmt.body.accept(self)
+
+    def visit_function_stmt(self, stmt):
+        if stmt.body is not None:
+            self.fuse(stmt.body)
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
+
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visit_assign_expr(self, expr):
+        expr.value.accept(self)
+
+        if expr.storage is not Storage.LOCAL:
+            return
+
+        increment = self.increment(expr.value)
+        if increment is None:
+            return
+
+        operand = expr.value.left
+        if isinstance(operand, VariableExpr) and self.same_local(operand, expr):
+            expr.increment = increment
+            self.rewrite(expr, IncrementLocalExpr)
+
+    def visit_binary_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+        compare = COMPARISONS.get(expr.operator.ttype)
+        if (
+            compare is not None
+            and isinstance(expr.left, VariableExpr)
+            and expr.left.storage is Storage.LOCAL
+            and self.number(expr.right)
+        ):
+            expr.compare = compare
+            expr.constant = expr.right.value
+            self.rewrite(expr, CompareLocalExpr)
+
+    def visit_call_expr(self, expr):
+        expr.callee.accept(self)
+
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visit_get_expr(self, expr):
+        expr.objekt.accept(self)
+
+    def visit_grouping_expr(self, expr):
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr):
+        return
+
+    def visit_logical_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_set_expr(self, expr):
+        expr.objekt.accept(self)
+        expr.value.accept(self)
+
+        increment = self.increment(expr.value)
+        if increment is None:
+            return
+
+        get = expr.value.left
+        if (
+            isinstance(get, GetExpr)
+            and get.name.lexeme == expr.name.lexeme
+            and self.same_receiver(get.objekt, expr.objekt)
+        ):
+            expr.increment = increment
+            self.rewrite(expr, FieldUpdateExpr)
+
+    def visit_super_expr(self, expr):
+        return
+
+    def visit_this_expr(self, expr):
+        return
+
+    def visit_unary_expr(self, expr):
+        expr.right.accept(self)
+
+    def visit_variable_expr(self, expr):
+        return
+
+    def increment(self, expr):
+        """The number added by `operand + k` or `operand - k`, or None."""
+        if not isinstance(expr, BinaryExpr) or not self.number(expr.right):
+            return None
+
+        sign = SIGNS.get(expr.operator.ttype)
+        if sign is None:
+            return None
+
+        return sign * expr.right.value
+
+    def number(self, expr):
+        return isinstance(expr, LiteralExpr) and type(expr.value) is float
+
+    def same_local(self, a, b):
+        return (
+            a.name.lexeme == b.name.lexeme
+            and a.storage is b.storage
+            and a.slot == b.slot
+        )
+
+    def same_receiver(self, a, b):
+        # Within one expression a name can't refer to two variables.
+        if isinstance(a, ThisExpr) and isinstance(b, ThisExpr):
+            return True
+
+        return (
+            isinstance(a, VariableExpr)
+            and isinstance(b, VariableExpr)
+            and a.name.lexeme == b.name.lexeme
+        )
@@ -0,0 +1,232 @@
+from copy import deepcopy
+
+from lox_ast import (
+    Expr,
+    Stmt,
+    BlockStmt,
+    ClassStmt,
+    ForStmt,
+    FunctionStmt,
+    ReturnStmt,
+    VarStmt,
+    AssignExpr,
+    CallExpr,
+    SuperExpr,
+    VariableExpr,
+    InlinedCallExpr,
+)
+from resolver import Storage
+
+
+INLINE_THRESHOLD = 12
+
+
+class Inliner:
+    """Substitutes the bodies of small functions and methods for calls to
+    them in a resolved syntax tree, for the tree interpreter.
+
+    A function can be inlined if its body is a single `return` of an
+    expression of at most `threshold` nodes that makes no calls, so it
+    can't be recursive, and it doesn't capture any variables. Its
+    parameters, and "this" for a method, are then only ever found in its
+    own frame. At each call, its uses of them are renamed into the
+    `inline_slots` spare slots at the end of the calling frame, from
+    `inline_base` on, in the call's own copy of the body, `inline_body`.
+    The caller stores the arguments there and evaluates the copy. The
+    copy makes no calls, so inlined calls never nest and all the calls in
+    a frame can share the same spare slots.
+
+    Calls to a function whose name is bound to a single function
+    declaration and never assigned become an InlinedCallExpr. Method calls
+    only find their method at runtime, so the interpreter asks
+    inline_method() to inline the first one a call finds. Either way, the
+    call records the declaration it `inlined`, and only uses the inlined
+    body when the function called turns out to be that declaration,
+    calling it as usual otherwise, such as when a global function is
+    called before it is declared.
+    """
+
+    def __init__(self, threshold=INLINE_THRESHOLD):
+        self.threshold = threshold
+        self.templates = {}
+        self.width = 0
+
+    def inline(self, statements):
+        self.assigned = set()
+        self.global_scope = self.global_functions(statements)
+        self.find_inlinable(statements)
+        self.visit_all(statements)
+
+    def inline_body(self, function):
+        """Inlines calls in the body of a function the parser skipped, once
+        it has been parsed, after inline() has been through the rest of
+        the program."""
+        self.find_inlinable([function])
+        self.visit_all([function])
+
+    def visit_all(self, statements):
+        if not self.templates:
+            return
+
+        self.bases = {}
+        self.visit(statements, [self.global_scope], None)
+
+        for owner, base in self.bases.items():
+            owner.frame_size = base + self.width
+
+    def inline_method(self, call, method):
+        declaration = method.declaration
+        template = self.templates.get(declaration)
+
+        if (
+            template is not None
+            and call.inline_base is not None
+            and call.inlined is None
+            and len(call.arguments) == len(declaration.params)
+            and len(declaration.params) < call.inline_slots
+        ):
+            call.inlined = declaration
+            call.inline_body = self.rename(template, call.inline_base)
+
+    def find_inlinable(self, nodes):
+        for node in nodes:
+            if isinstance(node, FunctionStmt) and self.is_inlinable(node):
+                self.templates[node] = deepcopy(node.body[0].value)
+                self.width = max(self.width, len(node.params) + 1)
+            elif isinstance(node, AssignExpr):
+                self.assigned.add(node.name.lexeme)
+
+            self.find_inlinable(children(node))
+
+    def is_inlinable(self, function):
+        if (
+            function.body is None
+            or function.name.lexeme == "init"
+            or function.captures
+            or len(function.body) != 1
+            or not isinstance(function.body[0], ReturnStmt)
+            or function.body[0].value is None
+        ):
+            return False
+
+        size = 0
+        for node in walk(function.body[0].value):
+            if isinstance(node, (CallExpr, SuperExpr)):
+                return False
+            size = size + 1
+
+        return size <= self.threshold
+
+    def global_functions(self, statements):
+        functions = {}
+
+        for stmt in statements:
+            name = getattr(stmt, "name", None)
+            if isinstance(stmt, FunctionStmt) and name.lexeme not in functions:
+                functions[name.lexeme] = stmt
+            elif isinstance(stmt, (FunctionStmt, ClassStmt, VarStmt)):
+                functions[name.lexeme] = None
+
+        return functions
+
+    def visit(self, nodes, scopes, owner):
+        # Tracks which function each name is bound to, the same way the
+        # Resolver does, and which frame the code being visited runs in.
+        for node in nodes:
+            if isinstance(node, (BlockStmt, ForStmt)):
+                if owner is None and node.frame_size is not None:
+                    self.visit(children(node), scopes + [{}], node)
+                else:
+                    self.visit(children(node), scopes + [{}], owner)
+                continue
+
+            if isinstance(node, FunctionStmt):
+                if len(scopes) > 1:
+                    scopes[-1][node.name.lexeme] = node
+                if node.body is not None:
+                    params = {param.lexeme: None for param in node.params}
+                    self.visit(node.body, scopes + [params], node)
+                continue
+
+            if isinstance(node, ClassStmt):
+                if len(scopes) > 1:
+                    scopes[-1][node.name.lexeme] = None
+                if node.superclass is not None:
+                    self.visit([node.superclass], scopes, owner)
+                for method in node.methods:
+                    if method.body is not None:
+                        params = {param.lexeme: None for param in method.params}
+                        self.visit(method.body, scopes + [params], method)
+                continue
+
+            self.visit(children(node), scopes, owner)
+
+            if isinstance(node, VarStmt) and len(scopes) > 1:
+                scopes[-1][node.name.lexeme] = None
+            elif isinstance(node, CallExpr):
+                self.visit_call(node, scopes, owner)
+
+    def visit_call(self, call, scopes, owner):
+        if owner is None:
+            return
+
+        if owner not in self.bases:
+            self.bases[owner] = owner.frame_size
+        call.inline_base = self.bases[owner]
+        call.inline_slots = self.width
+
+        if not isinstance(call.callee, VariableExpr):
+            return
+
+        declaration = self.lookup(call.callee.name.lexeme, scopes)
+        if (
+            declaration in self.templates
+            and len(call.arguments) == len(declaration.params)
+        ):
+            call.__class__ = InlinedCallExpr
+            call.inlined = declaration
+            call.inline_body = self.rename(
+                self.templates[declaration], call.inline_base
+            )
+
+    def lookup(self, name, scopes):
+        if name in self.assigned:
+            return None
+
+        for scope in reversed(scopes):
+            if name in scope:
+                return scope[name]
+
+        return None
+
+    def rename(self, template, base):
+        body = deepcopy(template)
+
+        for node in walk(body):
+            if getattr(node, "storage", None) is Storage.LOCAL:
+                node.slot = node.slot + base
+
+        return body
+
+
+def children(node):
+    """The expressions and statements directly inside a node."""
+    if isinstance(node, list):
+        return node
+
+    nodes = []
+    for field in node.fields:
+        value = getattr(node, field)
+        if isinstance(value, list):
+            nodes.extend(item for item in value if isinstance(item, (Expr, Stmt)))
+        elif isinstance(value, (Expr, Stmt)):
+            nodes.append(value)
+
+    return nodes
+
+
+def walk(node):
+    yield node
+
+    for child in children(node):
+        yield from walk(child)
@@ -1,33 +1,97 @@
-from time import time_ns
+import operator
 
 from lox_token_type import LoxTokenType
 from lox_runtime_error import LoxRuntimeError
+from lox_body_error import LoxBodyError
 from lox_function import LoxFunction
-from lox_return import LoxReturn
 from lox_class import LoxClass
 from lox_instance import LoxInstance
-from environment import Environment
+from environment import Cell, GlobalEnvironment
+from lox_native import Clock
+from lox_ast import (
+    Dispatcher,
+    GetExpr,
+    GenericBinaryExpr,
+    FloatAddExpr,
+    FloatSubtractExpr,
+    FloatMultiplyExpr,
+    FloatDivideExpr,
+    FloatGreaterExpr,
+    FloatGreaterEqualExpr,
+    FloatLessExpr,
+    FloatLessEqualExpr,
+    NumberAddExpr,
+    NumberSubtractExpr,
+    NumberMultiplyExpr,
+    NumberDivideExpr,
+    NumberGreaterExpr,
+    NumberGreaterEqualExpr,
+    NumberLessExpr,
+    NumberLessEqualExpr,
+    StringConcatExpr,
+    EqualExpr,
+    NotEqualExpr,
+    GenericUnaryExpr,
+    FloatNegateExpr,
+    NotExpr,
+    NumberNegateExpr,
+)
+from resolver import Storage
+from fuser import Fuser
+from inliner import Inliner
+from number_inference import NumberInference
+
+
+FLOAT_BINARY = {
+    LoxTokenType.PLUS: FloatAddExpr,
+    LoxTokenType.MINUS: FloatSubtractExpr,
+    LoxTokenType.STAR: FloatMultiplyExpr,
+    LoxTokenType.SLASH: FloatDivideExpr,
+    LoxTokenType.GREATER: FloatGreaterExpr,
+    LoxTokenType.GREATER_EQUAL: FloatGreaterEqualExpr,
+    LoxTokenType.LESS: FloatLessExpr,
+    LoxTokenType.LESS_EQUAL: FloatLessEqualExpr,
+}
+NUMBER_BINARY = {
+    LoxTokenType.PLUS: NumberAddExpr,
+    LoxTokenType.MINUS: NumberSubtractExpr,
+    LoxTokenType.STAR: NumberMultiplyExpr,
+    LoxTokenType.SLASH: NumberDivideExpr,
+    LoxTokenType.GREATER: NumberGreaterExpr,
+    LoxTokenType.GREATER_EQUAL: NumberGreaterEqualExpr,
+    LoxTokenType.LESS: NumberLessExpr,
+    LoxTokenType.LESS_EQUAL: NumberLessEqualExpr,
+}
+STRING_BINARY = {LoxTokenType.PLUS: StringConcatExpr}
+COUNTED_COMPARISONS = {
+    LoxTokenType.GREATER: operator.gt,
+    LoxTokenType.GREATER_EQUAL: operator.ge,
+    LoxTokenType.LESS: operator.lt,
+    LoxTokenType.LESS_EQUAL: operator.le,
+}
+ANY_BINARY = {
+    LoxTokenType.EQUAL_EQUAL: EqualExpr,
+    LoxTokenType.BANG_EQUAL: NotEqualExpr,
+}
 
 
 class Interpreter:
     def __init__(self):
-        self._globals = Environment()
-        self._locals = {}
-        self.environment = self._globals
-
-        class Clock:
-            def arity(self):
-                return 0
-
-            def call(self, interpreter, arguments):
-                return time_ns() // 1000_000
-
-            def to_string(self):
-                return "<native fn>"
-
+        self._globals = GlobalEnvironment()
+        self.frame = None
+        self.upvalues = ()
+        self.return_value = None
+        self._dispatch = Dispatcher(self)
+        self.inliner = Inliner()
+        self.fuser = Fuser()
         self._globals.define("clock", Clock())
 
     def interpret(self, statements):
+        # Inferred first so that inlined copies of a body keep its proofs.
+        NumberInference().infer(statements)
+        self.inliner.inline(statements)
+        self.fuser.fuse(statements)
+
         try:
             for statement in statements:
                 self.execute(statement)
@@ -35,27 +99,55 @@ class Interpreter:
             from lox import Lox
 
             Lox.runtime_error(error)
+        except LoxBodyError:
+            # Reported already, and had_error set, like any syntax error.
+            pass
 
-    def evaluate(self, expr):
-        return expr.accept(self)
+    def prepare_body(self, function):
+        """Parses the body of a function the parser skipped, before its
+        first call, and gives it the same treatment as interpret() gives
+        the rest of the program."""
+        from lox import Lox
 
-    def execute(self, stmt):
-        stmt.accept(self)
+        Lox.parse_body(function)
+        NumberInference().infer(function.body)
+        self.inliner.inline_body(function)
+        self.fuser.fuse(function.body)
 
-    def resolve(self, expr, depth):
-        self._locals[expr] = depth
+    def evaluate(self, expr):
+        return self._dispatch[expr.__class__](expr)
 
-    def execute_block(self, statements, environment):
-        previous = self.environment
+    def execute(self, stmt):
+        # Statements return True when they ran a return statement, whose
+        # value is then in self.return_value, so that enclosing statements
+        # stop executing.
+        return self._dispatch[stmt.__class__](stmt)
+
+    def execute_block(self, statements, frame, upvalues):
+        previous_frame = self.frame
+        previous_upvalues = self.upvalues
         try:
-            self.environment = environment
+            self.frame = frame
+            self.upvalues = upvalues
             for stmt in statements:
-                self.execute(stmt)
+                if self.execute(stmt):
+                    return True
         finally:
-            self.environment = previous
+            self.frame = previous_frame
+            self.upvalues = previous_upvalues
+
+    def execute_body(self, function, frame, upvalues):
+        """Runs the body of a called function in its new frame."""
+        return self.execute_block(function.body, frame, upvalues)
 
     def visit_block_stmt(self, stmt):
-        self.execute_block(stmt.statements, Environment(self.environment))
+        if stmt.frame_size is None:
+            for statement in stmt.statements:
+                if self.execute(statement):
+                    return True
+            return None
+
+        return self.execute_block(stmt.statements, [None] * stmt.frame_size, ())
 
     def visit_class_stmt(self, stmt):
         superclass = None
@@ -64,40 +156,102 @@ class Interpreter:
             superclass = self.evaluate(stmt.superclass)
 
             if not isinstance(superclass, LoxClass):
-                raise RuntimeError(stmt.superclass.name, "Superclass must be a class.")
+                raise LoxRuntimeError(
+                    stmt.superclass.name, "Superclass must be a class."
+                )
 
-        self.environment.define(stmt.name.lexeme, None)
+        self.define(stmt, None)
 
-        if stmt.superclass is not None:
-            self.environment = Environment(self.environment)
-            self.environment.define("super", superclass)
+        frame = self.frame
+        if stmt.frame_size is not None:
+            self.frame = [None] * stmt.frame_size
+
+        if superclass is not None:
+            self.frame[stmt.super_slot] = superclass
 
         methods = {}
         for method in stmt.methods:
             function = LoxFunction(
-                method, self.environment, method.name.lexeme == "init"
+                method, self.capture(method), method.name.lexeme == "init"
             )
             methods[method.name.lexeme] = function
 
-        klass = LoxClass(stmt.name.lexeme, superclass, methods)
-
-        if superclass is not None:
-            self.environment = self.environment.enclosing
+        self.frame = frame
 
-        self.environment.assign(stmt.name, klass)
+        klass = LoxClass(stmt.name.lexeme, superclass, methods)
+        self.initialize(stmt, klass)
 
     def visit_expression_stmt(self, stmt):
         self.evaluate(stmt.expression)
 
+    def visit_for_stmt(self, stmt):
+        if stmt.frame_size is None:
+            return self.execute_for(stmt)
+
+        previous_frame = self.frame
+        previous_upvalues = self.upvalues
+        try:
+            self.frame = [None] * stmt.frame_size
+            self.upvalues = ()
+            return self.execute_for(stmt)
+        finally:
+            self.frame = previous_frame
+            self.upvalues = previous_upvalues
+
+    def execute_for(self, stmt):
+        if stmt.initializer is not None:
+            self.execute(stmt.initializer)
+
+        if stmt.counted:
+            start = self.frame[stmt.initializer.slot]
+            bound = self.evaluate(stmt.condition.right)
+            if type(start) is float and type(bound) is float:
+                return self.counted_loop(stmt, start, bound)
+
+        condition = stmt.condition
+        body = stmt.body
+        increment = stmt.increment
+        while self.is_truthy(self.evaluate(condition)):
+            if self.execute(body):
+                return True
+            if increment is not None:
+                self.evaluate(increment)
+
+        return None
+
+    def counted_loop(self, stmt, start, bound):
+        # The resolver has made sure only the increment changes the loop
+        # variable and that nothing changes the bound, so both stay
+        # numbers and the loop variable only needs storing for the body
+        # to read.
+        compare = COUNTED_COMPARISONS[stmt.condition.operator.ttype]
+        step = stmt.increment.value.right.value
+        if stmt.increment.value.operator.ttype == LoxTokenType.MINUS:
+            step = -step
+
+        frame = self.frame
+        slot = stmt.initializer.slot
+        body = stmt.body
+        counter = start
+        while compare(counter, bound):
+            frame[slot] = counter
+            if self.execute(body):
+                return True
+            counter = counter + step
+
+        frame[slot] = counter
+        return None
+
     def visit_function_stmt(self, stmt):
-        function = LoxFunction(stmt, self.environment, False)
-        self.environment.define(stmt.name.lexeme, function)
+        self.define(stmt, None)
+        function = LoxFunction(stmt, self.capture(stmt), False)
+        self.initialize(stmt, function)
 
     def visit_if_stmt(self, stmt):
         if self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.then_branch)
+            return self.execute(stmt.then_branch)
         elif stmt.else_branch is not None:
-            self.execute(stmt.else_branch)
+            return self.execute(stmt.else_branch)
 
     def visit_print_stmt(self, stmt):
         value = self.evaluate(stmt.expression)
@@ -109,33 +263,48 @@ class Interpreter:
         if stmt.value is not None:
             value = self.evaluate(stmt.value)
 
-        raise LoxReturn(value)
+        self.return_value = value
+        return True
 
     def visit_var_stmt(self, stmt):
         value = None
         if stmt.initializer is not None:
             value = self.evaluate(stmt.initializer)
 
-        self.environment.define(stmt.name.lexeme, value)
+        self.define(stmt, value)
         return None
 
     def visit_while_stmt(self, stmt):
         while self.is_truthy(self.evaluate(stmt.condition)):
-            self.execute(stmt.body)
+            if self.execute(stmt.body):
+                return True
 
         return None
 
     def visit_assign_expr(self, expr):
         value = self.evaluate(expr.value)
 
-        distance = self._locals.get(expr)
-        if distance is not None:
-            self.environment.assign_at(distance, expr.name, value)
+        storage = expr.storage
+        if storage is Storage.LOCAL:
+            self.frame[expr.slot] = value
+        elif storage is Storage.CELL:
+            self.frame[expr.slot].value = value
+        elif storage is Storage.UPVALUE_CELL:
+            self.upvalues[expr.slot].value = value
         else:
-            self._globals.assign(expr.name, value)
+            self._globals.assign(expr.name, expr, value)
 
         return value
 
+    def visit_increment_local_expr(self, expr):
+        value = self.frame[expr.slot]
+        if type(value) is float:
+            value = value + expr.increment
+            self.frame[expr.slot] = value
+            return value
+
+        return self.visit_assign_expr(expr)
+
     def visit_literal_expr(self, expr):
         return expr.value
 
@@ -158,18 +327,64 @@ class Interpreter:
             raise LoxRuntimeError(expr.name, "Only instances have fields.")
 
         value = self.evaluate(expr.value)
-        objekt._set(expr.name, value)
+
+        # The cache holds the shape the instance had, the slot the field is
+        # in and the shape it has afterwards, which differs when the field
+        # is added.
+        shape = objekt.shape
+        cache = expr.property_cache
+        if cache is not None and cache[0] is shape:
+            slot = cache[1]
+            new_shape = cache[2]
+        else:
+            slot = shape.slots.get(expr.name.lexeme)
+            if slot is None:
+                slot = len(shape.slots)
+                new_shape = shape.with_field(expr.name.lexeme)
+            else:
+                new_shape = shape
+            expr.property_cache = (shape, slot, new_shape)
+
+        if new_shape is shape:
+            objekt.values[slot] = value
+        else:
+            objekt.shape = new_shape
+            objekt.values.append(value)
+
         return value
 
+    def visit_field_update_expr(self, expr):
+        objekt = self.evaluate(expr.objekt)
+
+        if isinstance(objekt, LoxInstance):
+            shape = objekt.shape
+            cache = expr.property_cache
+            if cache is not None and cache[0] is shape:
+                slot = cache[1]
+            else:
+                slot = shape.slots.get(expr.name.lexeme)
+
+            if slot is not None:
+                value = objekt.values[slot]
+                if type(value) is float:
+                    value = value + expr.increment
+                    objekt.values[slot] = value
+                    expr.property_cache = (shape, slot, shape)
+                    return value
+
+        return self.visit_set_expr(expr)
+
     def visit_super_expr(self, expr):
-        distance = self._locals.get(expr)
-        superclass = self.environment.get_at(distance, "super")
-        objekt = self.environment.get_at(distance - 1, "this")
+        superclass = self.upvalues[expr.slot]
+        if expr.this_storage is Storage.LOCAL:
+            objekt = self.frame[expr.this_slot]
+        else:
+            objekt = self.upvalues[expr.this_slot]
 
         method = superclass.find_method(expr.method.lexeme)
 
         if method is None:
-            raise RuntimeError(
+            raise LoxRuntimeError(
                 expr.method, f"Undefined property '{expr.method.lexeme}'."
             )
 
@@ -184,6 +399,22 @@ class Interpreter:
     def visit_unary_expr(self, expr):
         right = self.evaluate(expr.right)
 
+        # Quickened like binary expressions, see quicken_binary().
+        if expr.operator.ttype == LoxTokenType.BANG:
+            expr.__class__ = NotExpr
+        elif expr.numeric:
+            expr.__class__ = NumberNegateExpr
+        elif type(right) is float:
+            expr.__class__ = FloatNegateExpr
+        else:
+            expr.__class__ = GenericUnaryExpr
+
+        return self.unary_operation(expr, right)
+
+    def visit_generic_unary_expr(self, expr):
+        return self.unary_operation(expr, self.evaluate(expr.right))
+
+    def unary_operation(self, expr, right):
         if expr.operator.ttype == LoxTokenType.MINUS:
             self.check_number_operand(expr.operator, right)
             return -float(right)
@@ -192,21 +423,98 @@ class Interpreter:
 
         return None
 
+    def visit_float_negate_expr(self, expr):
+        right = self.evaluate(expr.right)
+        if type(right) is float:
+            return -right
+
+        expr.__class__ = GenericUnaryExpr
+        return self.unary_operation(expr, right)
+
+    def visit_number_negate_expr(self, expr):
+        return -self.evaluate(expr.right)
+
+    def visit_not_expr(self, expr):
+        return not self.is_truthy(self.evaluate(expr.right))
+
     def visit_variable_expr(self, expr):
         return self.lookup_variable(expr.name, expr)
 
     def lookup_variable(self, name, expr):
-        distance = self._locals.get(expr)
+        storage = expr.storage
+        if storage is Storage.LOCAL:
+            return self.frame[expr.slot]
+        elif storage is Storage.UPVALUE:
+            return self.upvalues[expr.slot]
+        elif storage is Storage.GLOBAL:
+            return self._globals.get(name, expr)
+        elif storage is Storage.CELL:
+            return self.frame[expr.slot].value
+        else:
+            return self.upvalues[expr.slot].value
+
+    def define(self, stmt, value):
+        storage = stmt.storage
+        if storage is Storage.LOCAL:
+            self.frame[stmt.slot] = value
+        elif storage is Storage.CELL:
+            self.frame[stmt.slot] = Cell(value)
+        else:
+            self._globals.define(stmt.name.lexeme, value)
 
-        if distance is not None:
-            return self.environment.get_at(distance, name.lexeme)
+    def initialize(self, stmt, value):
+        # Sets a variable define() has just created, keeping the Cell any
+        # closure created in between captured.
+        if stmt.storage is Storage.CELL:
+            self.frame[stmt.slot].value = value
         else:
-            return self._globals.get(name)
+            self.define(stmt, value)
+
+    def capture(self, function):
+        return tuple(
+            self.frame[index] if is_local else self.upvalues[index]
+            for is_local, index in function.captures
+        )
 
     def visit_binary_expr(self, expr):
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
+        self.quicken_binary(expr, left, right)
+        return self.binary_operation(expr, left, right)
+
+    def quicken_binary(self, expr, left, right):
+        """Rewrites a binary expression the first time it runs into the
+        variant specialized for its operator and the operand types seen.
+
+        Each specialized variant checks its operands are still of those
+        types and otherwise turns itself into a GenericBinaryExpr for
+        good, so an expression that sees mixed types settles on the
+        generic path instead of being rewritten back and forth. Operators
+        NumberInference proved `numeric` don't need checking at all.
+        """
+        ttype = expr.operator.ttype
+        variant = ANY_BINARY.get(ttype)
+
+        if variant is None:
+            if expr.numeric:
+                variant = NUMBER_BINARY[ttype]
+            elif type(left) is float and type(right) is float:
+                variant = FLOAT_BINARY.get(ttype)
+            elif type(left) is str and type(right) is str:
+                variant = STRING_BINARY.get(ttype)
+
+        expr.__class__ = variant or GenericBinaryExpr
+
+    def generalize_binary(self, expr, left, right):
+        expr.__class__ = GenericBinaryExpr
+        return self.binary_operation(expr, left, right)
+
+    def visit_generic_binary_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        return self.binary_operation(expr, left, right)
 
+    def binary_operation(self, expr, left, right):
         if expr.operator.ttype == LoxTokenType.MINUS:
             self.check_number_operands(expr.operator, left, right)
             return float(left) - float(right)
@@ -241,9 +549,181 @@ class Interpreter:
         elif expr.operator.ttype == LoxTokenType.EQUAL_EQUAL:
             return self.is_equal(left, right)
 
+    def visit_float_add_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left + right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_float_subtract_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left - right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_float_multiply_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left * right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_float_divide_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left / right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_float_greater_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left > right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_float_greater_equal_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left >= right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_float_less_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left < right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_float_less_equal_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is float and type(right) is float:
+            return left <= right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_number_add_expr(self, expr):
+        return self.evaluate(expr.left) + self.evaluate(expr.right)
+
+    def visit_number_subtract_expr(self, expr):
+        return self.evaluate(expr.left) - self.evaluate(expr.right)
+
+    def visit_number_multiply_expr(self, expr):
+        return self.evaluate(expr.left) * self.evaluate(expr.right)
+
+    def visit_number_divide_expr(self, expr):
+        return self.evaluate(expr.left) / self.evaluate(expr.right)
+
+    def visit_number_greater_expr(self, expr):
+        return self.evaluate(expr.left) > self.evaluate(expr.right)
+
+    def visit_number_greater_equal_expr(self, expr):
+        return self.evaluate(expr.left) >= self.evaluate(expr.right)
+
+    def visit_number_less_expr(self, expr):
+        return self.evaluate(expr.left) < self.evaluate(expr.right)
+
+    def visit_number_less_equal_expr(self, expr):
+        return self.evaluate(expr.left) <= self.evaluate(expr.right)
+
+    def visit_string_concat_expr(self, expr):
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if type(left) is str and type(right) is str:
+            return left + right
+        return self.generalize_binary(expr, left, right)
+
+    def visit_equal_expr(self, expr):
+        return self.is_equal(self.evaluate(expr.left), self.evaluate(expr.right))
+
+    def visit_compare_local_expr(self, expr):
+        value = self.frame[expr.left.slot]
+        if type(value) is float:
+            return expr.compare(value, expr.constant)
+
+        expr.__class__ = GenericBinaryExpr
+        return self.visit_generic_binary_expr(expr)
+
+    def visit_not_equal_expr(self, expr):
+        return not self.is_equal(self.evaluate(expr.left), self.evaluate(expr.right))
+
     def visit_call_expr(self, expr):
+        if expr.callee.__class__ is GetExpr:
+            return self.invoke(expr)
+
+        return self.call(expr, self.evaluate(expr.callee))
+
+    def invoke(self, expr):
+        """Calls a method on an instance without binding it first.
+
+        The method found is cached on the call along with the receiver's
+        shape, which stays valid as classes can't change once defined and
+        the shape says the instance has no field shadowing the method.
+        Anything other than a method of an instance is called the usual
+        way.
+        """
+        get = expr.callee
+        objekt = self.evaluate(get.objekt)
+
+        if not isinstance(objekt, LoxInstance):
+            return self.call(expr, self.get_property(get, objekt))
+
+        shape = objekt.shape
+        cache = expr.method_cache
+        if cache is not None and cache[0] is shape:
+            method = cache[1]
+        else:
+            method = None
+            if get.name.lexeme not in shape.slots:
+                method = shape.klass.find_method(get.name.lexeme)
+            if method is None:
+                return self.call(expr, self.get_property(get, objekt))
+            expr.method_cache = (shape, method)
+            self.inliner.inline_method(expr, method)
+
+        if method.declaration is expr.inlined:
+            values = [objekt]
+            for argument in expr.arguments:
+                values.append(self.evaluate(argument))
+            return self.inlined_call(expr, values)
+
+        arguments = []
+        for argument in expr.arguments:
+            arguments.append(self.evaluate(argument))
+
+        if len(arguments) != method.arity():
+            raise LoxRuntimeError(
+                expr.paren,
+                f"Expected {method.arity()} arguments but got {len(arguments)}.",
+            )
+
+        return method.invoke(self, objekt, arguments)
+
+    def visit_inlined_call_expr(self, expr):
         callee = self.evaluate(expr.callee)
 
+        if (
+            callee.__class__ is not LoxFunction
+            or callee.declaration is not expr.inlined
+        ):
+            return self.call(expr, callee)
+
+        values = []
+        for argument in expr.arguments:
+            values.append(self.evaluate(argument))
+        return self.inlined_call(expr, values)
+
+    def inlined_call(self, expr, values):
+        # The arguments go where the Inliner renamed the parameters to,
+        # see Inliner.
+        base = expr.inline_base
+        self.frame[base : base + len(values)] = values
+        return self.evaluate(expr.inline_body)
+
+    def call(self, expr, callee):
         if not hasattr(callee, "call"):
             raise LoxRuntimeError(expr.paren, "Can only call functions and classes.")
 
@@ -260,12 +740,23 @@ class Interpreter:
         return callee.call(self, arguments)
 
     def visit_get_expr(self, expr):
-        objekt = self.evaluate(expr.objekt)
+        return self.get_property(expr, self.evaluate(expr.objekt))
 
+    def get_property(self, expr, objekt):
         if isinstance(objekt, LoxInstance):
-            return objekt.get(expr.name)
+            shape = objekt.shape
+            cache = expr.property_cache
+            if cache is not None and cache[0] is shape:
+                return objekt.values[cache[1]]
+
+            slot = shape.slots.get(expr.name.lexeme)
+            if slot is None:
+                return objekt.get(expr.name)
+
+            expr.property_cache = (shape, slot)
+            return objekt.values[slot]
 
-        raise LoxRuntimeError("Only instances have properties.")
+        raise LoxRuntimeError(expr.name, "Only instances have properties.")
 
     def is_truthy(self, value):
         if value is None:
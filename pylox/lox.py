@@ -1,31 +1,175 @@
+import argparse
+import atexit
 import sys
+import ast_cache
 from lox_scanner import LoxScanner
-from lox_parser import LoxParser
+from lox_parser import LoxParser, ParseError
+from resolving_parser import ResolvingParser
 from lox_token_type import LoxTokenType
+from lox_body_error import LoxBodyError
 from resolver import Resolver
+from optimizer import Optimizer
+from inliner import INLINE_THRESHOLD
 from interpreter import Interpreter
+from vm import VM
+from closure_compiler import ClosureInterpreter
+from transpiler import PythonInterpreter
 from ast_printer import ASTPrinter
 
 
+ENGINES = {
+    "tree": Interpreter,
+    "vm": VM,
+    "closure": ClosureInterpreter,
+    "python": PythonInterpreter,
+}
+
+
+# How much of a script run with --stream is read at a time.
+STREAM_BLOCK_SIZE = 1 << 16
+
+
 class Lox:
+    optimize = True
+    stream = False
+    cache = True
+    lazy = False
+    check_syntax = False
+    one_pass = False
+
     @classmethod
     def main(cls):
-        cls.interpreter = Interpreter()
+        parser = argparse.ArgumentParser(prog="pylox")
+        parser.add_argument("script", nargs="?")
+        parser.add_argument(
+            "--engine",
+            choices=ENGINES.keys(),
+            default="tree",
+            help="execution engine: the tree-walking interpreter (default), the "
+            "bytecode VM, the closure compiler or the Python transpiler",
+        )
+        parser.add_argument(
+            "--emit-python",
+            metavar="DIR",
+            help="with --engine=python, write the generated Python modules to DIR "
+            "so that their bytecode gets cached",
+        )
+        parser.add_argument(
+            "--no-optimize",
+            dest="optimize",
+            action="store_false",
+            help="run the program as written, without folding constants and "
+            "removing dead code first",
+        )
+        parser.add_argument(
+            "--inline-threshold",
+            type=int,
+            default=INLINE_THRESHOLD,
+            metavar="N",
+            help="with --engine=tree, inline functions and methods that return "
+            f"an expression of at most N nodes (default {INLINE_THRESHOLD})",
+        )
+        parser.add_argument(
+            "--no-inline",
+            dest="inline_threshold",
+            action="store_const",
+            const=0,
+            help="with --engine=tree, don't inline any functions",
+        )
+        parser.add_argument(
+            "--rewrite-report",
+            action="store_true",
+            help="with --engine=tree, print to stderr how many nodes were "
+            "rewritten into each fused node, whether or not they then ran",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="run each top-level declaration of the script as soon as it "
+            "has been read, keeping only that declaration in memory; syntax "
+            "errors are only found when they are reached",
+        )
+        parser.add_argument(
+            "--no-cache",
+            dest="cache",
+            action="store_false",
+            help="neither load the script's resolved syntax tree from the .loxc "
+            "file next to it nor write it there",
+        )
+        parser.add_argument(
+            "--lazy",
+            action="store_true",
+            help="with --engine=tree, only parse the bodies of functions and "
+            "methods declared at top level when they are first called; syntax "
+            "errors in them are only found then",
+        )
+        parser.add_argument(
+            "--check-syntax",
+            action="store_true",
+            help="with --lazy, still look for syntax errors in every function "
+            "body up front",
+        )
+        parser.add_argument(
+            "--one-pass",
+            action="store_true",
+            help="resolve variables while parsing instead of in a second pass "
+            "over the syntax tree",
+        )
+        args = parser.parse_args()
+
+        if args.emit_python is not None and args.engine != "python":
+            parser.error("--emit-python requires --engine=python")
+
+        if args.rewrite_report and args.engine != "tree":
+            parser.error("--rewrite-report requires --engine=tree")
+
+        if args.inline_threshold != INLINE_THRESHOLD and args.engine != "tree":
+            parser.error("--inline-threshold and --no-inline require --engine=tree")
+
+        if args.lazy and (args.engine != "tree" or args.stream):
+            parser.error("--lazy requires --engine=tree and no --stream")
+
+        if args.check_syntax and not args.lazy:
+            parser.error("--check-syntax requires --lazy")
+
+        if args.one_pass and args.stream:
+            parser.error("--one-pass can't be used with --stream")
+
+        cls.interpreter = ENGINES[args.engine]()
+        if args.emit_python is not None:
+            cls.interpreter.output_dir = args.emit_python
+        if args.engine == "tree":
+            cls.interpreter.inliner.threshold = args.inline_threshold
+        cls.optimize = args.optimize
+        cls.stream = args.stream
+        cls.cache = args.cache
+        cls.lazy = args.lazy
+        cls.check_syntax = args.check_syntax
+        cls.one_pass = args.one_pass
         cls.had_error = False
         cls.had_runtime_error = False
 
-        if len(sys.argv) > 2:
-            print("Usage: pylox [script]")
-            sys.exit(64)
-        elif len(sys.argv) == 2:
-            cls.run_file(sys.argv[1])
+        if args.rewrite_report:
+            atexit.register(cls.report_rewrites)
+
+        if args.script is not None:
+            cls.run_file(args.script)
         else:
             cls.run_prompt()
 
+    @classmethod
+    def report_rewrites(cls):
+        print(cls.interpreter.fuser.report(), file=sys.stderr)
+
     @classmethod
     def run_file(cls, filename):
         with open(filename) as f:
-            cls.run(f.read())
+            if cls.stream:
+                cls.run_stream(iter(lambda: f.read(STREAM_BLOCK_SIZE), ""))
+            elif cls.cache and not cls.lazy:
+                cls.run_cached(f.read(), ast_cache.cache_path(filename))
+            else:
+                cls.run(f.read())
 
         if cls.had_error:
             sys.exit(65)
@@ -48,19 +192,101 @@ class Lox:
 
     @classmethod
     def run(cls, source):
+        statements = cls.parse(source)
+
+        if cls.had_error:
+            return
+
+        cls.execute(statements)
+
+    @classmethod
+    def run_cached(cls, source, path):
+        """Runs `source` like run(), but with the resolved syntax tree
+        loaded from the cache at `path` if it is there and up to date, or
+        stored there for next time if it isn't."""
+        statements = ast_cache.load(path, source)
+
+        if statements is None:
+            statements = cls.parse(source)
+
+            if cls.had_error:
+                return
+
+            ast_cache.store(path, source, statements)
+
+        cls.execute(statements)
+
+    @classmethod
+    def run_stream(cls, chunks):
+        """Runs source read a piece at a time from `chunks`, resolving and
+        executing each top-level declaration as soon as it is parsed.
+
+        After an error, the rest of the source is still scanned and parsed
+        to report any other syntax errors, but nothing more is run.
+        """
+        scanner = LoxScanner()
+        declarations = LoxParser.parse_declarations(
+            scanner.scan_declarations(chunks)
+        )
+
+        for statement in declarations:
+            if cls.had_error or cls.had_runtime_error:
+                continue
+
+            Resolver().resolve([statement])
+
+            if not cls.had_error:
+                cls.execute([statement])
+
+    @classmethod
+    def parse(cls, source):
+        """Scans, parses and resolves `source` into the syntax tree the
+        engines run."""
         s = LoxScanner(source)
         tokens = s.scan_tokens()
-        parser = LoxParser(tokens)
+
+        if cls.one_pass:
+            parser = ResolvingParser(tokens, cls.lazy, cls.check_syntax)
+            statements = parser.parse()
+
+            if not cls.had_error:
+                parser.resolver.report_errors()
+
+            return statements
+
+        parser = LoxParser(tokens, cls.lazy, cls.check_syntax)
         statements = parser.parse()
 
-        if cls.had_error:
-            return
+        if not cls.had_error:
+            resolver = Resolver()
+            resolver.resolve(statements)
+
+        return statements
+
+    @classmethod
+    def parse_body(cls, function):
+        """Parses, resolves and optimizes the body of a function that was
+        skipped with --lazy. Errors stop the program the way syntax errors
+        found up front do."""
+        try:
+            LoxParser.parse_body(function)
+        except ParseError:
+            raise LoxBodyError()
 
-        resolver = Resolver(cls.interpreter)
-        resolver.resolve(statements)
+        if not cls.had_error:
+            resolver = Resolver()
+            resolver.resolve_body(function)
 
         if cls.had_error:
-            return
+            raise LoxBodyError()
+
+        if cls.optimize:
+            function.body = Optimizer().optimize(function.body)
+
+    @classmethod
+    def execute(cls, statements):
+        if cls.optimize:
+            statements = Optimizer().optimize(statements)
 
         cls.interpreter.interpret(statements)
 
@@ -87,4 +313,8 @@ class Lox:
 
 
 if __name__ == "__main__":
+    # The other modules report errors to the Lox class of the lox module,
+    # which isn't this one when this file is run as a script.
+    from lox import Lox
+
     Lox.main()
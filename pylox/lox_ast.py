@@ -1,6 +1,35 @@
 import re
 
 
+def visitor_method_name(class_name):
+    return re.sub(r"([A-Z]+)", r"_\1", f"visit{class_name}").lower()
+
+
+class Dispatcher(dict):
+    """Maps node classes to a visitor's bound visit methods.
+
+    Entries are resolved on first use by walking the node class's MRO, so
+    subclasses of a production fall back to the nearest visit method the
+    visitor actually defines.
+    """
+
+    def __init__(self, visitor):
+        super().__init__()
+        self.visitor = visitor
+
+    def __missing__(self, node_class):
+        for klass in node_class.__mro__:
+            method_name = klass.__dict__.get("visit_method")
+            if method_name is not None and hasattr(self.visitor, method_name):
+                method = getattr(self.visitor, method_name)
+                self[node_class] = method
+                return method
+
+        raise AttributeError(
+            f"{self.visitor.__class__.__name__} can't visit {node_class.__name__}"
+        )
+
+
 def define_ast(base_class_name, productions):
     base_class = type(base_class_name, (object,), {})
     globals()[base_class_name] = base_class
@@ -19,6 +48,8 @@ def define_ast(base_class_name, productions):
 
 
 def make_production_class(production_class_name, base_class, field_names):
+    visit_method = visitor_method_name(production_class_name)
+
     def __init__(self, **kwargs):
         for f in field_names:
             if f not in kwargs.keys():
@@ -28,18 +59,41 @@ def make_production_class(production_class_name, base_class, field_names):
             setattr(self, f, kwargs[f])
 
     def accept(self, visitor):
-        method_name = re.sub(
-            r"([A-Z]+)", r"_\1", f"visit{production_class_name}"
-        ).lower()
-        return getattr(visitor, method_name)(self)
+        return getattr(visitor, visit_method)(self)
 
     production_class = type(
-        production_class_name, (base_class,), {"__init__": __init__, "accept": accept}
+        production_class_name,
+        (base_class,),
+        {
+            "__init__": __init__,
+            "accept": accept,
+            "fields": field_names,
+            "visit_method": visit_method,
+        },
     )
 
     return production_class
 
 
+def define_variants(production_class_name, variant_class_names):
+    """Defines subclasses of a production that a visitor can handle
+    separately.
+
+    A variant has the production's fields and is visited with a method
+    named after the variant, such as `visit_float_add_expr`, by visitors
+    that dispatch through a Dispatcher and define one. Any other visitor
+    treats it as the production itself.
+    """
+    production_class = globals()[production_class_name]
+
+    for variant_class_name in variant_class_names:
+        globals()[variant_class_name] = type(
+            variant_class_name,
+            (production_class,),
+            {"visit_method": visitor_method_name(variant_class_name)},
+        )
+
+
 define_ast(
     "Expr",
     [
@@ -64,6 +118,7 @@ define_ast(
         "Block      : List<Stmt> statements",
         "Class      : Token name, VariableExpr superclass, List<FunctionStmt> methods",
         "Expression : Expr expression",
+        "For        : Stmt initializer, Expr condition, Expr increment, Stmt body",
         "Function   : Token name, List<Token> params, List<Stmt> body",
         "If         : Expr condition, Stmt then_branch, Stmt else_branch",
         "Print      : Expr expression",
@@ -72,3 +127,51 @@ define_ast(
         "While      : Expr condition, Stmt body",
     ],
 )
+
+# Binary and unary expressions the tree interpreter has specialized for
+# the operator and operand types it saw; see Interpreter.quicken_binary().
+define_variants(
+    "BinaryExpr",
+    [
+        "GenericBinaryExpr",
+        "FloatAddExpr",
+        "FloatSubtractExpr",
+        "FloatMultiplyExpr",
+        "FloatDivideExpr",
+        "FloatGreaterExpr",
+        "FloatGreaterEqualExpr",
+        "FloatLessExpr",
+        "FloatLessEqualExpr",
+        "StringConcatExpr",
+        "EqualExpr",
+        "NotEqualExpr",
+        "CompareLocalExpr",
+    ],
+)
+
+define_variants("UnaryExpr", ["GenericUnaryExpr", "FloatNegateExpr", "NotExpr"])
+
+# Operators NumberInference proved only ever get numbers, which run
+# without checking their operands.
+define_variants(
+    "BinaryExpr",
+    [
+        "NumberAddExpr",
+        "NumberSubtractExpr",
+        "NumberMultiplyExpr",
+        "NumberDivideExpr",
+        "NumberGreaterExpr",
+        "NumberGreaterEqualExpr",
+        "NumberLessExpr",
+        "NumberLessEqualExpr",
+    ],
+)
+
+define_variants("UnaryExpr", ["NumberNegateExpr"])
+
+# Idioms the Fuser replaces with a single node.
+define_variants("AssignExpr", ["IncrementLocalExpr"])
+define_variants("SetExpr", ["FieldUpdateExpr"])
+
+# Calls the Inliner has substituted the body of the function called for.
+define_variants("CallExpr", ["InlinedCallExpr"])
@@ -0,0 +1,3 @@
+class LoxBodyError(Exception):
+    """Raised when the body of a function skipped with --lazy turns out to
+    have errors on its first call. They have been reported already."""
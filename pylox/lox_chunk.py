@@ -0,0 +1,170 @@
+import math
+from array import array
+from enum import IntEnum, auto
+
+
+class OpCode(IntEnum):
+    CONSTANT = auto()
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+    GET_LOCAL = auto()
+    SET_LOCAL = auto()
+    GET_GLOBAL = auto()
+    DEFINE_GLOBAL = auto()
+    SET_GLOBAL = auto()
+    GET_UPVALUE = auto()
+    SET_UPVALUE = auto()
+    GET_PROPERTY = auto()
+    SET_PROPERTY = auto()
+    GET_SUPER = auto()
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    NOT = auto()
+    NEGATE = auto()
+    PRINT = auto()
+    JUMP = auto()
+    JUMP_IF_FALSE = auto()
+    CALL = auto()
+    INVOKE = auto()
+    SUPER_INVOKE = auto()
+    CLOSURE = auto()
+    CLOSE_UPVALUE = auto()
+    RETURN = auto()
+    CLASS = auto()
+    INHERIT = auto()
+    METHOD = auto()
+
+
+# Number of operand units that follow each opcode in the code stream.
+# CLOSURE is variable-length: its constant is followed by two units per
+# upvalue of the function it creates.
+OPERAND_COUNTS = {
+    OpCode.CONSTANT: 1,
+    OpCode.GET_LOCAL: 1,
+    OpCode.SET_LOCAL: 1,
+    OpCode.GET_GLOBAL: 1,
+    OpCode.DEFINE_GLOBAL: 1,
+    OpCode.SET_GLOBAL: 1,
+    OpCode.GET_UPVALUE: 1,
+    OpCode.SET_UPVALUE: 1,
+    OpCode.GET_PROPERTY: 1,
+    OpCode.SET_PROPERTY: 1,
+    OpCode.GET_SUPER: 1,
+    OpCode.JUMP: 1,
+    OpCode.JUMP_IF_FALSE: 1,
+    OpCode.CALL: 1,
+    OpCode.INVOKE: 2,
+    OpCode.SUPER_INVOKE: 2,
+    OpCode.CLOSURE: 1,
+    OpCode.CLASS: 1,
+    OpCode.METHOD: 1,
+}
+
+# Opcodes whose first operand is an index into the constant pool.
+CONSTANT_OPERAND_OPS = frozenset(
+    {
+        OpCode.CONSTANT,
+        OpCode.GET_GLOBAL,
+        OpCode.DEFINE_GLOBAL,
+        OpCode.SET_GLOBAL,
+        OpCode.GET_PROPERTY,
+        OpCode.SET_PROPERTY,
+        OpCode.GET_SUPER,
+        OpCode.INVOKE,
+        OpCode.SUPER_INVOKE,
+        OpCode.CLOSURE,
+        OpCode.CLASS,
+        OpCode.METHOD,
+    }
+)
+
+
+class Chunk:
+    """A compiled sequence of instructions plus its constant pool.
+
+    Opcodes and their operands share one unsigned 32-bit code stream, so
+    constant indices, local slots and absolute jump targets all fit in a
+    single unit. Jumps are absolute, so backward jumps need no separate
+    opcode. lines runs parallel to code and is only consulted when
+    reporting a runtime error.
+    """
+
+    def __init__(self):
+        self.code = array("I")
+        self.lines = array("L")
+        self.constants = []
+        self._constant_indices = {}
+
+    def write(self, unit, line):
+        self.code.append(unit)
+        self.lines.append(line)
+
+    def add_constant(self, value):
+        # Strings and numbers are deduplicated so that repeated names and
+        # literals share a slot. The type is part of the key because
+        # 1.0 == True in Python, and the sign because -0.0 == 0.0.
+        if isinstance(value, (str, float)):
+            key = (type(value), value)
+            if type(value) is float:
+                key += (math.copysign(1.0, value),)
+            index = self._constant_indices.get(key)
+            if index is None:
+                index = len(self.constants)
+                self.constants.append(value)
+                self._constant_indices[key] = index
+            return index
+
+        self.constants.append(value)
+        return len(self.constants) - 1
+
+    def disassemble(self, name):
+        lines = [f"== {name} =="]
+        offset = 0
+
+        while offset < len(self.code):
+            op = OpCode(self.code[offset])
+            count = OPERAND_COUNTS.get(op, 0)
+            if op == OpCode.CLOSURE:
+                function = self.constants[self.code[offset + 1]]
+                count = count + 2 * function.upvalue_count
+
+            operands = self.code[offset + 1 : offset + 1 + count].tolist()
+            text = f"{offset:04d} {self.lines[offset]:4d} {op.name:<16}"
+
+            if op in CONSTANT_OPERAND_OPS:
+                text = text + f" {operands[0]:4d} '{self.constants[operands[0]]}'"
+                operands = operands[1:]
+
+            if operands:
+                text = text + " " + " ".join(str(operand) for operand in operands)
+
+            lines.append(text)
+            offset = offset + 1 + count
+
+        return "\n".join(lines)
+
+
+class Function:
+    """A compiled Lox function: its code plus what the VM needs to call it."""
+
+    def __init__(self, name, arity):
+        self.name = name
+        self.arity = arity
+        self.upvalue_count = 0
+        self.chunk = Chunk()
+
+    def __str__(self):
+        if self.name is None:
+            return "<script>"
+
+        return f"<fn {self.name}>"
@@ -1,34 +1,58 @@
-from lox_instance import LoxInstance
+from lox_instance import LoxInstance, Shape
 
 
 class LoxClass:
+    """A Lox class.
+
+    Inherited methods are copied down into `methods` when the class is
+    defined, so looking up any method, including through super, is a
+    single dict lookup however deep the hierarchy is. The initializer is
+    cached for instantiation. New instances start out with the class's
+    empty root `shape`.
+    """
+
     def __init__(self, name, superclass, methods):
         self.name = name
+        self.superclass = None
+        self.methods = {}
+        self.initializer = None
+        self.shape = Shape(self, {})
+
+        if superclass is not None:
+            self.inherit(superclass)
+
+        for method_name, method in methods.items():
+            self.add_method(method_name, method)
+
+    def inherit(self, superclass):
+        # Must happen before the class's own methods are added, so that
+        # they override the inherited ones.
         self.superclass = superclass
-        self.methods = methods
+        self.methods.update(superclass.methods)
+        self.initializer = superclass.initializer
 
-    def find_method(self, name):
-        if name in self.methods:
-            return self.methods[name]
+    def add_method(self, name, method):
+        self.methods[name] = method
 
-        if self.superclass is not None:
-            return self.superclass.find_method(name)
+        if name == "init":
+            self.initializer = method
 
-        return None
+    def find_method(self, name):
+        return self.methods.get(name)
 
     def __str__(self):
         return self.name
 
     def call(self, interpreter, arguments):
         instance = LoxInstance(self)
-        initializer = self.find_method("init")
+        initializer = self.initializer
         if initializer is not None:
-            initializer.bind(instance).call(interpreter, arguments)
+            initializer.invoke(interpreter, instance, arguments)
 
         return instance
 
     def arity(self):
-        initializer = self.find_method("init")
+        initializer = self.initializer
 
         if initializer is None:
             return 0
@@ -1,34 +1,45 @@
-from lox_return import LoxReturn
-from environment import Environment
+from environment import Cell
 
 
 class LoxFunction:
-    def __init__(self, declaration, closure, is_initializer):
+    def __init__(self, declaration, upvalues, is_initializer, this=None):
         self.declaration = declaration
-        self.closure = closure
+        self.upvalues = upvalues
         self.is_initializer = is_initializer
+        self.this = this
 
     def bind(self, instance):
-        environment = Environment(self.closure)
-        environment.define("this", instance)
-        return LoxFunction(self.declaration, environment, self.is_initializer)
+        return LoxFunction(
+            self.declaration, self.upvalues, self.is_initializer, instance
+        )
 
     def call(self, interpreter, arguments):
-        environment = Environment(self.closure)
+        return self.invoke(interpreter, self.this, arguments)
 
-        for i in range(len(self.declaration.params)):
-            environment.define(self.declaration.params[i].lexeme, arguments[i])
+    def invoke(self, interpreter, this, arguments):
+        """Calls the function with this bound to the given instance."""
+        declaration = self.declaration
+        if declaration.body is None:
+            interpreter.prepare_body(declaration)
 
-        try:
-            interpreter.execute_block(self.declaration.body, environment)
-        except LoxReturn as return_value:
-            if self.is_initializer:
-                return self.closure.get_at(0, "this")
+        frame = [None] * declaration.frame_size
 
-            return return_value.value
+        if this is None:
+            frame[: len(arguments)] = arguments
+        else:
+            frame[0] = this
+            frame[1 : len(arguments) + 1] = arguments
+
+        for slot in declaration.cell_params:
+            frame[slot] = Cell(frame[slot])
+
+        returned = interpreter.execute_body(declaration, frame, self.upvalues)
 
         if self.is_initializer:
-            return self.closure.get_at(0, "this")
+            return this
+
+        if returned:
+            return interpreter.return_value
 
         return None
 
@@ -37,3 +48,6 @@ class LoxFunction:
 
     def to_string(self):
         return f"<fn {self.declaration.name.lexeme}>"
+
+    def __str__(self):
+        return self.to_string()
@@ -1,23 +1,70 @@
 from lox_runtime_error import LoxRuntimeError
 
 
+class Shape:
+    """The fields an instance has, and the slot of its `values` each one
+    is stored in.
+
+    Every class has an empty root shape. Adding a field moves an instance
+    to the shape reached by following the transition for that field name,
+    creating it the first time. Instances of a class that got the same
+    fields in the same order therefore share one Shape, and a shape
+    identifies both the class and the field layout, so a use site can
+    cache what it found for a shape.
+    """
+
+    __slots__ = ("klass", "slots", "transitions")
+
+    def __init__(self, klass, slots):
+        self.klass = klass
+        self.slots = slots
+        self.transitions = {}
+
+    def with_field(self, name):
+        shape = self.transitions.get(name)
+
+        if shape is None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = Shape(self.klass, slots)
+            self.transitions[name] = shape
+
+        return shape
+
+
 class LoxInstance:
+    __slots__ = ("shape", "values")
+
     def __init__(self, klass):
-        self.klass = klass
-        self.fields = {}
+        self.shape = klass.shape
+        self.values = []
+
+    @property
+    def klass(self):
+        return self.shape.klass
 
     def __str__(self):
-        return self.klass.name + " instance"
+        return self.shape.klass.name + " instance"
 
     def get(self, name):
-        if name.lexeme in self.fields:
-            return self.fields[name.lexeme]
+        slot = self.shape.slots.get(name.lexeme)
+        if slot is not None:
+            return self.values[slot]
 
-        method = self.klass.find_method(name.lexeme)
+        method = self.shape.klass.find_method(name.lexeme)
         if method is not None:
             return method.bind(self)
 
-        raise LoxRuntimeError(f"Undefined property '{name.lexeme}'.")
+        raise LoxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
 
     def _set(self, name, value):
-        self.fields[name.lexeme] = value
+        self.set_field(name.lexeme, value)
+
+    def set_field(self, name, value):
+        slot = self.shape.slots.get(name)
+
+        if slot is None:
+            self.shape = self.shape.with_field(name)
+            self.values.append(value)
+        else:
+            self.values[slot] = value
@@ -0,0 +1,15 @@
+from time import time_ns
+
+
+class Clock:
+    def arity(self):
+        return 0
+
+    def call(self, interpreter, arguments):
+        return float(time_ns() // 1000_000)
+
+    def to_string(self):
+        return "<native fn>"
+
+    def __str__(self):
+        return self.to_string()
@@ -1,5 +1,5 @@
 from lox_token_type import LoxTokenType
-from lox_runtime_error import LoxRuntimeError
+from lox_token_buffer import TOKEN_TYPES, TOKEN_CODES
 from lox_ast import (
     AssignExpr,
     BinaryExpr,
@@ -15,6 +15,7 @@ from lox_ast import (
     VariableExpr,
     BlockStmt,
     ClassStmt,
+    ForStmt,
     IfStmt,
     PrintStmt,
     ReturnStmt,
@@ -24,11 +25,79 @@ from lox_ast import (
     WhileStmt,
 )
 
+# How tightly each infix operator binds, loosest first. Prefix `!` and
+# `-` bind at UNARY, and calls and property accesses at CALL.
+ASSIGNMENT = 1
+OR = 2
+AND = 3
+EQUALITY = 4
+COMPARISON = 5
+TERM = 6
+FACTOR = 7
+UNARY = 8
+CALL = 9
+
+INFIX_PRECEDENCE = {
+    LoxTokenType.EQUAL: ASSIGNMENT,
+    LoxTokenType.OR: OR,
+    LoxTokenType.AND: AND,
+    LoxTokenType.BANG_EQUAL: EQUALITY,
+    LoxTokenType.EQUAL_EQUAL: EQUALITY,
+    LoxTokenType.GREATER: COMPARISON,
+    LoxTokenType.GREATER_EQUAL: COMPARISON,
+    LoxTokenType.LESS: COMPARISON,
+    LoxTokenType.LESS_EQUAL: COMPARISON,
+    LoxTokenType.MINUS: TERM,
+    LoxTokenType.PLUS: TERM,
+    LoxTokenType.SLASH: FACTOR,
+    LoxTokenType.STAR: FACTOR,
+    LoxTokenType.LEFT_PAREN: CALL,
+    LoxTokenType.DOT: CALL,
+}
+# INFIX_PRECEDENCE by type code, with 0 for tokens that aren't operators.
+INFIX_BINDINGS = [INFIX_PRECEDENCE.get(ttype, 0) for ttype in TOKEN_TYPES]
+
+IDENTIFIER = TOKEN_CODES[LoxTokenType.IDENTIFIER]
+NUMBER = TOKEN_CODES[LoxTokenType.NUMBER]
+STRING = TOKEN_CODES[LoxTokenType.STRING]
+BANG = TOKEN_CODES[LoxTokenType.BANG]
+MINUS = TOKEN_CODES[LoxTokenType.MINUS]
+LEFT_BRACE = TOKEN_CODES[LoxTokenType.LEFT_BRACE]
+RIGHT_BRACE = TOKEN_CODES[LoxTokenType.RIGHT_BRACE]
+
+
+class ParseError(Exception):
+    """Raised at a syntax error, once it has been reported, to unwind to
+    the declaration it is in."""
+
 
 class LoxParser:
-    def __init__(self, tokens):
+    """Parses the tokens in a LoxTokenBuffer into a syntax tree.
+
+    The parser looks tokens up by index, `current` being the next one, and
+    mostly only needs their type codes, which it reads straight from
+    `types`. It only asks the buffer for a LoxToken when it keeps one in
+    a node or reports an error at it.
+
+    When `lazy`, the bodies of functions declared at top level and of the
+    methods of classes declared there are only brace-matched, not parsed.
+    Such a function gets a `body` of None and `body_tokens`, the buffer
+    and the index of the first token of its body, for parse_body() to
+    parse it from when it is first called. Syntax errors in the skipped
+    bodies are only found then, unless `check_bodies` is set too, in which
+    case the bodies are parsed to look for errors but not kept.
+    """
+
+    def __init__(self, tokens, lazy=False, check_bodies=False):
         self.tokens = tokens
+        self.types = tokens.types
         self.current = 0
+        self.lazy = lazy
+        self.check_bodies = check_bodies
+        # How many blocks, function bodies included, the parser is in.
+        self.depth = 0
+        # `types` as bytes, for skip_body() to search.
+        self.codes = None
 
     def parse(self):
         statements = []
@@ -37,6 +106,24 @@ class LoxParser:
 
         return statements
 
+    @classmethod
+    def parse_declarations(cls, buffers):
+        """Parses each of a stream of LoxTokenBuffers, such as the ones
+        LoxScanner.scan_declarations() generates, and generates the
+        statements in them one at a time. As in parse(), a declaration
+        with a syntax error is reported and generated as None."""
+        for tokens in buffers:
+            yield from cls(tokens).parse()
+
+    @classmethod
+    def parse_body(cls, function):
+        """Parses the body of a function a lazy parser skipped."""
+        tokens, start = function.body_tokens
+        parser = cls(tokens)
+        parser.current = start
+        function.body = parser.block_statement()
+        function.body_tokens = None
+
     def declaration(self):
         try:
             if self.match(LoxTokenType.VAR):
@@ -47,7 +134,7 @@ class LoxParser:
                 return self.function("function")
 
             return self.statement()
-        except LoxRuntimeError as error:
+        except ParseError:
             self.synchronize()
             return None
 
@@ -61,14 +148,16 @@ class LoxParser:
 
         self.consume(LoxTokenType.LEFT_BRACE, "Expect '{' before class body.")
 
-        methods = []
+        stmt = ClassStmt(name=name, superclass=superclass, methods=[])
+        self.class_body(stmt)
+        return stmt
+
+    def class_body(self, stmt):
         while not self.check(LoxTokenType.RIGHT_BRACE) and not self.is_at_end():
-            methods.append(self.function("method"))
+            stmt.methods.append(self.function("method"))
 
         self.consume(LoxTokenType.RIGHT_BRACE, "Expect '}' after class body.")
 
-        return ClassStmt(name=name, superclass=superclass, methods=methods)
-
     def statement(self):
         if self.match(LoxTokenType.FOR):
             return self.for_statement()
@@ -81,7 +170,7 @@ class LoxParser:
         elif self.match(LoxTokenType.WHILE):
             return self.while_statement()
         elif self.match(LoxTokenType.LEFT_BRACE):
-            return BlockStmt(statements=self.block_statement())
+            return self.block()
 
         return self.expression_statement()
 
@@ -109,18 +198,15 @@ class LoxParser:
 
         body = self.statement()
 
-        if increment is not None:
-            body = BlockStmt(statements=[body, ExpressionStmt(expression=increment)])
-
         if condition is None:
             condition = LiteralExpr(value=True)
 
-        body = WhileStmt(condition=condition, body=body)
-
-        if initializer is not None:
-            body = BlockStmt(statements=[initializer, body])
-
-        return body
+        return ForStmt(
+            initializer=initializer,
+            condition=condition,
+            increment=increment,
+            body=body,
+        )
 
     def if_statement(self):
         self.consume(LoxTokenType.LEFT_PAREN, "Expect '(' after 'if'.")
@@ -196,126 +282,145 @@ class LoxParser:
         self.consume(LoxTokenType.RIGHT_PAREN, "Expect ')' after parameters.")
         self.consume(LoxTokenType.LEFT_BRACE, "Expect '{' before " + kind + " body.")
 
-        body = self.block_statement()
-        return FunctionStmt(name=name, params=parameters, body=body)
+        function = FunctionStmt(name=name, params=parameters, body=None)
+        self.function_body(function, kind)
+        return function
+
+    def function_body(self, function, kind):
+        if self.lazy and self.depth == 0:
+            function.body_tokens = (self.tokens, self.current)
+            self.skip_body()
+        else:
+            function.body = self.block_statement()
+
+    def skip_body(self):
+        if self.check_bodies:
+            # A plain parser of its own does nothing with the body but
+            # parse it.
+            parser = LoxParser(self.tokens)
+            parser.current = self.current
+            parser.block_statement()
+            self.current = parser.current
+            return
+
+        # Finds the closing brace by searching the type codes for braces,
+        # without looking at the tokens in between.
+        if self.codes is None:
+            self.codes = self.types.tobytes()
+
+        codes = self.codes
+        current = self.current
+        depth = 1
+
+        while depth > 0:
+            closing = codes.find(RIGHT_BRACE, current)
+            if closing == -1:
+                self.current = len(codes) - 1
+                raise self.error(self.peek(), "Expect '}' after block.")
+
+            opening = codes.find(LEFT_BRACE, current, closing)
+            if opening == -1:
+                depth = depth - 1
+                current = closing + 1
+            else:
+                depth = depth + 1
+                current = opening + 1
+
+        self.current = current
+
+    def block(self):
+        return BlockStmt(statements=self.block_statement())
 
     def block_statement(self):
+        self.depth = self.depth + 1
+
         statements = []
         while not self.check(LoxTokenType.RIGHT_BRACE) and not self.is_at_end():
             statements.append(self.declaration())
 
+        self.depth = self.depth - 1
+
         self.consume(LoxTokenType.RIGHT_BRACE, "Expect '}' after block.")
         return statements
 
     def expression(self):
-        return self.assignment()
-
-    def assignment(self):
-        expr = self.or_()
-
-        if self.match(LoxTokenType.EQUAL):
-            equals = self.previous()
-            value = self.assignment()
+        return self.parse_precedence(ASSIGNMENT)
 
-            if isinstance(expr, VariableExpr):
-                name = expr.name
-                return AssignExpr(name=name, value=value)
-            elif isinstance(expr, GetExpr):
-                get = expr
-                return SetExpr(objekt=get.objekt, name=get.name, value=value)
+    def parse_precedence(self, precedence):
+        """Parses an expression whose operators bind at least as tightly as
+        `precedence`.
 
-            self.error(equals, "Invalid assignment target.")
+        This is a Pratt parser: a prefix expression is parsed first, then
+        every infix operator that follows and binds tightly enough takes
+        the expression so far as its left operand. It builds the same
+        tree as descending through a method per precedence level, but
+        with a single call per operand.
+        """
+        expr = self.prefix()
+        types = self.types
 
-        return expr
-
-    def or_(self):
-        expr = self.and_()
-
-        while self.match(LoxTokenType.OR):
-            operator = self.previous()
-            right = self.and_()
-            expr = LogicalExpr(left=expr, operator=operator, right=right)
-
-        return expr
-
-    def and_(self):
-        expr = self.equality()
-
-        while self.match(LoxTokenType.AND):
-            operator = self.previous()
-            right = self.equality()
-            expr = LogicalExpr(left=expr, operator=operator, right=right)
-
-        return expr
-
-    def equality(self):
-        expr = self.comparison()
-
-        while self.match(LoxTokenType.BANG_EQUAL, LoxTokenType.EQUAL_EQUAL):
-            operator = self.previous()
-            right = self.comparison()
-            expr = BinaryExpr(left=expr, operator=operator, right=right)
-
-        return expr
-
-    def comparison(self):
-        expr = self.term()
+        while True:
+            binding = INFIX_BINDINGS[types[self.current]]
 
-        while self.match(
-            LoxTokenType.GREATER,
-            LoxTokenType.GREATER_EQUAL,
-            LoxTokenType.LESS,
-            LoxTokenType.LESS_EQUAL,
-        ):
-            operator = self.previous()
-            right = self.term()
-            expr = BinaryExpr(left=expr, operator=operator, right=right)
+            if binding < precedence:
+                return expr
 
-        return expr
+            operator = self.tokens.token(self.current)
+            ttype = operator.ttype
+            self.current = self.current + 1
 
-    def term(self):
-        expr = self.factor()
+            if EQUALITY <= binding <= FACTOR:
+                # Binary operators are left-associative, so the right
+                # operand only takes operators that bind more tightly.
+                right = self.parse_precedence(binding + 1)
+                expr = BinaryExpr(left=expr, operator=operator, right=right)
+            elif binding == CALL:
+                expr = self.postfix(expr, ttype)
+            elif binding == ASSIGNMENT:
+                return self.assignment(expr, operator)
+            else:
+                right = self.parse_precedence(binding + 1)
+                expr = LogicalExpr(left=expr, operator=operator, right=right)
 
-        while self.match(LoxTokenType.MINUS, LoxTokenType.PLUS):
-            operator = self.previous()
-            right = self.factor()
-            expr = BinaryExpr(left=expr, operator=operator, right=right)
+    def assignment(self, target, equals):
+        # Assignment is right-associative, so the value is parsed at the
+        # same precedence.
+        value = self.parse_precedence(ASSIGNMENT)
 
-        return expr
+        if isinstance(target, VariableExpr):
+            return AssignExpr(name=target.name, value=value)
+        elif isinstance(target, GetExpr):
+            return SetExpr(objekt=target.objekt, name=target.name, value=value)
 
-    def factor(self):
-        expr = self.unary()
+        self.error(equals, "Invalid assignment target.")
+        return target
 
-        while self.match(LoxTokenType.SLASH, LoxTokenType.STAR):
-            operator = self.previous()
-            right = self.unary()
-            expr = BinaryExpr(left=expr, operator=operator, right=right)
+    def prefix(self):
+        tokens = self.tokens
+        index = self.current
+        code = self.types[index]
 
-        return expr
+        if code == IDENTIFIER:
+            self.current = index + 1
+            return VariableExpr(name=tokens.token(index))
 
-    def unary(self):
-        if self.match(LoxTokenType.BANG, LoxTokenType.MINUS):
-            operator = self.previous()
-            right = self.unary()
-            return UnaryExpr(operator=operator, right=right)
+        if code == NUMBER or code == STRING:
+            self.current = index + 1
+            return LiteralExpr(value=tokens.literal(index))
 
-        return self.call()
+        if code == BANG or code == MINUS:
+            self.current = index + 1
+            right = self.parse_precedence(UNARY)
+            return UnaryExpr(operator=tokens.token(index), right=right)
 
-    def call(self):
-        expr = self.primary()
+        return self.primary()
 
-        while True:
-            if self.match(LoxTokenType.LEFT_PAREN):
-                expr = self.finish_call(expr)
-            elif self.match(LoxTokenType.DOT):
-                name = self.consume(
-                    LoxTokenType.IDENTIFIER, "Expect property name after '.'."
-                )
-                expr = GetExpr(objekt=expr, name=name)
-            else:
-                break
+    def postfix(self, expr, ttype):
+        if ttype == LoxTokenType.LEFT_PAREN:
+            return self.finish_call(expr)
 
-        return expr
+        name = self.consume(LoxTokenType.IDENTIFIER, "Expect property name after '.'.")
+        return GetExpr(objekt=expr, name=name)
 
     def finish_call(self, callee):
         arguments = []
@@ -333,6 +438,7 @@ class LoxParser:
         return CallExpr(callee=callee, paren=paren, arguments=arguments)
 
     def primary(self):
+        # The remaining prefix expressions, see prefix().
         if self.match(LoxTokenType.FALSE):
             return LiteralExpr(value=False)
 
@@ -343,7 +449,7 @@ class LoxParser:
             return LiteralExpr(value=None)
 
         if self.match(LoxTokenType.NUMBER, LoxTokenType.STRING):
-            return LiteralExpr(value=self.previous().literal)
+            return LiteralExpr(value=self.tokens.literal(self.current - 1))
 
         if self.match(LoxTokenType.SUPER):
             keyword = self.previous()
@@ -362,14 +468,14 @@ class LoxParser:
         if self.match(LoxTokenType.LEFT_PAREN):
             expr = self.expression()
             self.consume(LoxTokenType.RIGHT_PAREN, "Expect ')' after expression.")
-            return GroupingExpr(expr)
+            return GroupingExpr(expression=expr)
 
         raise self.error(self.peek(), "Expect expression.")
 
     def match(self, *ttypes):
         for ttype in ttypes:
             if self.check(ttype):
-                self.advance()
+                self.current = self.current + 1
                 return True
 
         return False
@@ -384,34 +490,32 @@ class LoxParser:
         from lox import Lox
 
         Lox.token_error(token, message)
-        return SyntaxError()
+        return ParseError()
 
     def synchronize(self):
         self.advance()
 
         while not self.is_at_end():
-            if self.previous().ttype == LoxTokenType.SEMICOLON:
+            if self.tokens.ttype(self.current - 1) == LoxTokenType.SEMICOLON:
                 return
 
-            if (
-                self.peek().ttype == LoxTokenType.CLASS
-                or self.peek().ttype == LoxTokenType.FUN
-                or self.peek().ttype == LoxTokenType.VAR
-                or self.peek().ttype == LoxTokenType.FOR
-                or self.peek().ttype == LoxTokenType.IF
-                or self.peek().ttype == LoxTokenType.WHILE
-                or self.peek().ttype == LoxTokenType.PRINT
-                or self.peek().ttype == LoxTokenType.RETURN
+            if self.tokens.ttype(self.current) in (
+                LoxTokenType.CLASS,
+                LoxTokenType.FUN,
+                LoxTokenType.VAR,
+                LoxTokenType.FOR,
+                LoxTokenType.IF,
+                LoxTokenType.WHILE,
+                LoxTokenType.PRINT,
+                LoxTokenType.RETURN,
             ):
                 return
 
             self.advance()
 
     def check(self, ttype):
-        if self.is_at_end():
-            return False
-
-        return self.peek().ttype == ttype
+        # The EOF token is never checked for, so it needs no special case.
+        return TOKEN_TYPES[self.types[self.current]] == ttype
 
     def advance(self):
         if not self.is_at_end():
@@ -420,10 +524,10 @@ class LoxParser:
         return self.previous()
 
     def is_at_end(self):
-        return self.peek().ttype == LoxTokenType.EOF
+        return TOKEN_TYPES[self.types[self.current]] == LoxTokenType.EOF
 
     def peek(self):
-        return self.tokens[self.current]
+        return self.tokens.token(self.current)
 
     def previous(self):
-        return self.tokens[self.current - 1]
+        return self.tokens.token(self.current - 1)
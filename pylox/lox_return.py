@@ -1,3 +0,0 @@
-class LoxReturn(Exception):
-    def __init__(self, value):
-        self.value = value
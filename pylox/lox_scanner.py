@@ -1,182 +1,245 @@
 import re
 from lox_token_type import LoxTokenType
-from lox_token import LoxToken
 from lox_keywords import LOX_KEYWORDS
+from lox_token_buffer import LoxTokenBuffer, TOKEN_CODES
+
+
+# Matches the next lexeme along with the blanks, newlines and comments
+# before it. The kind of lexeme is the number of the group it matched,
+# which scan_tokens() dispatches on. At the end of the source only the
+# blanks match.
+LEXEME = re.compile(
+    r"""
+    (?: [ \t\r\n]+ | //[^\n]* )*
+    (?:
+        ([A-Za-z_][A-Za-z0-9_]*)            # 1: identifier or keyword
+        | ([!=<>]=? | [(){},.\-+;*/])       # 2: operator or punctuation
+        | ([0-9]+ (?:\.[0-9]+)?)            # 3: number
+        | ("[^"]*"?)                        # 4: string, maybe unterminated
+        | (.)                               # 5: anything else
+    )?
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+IDENTIFIER = 1
+OPERATOR = 2
+NUMBER = 3
+STRING = 4
+OTHER = 5
+
+OPERATORS = {
+    "(": LoxTokenType.LEFT_PAREN,
+    ")": LoxTokenType.RIGHT_PAREN,
+    "{": LoxTokenType.LEFT_BRACE,
+    "}": LoxTokenType.RIGHT_BRACE,
+    ",": LoxTokenType.COMMA,
+    ".": LoxTokenType.DOT,
+    "-": LoxTokenType.MINUS,
+    "+": LoxTokenType.PLUS,
+    ";": LoxTokenType.SEMICOLON,
+    "*": LoxTokenType.STAR,
+    "/": LoxTokenType.SLASH,
+    "!": LoxTokenType.BANG,
+    "!=": LoxTokenType.BANG_EQUAL,
+    "=": LoxTokenType.EQUAL,
+    "==": LoxTokenType.EQUAL_EQUAL,
+    "<": LoxTokenType.LESS,
+    "<=": LoxTokenType.LESS_EQUAL,
+    ">": LoxTokenType.GREATER,
+    ">=": LoxTokenType.GREATER_EQUAL,
+}
+
+# Type codes, see LoxTokenBuffer.
+OPERATOR_CODES = {text: TOKEN_CODES[ttype] for text, ttype in OPERATORS.items()}
+KEYWORD_CODES = {text: TOKEN_CODES[ttype] for text, ttype in LOX_KEYWORDS.items()}
+IDENTIFIER_CODE = TOKEN_CODES[LoxTokenType.IDENTIFIER]
+NUMBER_CODE = TOKEN_CODES[LoxTokenType.NUMBER]
+STRING_CODE = TOKEN_CODES[LoxTokenType.STRING]
+
+# Tokens scan_declarations() looks at to find where declarations end.
+OPENING_CODES = (
+    TOKEN_CODES[LoxTokenType.LEFT_PAREN],
+    TOKEN_CODES[LoxTokenType.LEFT_BRACE],
+)
+CLOSING_CODES = (
+    TOKEN_CODES[LoxTokenType.RIGHT_PAREN],
+    TOKEN_CODES[LoxTokenType.RIGHT_BRACE],
+)
+ENDING_CODES = (
+    TOKEN_CODES[LoxTokenType.SEMICOLON],
+    TOKEN_CODES[LoxTokenType.RIGHT_BRACE],
+)
+ELSE_CODE = TOKEN_CODES[LoxTokenType.ELSE]
 
 
 class LoxScanner:
-    def __init__(self, source):
+    """Splits source code into tokens, which it stores in a LoxTokenBuffer.
+
+    Rather than looking at the source a character at a time, each lexeme
+    is matched whole by the LEXEME regular expression, starting where the
+    previous one ended. Identifiers may contain any Unicode letter, which
+    the expression leaves to identifier_end() so that it only has to deal
+    with ASCII.
+    """
+
+    def __init__(self, source=""):
         self.source = source
-        self.tokens = []
-
-        # start is the beginning of the token we're scanning. current
-        # is the end of the token we're scanning. Taken together, they
-        # form a sort of selection area. We keep start constant and
-        # increment current for as long as we can recognize the next
-        # character. When we can't recognize the next character
-        # anymore, we assume that the text from start to current forms
-        # a lexeme. We create a token from this, move current forward
-        # so that it aligns with start once again, and attempt to
-        # identify the next token.
-        self.start = 0
-        self.current = 0
+        self.tokens = LoxTokenBuffer(source)
         self.line = 1
 
     def scan_tokens(self):
-        while not self.is_at_end():
-            self.start = self.current
-            self.scan_token()
-
-        self.tokens.append(LoxToken(LoxTokenType.EOF, "", None, self.line))
+        end = len(self.source)
+        self.scan(0, end, True)
+        self.tokens.add(LoxTokenType.EOF, end, 0, self.line)
         return self.tokens
 
-    def is_at_end(self):
-        return self.current >= len(self.source)
-
-    def scan_token(self):
-        c = self.advance()
-
-        if c == "(":
-            self.add_token(LoxTokenType.LEFT_PAREN)
-        elif c == ")":
-            self.add_token(LoxTokenType.RIGHT_PAREN)
-        elif c == "{":
-            self.add_token(LoxTokenType.LEFT_BRACE)
-        elif c == "}":
-            self.add_token(LoxTokenType.RIGHT_BRACE)
-        elif c == ",":
-            self.add_token(LoxTokenType.COMMA)
-        elif c == ".":
-            self.add_token(LoxTokenType.DOT)
-        elif c == "-":
-            self.add_token(LoxTokenType.MINUS)
-        elif c == "+":
-            self.add_token(LoxTokenType.PLUS)
-        elif c == ";":
-            self.add_token(LoxTokenType.SEMICOLON)
-        elif c == "*":
-            self.add_token(LoxTokenType.STAR)
-        elif c == "!":
-            if self.match("="):
-                self.add_token(LoxTokenType.BANG_EQUAL)
-            else:
-                self.add_token(LoxTokenType.BANG)
-        elif c == "=":
-            if self.match("="):
-                self.add_token(LoxTokenType.EQUAL_EQUAL)
-            else:
-                self.add_token(LoxTokenType.EQUAL)
-        elif c == "<":
-            if self.match("="):
-                self.add_token(LoxTokenType.LESS_EQUAL)
-            else:
-                self.add_token(LoxTokenType.LESS)
-        elif c == ">":
-            if self.match("="):
-                self.add_token(LoxTokenType.GREATER_EQUAL)
-            else:
-                self.add_token(LoxTokenType.GREATER)
-        elif c == "/":
-            if self.match("/"):
-                while self.peek() != "\n" and not self.is_at_end():
-                    self.advance()
+    def scan_declarations(self, chunks):
+        """Scans source read a piece at a time from `chunks`, such as blocks
+        of a file, and generates a LoxTokenBuffer for each top-level
+        declaration as soon as it has been read.
+
+        A declaration ends at a `;` or `}` outside any parentheses or
+        braces, unless an `else` follows. Only the source and tokens of
+        the declaration being read are kept, so memory use depends on the
+        size of the largest declaration rather than of the source.
+        """
+        tokens = self.tokens
+        types = tokens.types
+        chunks = iter(chunks)
+        scanned = 0
+        # The first token of the declaration being read, the next token
+        # to look at, and the token that ends the declaration unless an
+        # `else` follows.
+        first = 0
+        checked = 0
+        ending = None
+        depth = 0
+        final = False
+
+        while not final:
+            chunk = next(chunks, None)
+
+            if chunk is None:
+                final = True
+                end = len(self.source)
             else:
-                self.add_token(LoxTokenType.SLASH)
-        elif c == '"':
-            self.string()
-        elif c == " " or c == "\r" or c == "\t":
-            pass
-        elif c == "\n":
-            self.line = self.line + 1
-        else:
-            if self.is_digit(c):
-                self.number()
-            elif self.is_alphabetic(c):
-                self.identifier()
+                # Forget the declarations generated so far before reading
+                # on.
+                scanned = scanned - tokens.discard(first, scanned)
+                checked = checked - first
+                if ending is not None:
+                    ending = ending - first
+                first = 0
+
+                self.source = tokens.source + chunk
+                tokens.source = self.source
+                # Only whole lines are scanned, as no lexeme but a string
+                # spans lines and scan() waits for the rest of a string.
+                end = self.source.rfind("\n") + 1
+
+            scanned = self.scan(scanned, end, final)
+
+            while checked < len(types):
+                code = types[checked]
+
+                if ending is not None and code != ELSE_CODE:
+                    yield tokens.slice(first, ending + 1, tokens.lines[ending])
+                    first = ending + 1
+
+                ending = None
+                if code in OPENING_CODES:
+                    depth = depth + 1
+                elif code in CLOSING_CODES:
+                    depth = max(depth - 1, 0)
+
+                if depth == 0 and code in ENDING_CODES:
+                    ending = checked
+
+                checked = checked + 1
+
+        if first < len(types):
+            yield tokens.slice(first, len(types), self.line)
+
+    def scan(self, current, end, final):
+        """Scans the source from `current` up to `end` into `tokens`, and
+        returns where it stopped.
+
+        Unless the end is `final`, scanning stops before a string that
+        isn't terminated yet.
+        """
+        source = self.source
+        tokens = self.tokens
+        add_type = tokens.types.append
+        add_start = tokens.starts.append
+        add_length = tokens.lengths.append
+        add_line = tokens.lines.append
+        match = LEXEME.match
+        count = source.count
+        line = self.line
+
+        while True:
+            lexeme = match(source, current, end)
+            kind = lexeme.lastindex
+            start = current
+            current = lexeme.end()
+
+            # A token is on the line it ends on.
+            previous_line = line
+            line = line + count("\n", start, current)
+
+            if kind == IDENTIFIER:
+                start = lexeme.start(kind)
+                if current < end and not source[current].isascii():
+                    current = self.identifier_end(current)
+                code = KEYWORD_CODES.get(source[start:current], IDENTIFIER_CODE)
+            elif kind == OPERATOR:
+                start = lexeme.start(kind)
+                code = OPERATOR_CODES[lexeme.group(kind)]
+            elif kind == NUMBER:
+                start = lexeme.start(kind)
+                code = NUMBER_CODE
+            elif kind == STRING:
+                start = lexeme.start(kind)
+                if current - start < 2 or source[current - 1] != '"':
+                    if not final:
+                        self.line = previous_line
+                        return lexeme.start()
+
+                    self.error(line, "Unterminated string.")
+                    continue
+                code = STRING_CODE
+            elif kind == OTHER:
+                start = lexeme.start(kind)
+                c = source[start]
+                if not c.isalpha():
+                    self.error(line, f'Unexpected character "{c}".')
+                    continue
+                current = self.identifier_end(current)
+                code = IDENTIFIER_CODE
             else:
-                from lox import Lox
-
-                Lox.error(self.line, f'Unexpected character "{c}".')
-
-    def string(self):
-        while self.peek() != '"' and not self.is_at_end():
-            if self.peek() == "\n":
-                self.line = self.line + 1
-            self.advance()
-
-        if self.is_at_end():
-            from lox import Lox
-
-            Lox.error(self.line, "Unterminated string.")
-            return
-
-        # Consume the closing quote.
-        self.advance()
-
-        value = self.source[self.start + 1 : self.current - 1]
-        self.add_token(LoxTokenType.STRING, value)
-
-    def number(self):
-        while self.is_digit(self.peek()):
-            self.advance()
-
-        if self.peek() == "." and self.is_digit(self.peek_next()):
-            self.advance()
-
-        while self.is_digit(self.peek()):
-            self.advance()
-
-        self.add_token(
-            LoxTokenType.NUMBER, float(self.source[self.start : self.current])
-        )
-
-    def identifier(self):
-        while self.is_alphanumeric(self.peek()):
-            self.advance()
-
-        text = self.source[self.start : self.current]
-        ttype = LOX_KEYWORDS.get(text)
-        if ttype is None:
-            ttype = LoxTokenType.IDENTIFIER
-
-        self.add_token(ttype)
-
-    def match(self, expected):
-        if self.is_at_end():
-            return False
-
-        if self.source[self.current] != expected:
-            return False
-
-        self.current = self.current + 1
-        return True
-
-    def is_digit(self, c):
-        return c.isdigit() and c.isascii()
-
-    def is_alphabetic(self, c):
-        return c.isalpha() or c == "_"
+                break
 
-    def is_alphanumeric(self, c):
-        return self.is_alphabetic(c) or self.is_digit(c)
+            add_type(code)
+            add_start(start)
+            add_length(current - start)
+            add_line(line)
 
-    def peek(self):
-        if self.is_at_end():
-            return "\0"
+        self.line = line
+        return current
 
-        return self.source[self.current]
+    def identifier_end(self, current):
+        # Only ASCII digits count as digits, but any letter is a letter.
+        source = self.source
 
-    def peek_next(self):
-        if self.current + 1 >= len(self.source):
-            return "\0"
+        while current < len(source):
+            c = source[current]
+            if not (c.isalpha() or c == "_" or (c.isdigit() and c.isascii())):
+                break
+            current = current + 1
 
-        return self.source[self.current + 1]
+        return current
 
-    def advance(self):
-        self.current = self.current + 1
-        return self.source[self.current - 1]
+    def error(self, line, message):
+        from lox import Lox
 
-    def add_token(self, ttype, literal=None):
-        text = self.source[self.start : self.current]
-        token = LoxToken(ttype, text, literal, self.line)
-        self.tokens.append(token)
+        Lox.error(line, message)
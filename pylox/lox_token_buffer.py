@@ -0,0 +1,106 @@
+import sys
+from array import array
+
+from lox_token_type import LoxTokenType
+from lox_token import LoxToken
+
+
+# Token types are stored as their index in this list.
+TOKEN_TYPES = list(LoxTokenType)
+TOKEN_CODES = {ttype: code for code, ttype in enumerate(TOKEN_TYPES)}
+
+IDENTIFIER = TOKEN_CODES[LoxTokenType.IDENTIFIER]
+NUMBER = TOKEN_CODES[LoxTokenType.NUMBER]
+STRING = TOKEN_CODES[LoxTokenType.STRING]
+
+
+class LoxTokenBuffer:
+    """The tokens of a source, stored column-wise.
+
+    Each token is a type code, the offset and length of its lexeme in
+    `source` and its line, kept in parallel arrays instead of as a
+    LoxToken object per token. The parser asks for the type of a token
+    with ttype() and only materializes the LoxTokens it keeps in the
+    syntax tree or reports errors at with token(). Identifier lexemes
+    are interned, so every token for a name shares one string.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.types = array("B")
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.lines = array("I")
+
+    def __len__(self):
+        return len(self.types)
+
+    def add(self, ttype, start, length, line):
+        self.types.append(TOKEN_CODES[ttype])
+        self.starts.append(start)
+        self.lengths.append(length)
+        self.lines.append(line)
+
+    def slice(self, start, stop, line):
+        """Returns the tokens from `start` up to `stop` in a buffer of their
+        own, followed by an EOF token on `line`."""
+        tokens = LoxTokenBuffer(self.source)
+        tokens.types = self.types[start:stop]
+        tokens.starts = self.starts[start:stop]
+        tokens.lengths = self.lengths[start:stop]
+        tokens.lines = self.lines[start:stop]
+        tokens.add(LoxTokenType.EOF, 0, 0, line)
+        return tokens
+
+    def discard(self, count, scanned):
+        """Removes the first `count` tokens, and the source before the first
+        token left or, if there are none, before `scanned`. Returns how
+        many characters were removed."""
+        del self.types[:count]
+        del self.starts[:count]
+        del self.lengths[:count]
+        del self.lines[:count]
+
+        dropped = self.starts[0] if len(self.types) > 0 else scanned
+        self.source = self.source[dropped:]
+        self.starts = array("I", [start - dropped for start in self.starts])
+        return dropped
+
+    def ttype(self, index):
+        return TOKEN_TYPES[self.types[index]]
+
+    def lexeme(self, index):
+        start = self.starts[index]
+        lexeme = self.source[start : start + self.lengths[index]]
+
+        if self.types[index] == IDENTIFIER:
+            return sys.intern(lexeme)
+
+        return lexeme
+
+    def literal(self, index):
+        code = self.types[index]
+
+        if code == NUMBER:
+            return float(self.lexeme(index))
+        elif code == STRING:
+            return self.lexeme(index)[1:-1]
+
+        return None
+
+    def token(self, index):
+        # lexeme() and literal() in one go, as the parser calls this for
+        # most tokens.
+        code = self.types[index]
+        start = self.starts[index]
+        lexeme = self.source[start : start + self.lengths[index]]
+        literal = None
+
+        if code == IDENTIFIER:
+            lexeme = sys.intern(lexeme)
+        elif code == NUMBER:
+            literal = float(lexeme)
+        elif code == STRING:
+            literal = lexeme[1:-1]
+
+        return LoxToken(TOKEN_TYPES[code], lexeme, literal, self.lines[index])
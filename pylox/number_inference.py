@@ -0,0 +1,223 @@
+from lox_token_type import LoxTokenType
+from resolver import Storage
+
+
+ARITHMETIC = (
+    LoxTokenType.MINUS,
+    LoxTokenType.SLASH,
+    LoxTokenType.STAR,
+)
+NUMBER_OPERATORS = ARITHMETIC + (
+    LoxTokenType.PLUS,
+    LoxTokenType.GREATER,
+    LoxTokenType.GREATER_EQUAL,
+    LoxTokenType.LESS,
+    LoxTokenType.LESS_EQUAL,
+)
+
+
+class NumberInference:
+    """Proves which operators of a resolved syntax tree can only ever get
+    numbers as operands.
+
+    Arithmetic, comparison and negation nodes get `numeric`, true when
+    every operand is certain to be a number, in which case the engines
+    skip checking them. The proof follows each function's code in order,
+    tracking which of its frame slots hold a number: a slot holds one
+    after a declaration or assignment of a number, until it is assigned
+    something else. Where branches join, a slot only holds a number if it
+    does on every branch, and loops are followed until that settles.
+    Only locals that closures don't assign are tracked, as nothing but
+    the function's own code can change those.
+
+    An expression is a number if it is a number literal, a tracked local
+    holding a number, an assignment of a number, a negation, or an
+    arithmetic operator other than `+`, which the interpreter makes sure
+    returns a number or fails. `+` of two numbers is a number.
+    """
+
+    def infer(self, statements):
+        self.numbers = set()
+        self.proofs = {}
+        self.analyzed = set()
+        self.block(statements)
+
+        for node, numeric in self.proofs.items():
+            node.numeric = numeric
+
+    def block(self, statements):
+        for stmt in statements:
+            stmt.accept(self)
+
+    def prove(self, node, numeric):
+        # A node is visited once for every state its loops are followed
+        # in; it is only numeric if it is in all of them.
+        self.proofs[node] = self.proofs.get(node, True) and numeric
+
+    def join(self, other):
+        # Where two branches meet, a slot only holds a number if it does
+        # at the end of both.
+        self.numbers = self.numbers & other
+
+    def loop(self, iteration):
+        # An iteration starts from the state before the loop or the end of
+        # the previous one, so follow it until its start stops changing.
+        while True:
+            start = set(self.numbers)
+            iteration()
+            self.numbers = start & self.numbers
+            if self.numbers == start:
+                return
+
+    def declare(self, stmt, numeric):
+        if stmt.storage is Storage.LOCAL:
+            if numeric:
+                self.numbers.add(stmt.slot)
+            else:
+                self.numbers.discard(stmt.slot)
+
+    def visit_block_stmt(self, stmt):
+        self.block(stmt.statements)
+
+    def visit_class_stmt(self, stmt):
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+
+        self.declare(stmt, False)
+
+        for method in stmt.methods:
+            self.function(method)
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_for_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        def iteration():
+            stmt.condition.accept(self)
+            stmt.body.accept(self)
+            if stmt.increment is not None:
+                stmt.increment.accept(self)
+
+        self.loop(iteration)
+        stmt.condition.accept(self)
+
+    def visit_function_stmt(self, stmt):
+        self.declare(stmt, False)
+        self.function(stmt)
+
+    def function(self, stmt):
+        # A function's frame only depends on its own code, so it only
+        # needs following once however many times the code around it is.
+        if stmt in self.analyzed or stmt.body is None:
+            return
+        self.analyzed.add(stmt)
+
+        enclosing = self.numbers
+        self.numbers = set()
+        self.block(stmt.body)
+        self.numbers = enclosing
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition.accept(self)
+        start = set(self.numbers)
+        stmt.then_branch.accept(self)
+
+        if stmt.else_branch is not None:
+            end = self.numbers
+            self.numbers = start
+            stmt.else_branch.accept(self)
+            start = end
+
+        self.join(start)
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_var_stmt(self, stmt):
+        numeric = False
+        if stmt.initializer is not None:
+            numeric = stmt.initializer.accept(self)
+
+        self.declare(stmt, numeric)
+
+    def visit_while_stmt(self, stmt):
+        def iteration():
+            stmt.condition.accept(self)
+            stmt.body.accept(self)
+
+        self.loop(iteration)
+        stmt.condition.accept(self)
+
+    # Expressions return whether they are certain to be a number.
+
+    def visit_assign_expr(self, expr):
+        numeric = expr.value.accept(self)
+        self.declare(expr, numeric)
+        return numeric
+
+    def visit_binary_expr(self, expr):
+        left = expr.left.accept(self)
+        right = expr.right.accept(self)
+        ttype = expr.operator.ttype
+
+        if ttype in NUMBER_OPERATORS:
+            self.prove(expr, left and right)
+
+        if ttype in ARITHMETIC:
+            return True
+
+        return ttype == LoxTokenType.PLUS and left and right
+
+    def visit_call_expr(self, expr):
+        expr.callee.accept(self)
+
+        for argument in expr.arguments:
+            argument.accept(self)
+
+        return False
+
+    def visit_get_expr(self, expr):
+        expr.objekt.accept(self)
+        return False
+
+    def visit_grouping_expr(self, expr):
+        return expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr):
+        return type(expr.value) is float
+
+    def visit_logical_expr(self, expr):
+        left = expr.left.accept(self)
+        start = set(self.numbers)
+        right = expr.right.accept(self)
+        self.join(start)
+        return left and right
+
+    def visit_set_expr(self, expr):
+        expr.objekt.accept(self)
+        return expr.value.accept(self)
+
+    def visit_super_expr(self, expr):
+        return False
+
+    def visit_this_expr(self, expr):
+        return False
+
+    def visit_unary_expr(self, expr):
+        right = expr.right.accept(self)
+
+        if expr.operator.ttype == LoxTokenType.MINUS:
+            self.prove(expr, right)
+            return True
+
+        return False
+
+    def visit_variable_expr(self, expr):
+        return expr.storage is Storage.LOCAL and expr.slot in self.numbers
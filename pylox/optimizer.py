@@ -0,0 +1,271 @@
+import operator
+
+from lox_token_type import LoxTokenType
+from lox_ast import (
+    BlockStmt,
+    ReturnStmt,
+    LiteralExpr,
+    BinaryExpr,
+    UnaryExpr,
+)
+
+
+NUMBER_OPERATORS = {
+    LoxTokenType.PLUS: operator.add,
+    LoxTokenType.MINUS: operator.sub,
+    LoxTokenType.STAR: operator.mul,
+    LoxTokenType.SLASH: operator.truediv,
+    LoxTokenType.GREATER: operator.gt,
+    LoxTokenType.GREATER_EQUAL: operator.ge,
+    LoxTokenType.LESS: operator.lt,
+    LoxTokenType.LESS_EQUAL: operator.le,
+}
+BOOLEAN_OPERATORS = (
+    LoxTokenType.GREATER,
+    LoxTokenType.GREATER_EQUAL,
+    LoxTokenType.LESS,
+    LoxTokenType.LESS_EQUAL,
+    LoxTokenType.EQUAL_EQUAL,
+    LoxTokenType.BANG_EQUAL,
+)
+
+
+class Optimizer:
+    """Simplifies a resolved syntax tree without changing what it does.
+
+    - Arithmetic, comparisons and string concatenation of literals are
+      folded into a literal, as are `-` and `!` of a literal and logical
+      operators whose left operand is a literal.
+    - `!!x` becomes `x` where only the truthiness of the result matters
+      or `x` is already a boolean.
+    - `if` statements with a literal condition are replaced with the
+      branch that runs, `while` loops whose condition is false and
+      expression statements that are just a literal are dropped, and so
+      are statements after a `return` in the same block.
+
+    Operations that fail at runtime, such as `-"a"`, `1 + "a"` or `1 / 0`,
+    are left alone so that they still fail when and if they run.
+    """
+
+    def optimize(self, statements):
+        optimized = []
+
+        for stmt in statements:
+            stmt = stmt.accept(self)
+            if stmt is not None:
+                optimized.append(stmt)
+
+                if isinstance(stmt, ReturnStmt):
+                    break
+
+        return optimized
+
+    def optimize_branch(self, stmt):
+        # A branch or loop body must stay a statement.
+        stmt = stmt.accept(self)
+        if stmt is None:
+            stmt = BlockStmt(statements=[])
+            stmt.frame_size = None
+
+        return stmt
+
+    def optimize_condition(self, expr):
+        # Only the truthiness of a condition matters.
+        expr = expr.accept(self)
+
+        while self.is_not(expr) and self.is_not(expr.right):
+            expr = expr.right.right
+
+        return expr
+
+    def visit_block_stmt(self, stmt):
+        stmt.statements = self.optimize(stmt.statements)
+        return stmt
+
+    def visit_class_stmt(self, stmt):
+        for method in stmt.methods:
+            method.accept(self)
+
+        return stmt
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression = stmt.expression.accept(self)
+
+        if isinstance(stmt.expression, LiteralExpr):
+            return None
+
+        return stmt
+
+    def visit_for_stmt(self, stmt):
+        # The loop stays even if its body never runs, as its initializer
+        # declares a variable in the loop's own scope.
+        if stmt.initializer is not None:
+            stmt.initializer = stmt.initializer.accept(self)
+
+        stmt.condition = self.optimize_condition(stmt.condition)
+
+        if stmt.increment is not None:
+            stmt.increment = stmt.increment.accept(self)
+
+        stmt.body = self.optimize_branch(stmt.body)
+        return stmt
+
+    def visit_function_stmt(self, stmt):
+        # A body the parser skipped is optimized once it is parsed.
+        if stmt.body is not None:
+            stmt.body = self.optimize(stmt.body)
+        return stmt
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition = self.optimize_condition(stmt.condition)
+
+        if isinstance(stmt.condition, LiteralExpr):
+            if self.is_truthy(stmt.condition.value):
+                return stmt.then_branch.accept(self)
+            elif stmt.else_branch is not None:
+                return stmt.else_branch.accept(self)
+            return None
+
+        stmt.then_branch = self.optimize_branch(stmt.then_branch)
+
+        if stmt.else_branch is not None:
+            stmt.else_branch = self.optimize_branch(stmt.else_branch)
+
+        return stmt
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression = stmt.expression.accept(self)
+        return stmt
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value = stmt.value.accept(self)
+
+        return stmt
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer = stmt.initializer.accept(self)
+
+        return stmt
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition = self.optimize_condition(stmt.condition)
+
+        if isinstance(stmt.condition, LiteralExpr) and not self.is_truthy(
+            stmt.condition.value
+        ):
+            return None
+
+        stmt.body = self.optimize_branch(stmt.body)
+        return stmt
+
+    def visit_assign_expr(self, expr):
+        expr.value = expr.value.accept(self)
+        return expr
+
+    def visit_binary_expr(self, expr):
+        expr.left = expr.left.accept(self)
+        expr.right = expr.right.accept(self)
+
+        if not isinstance(expr.left, LiteralExpr) or not isinstance(
+            expr.right, LiteralExpr
+        ):
+            return expr
+
+        left = expr.left.value
+        right = expr.right.value
+        ttype = expr.operator.ttype
+
+        if ttype == LoxTokenType.EQUAL_EQUAL:
+            return self.literal(left == right)
+        elif ttype == LoxTokenType.BANG_EQUAL:
+            return self.literal(left != right)
+
+        if type(left) is float and type(right) is float:
+            if ttype == LoxTokenType.SLASH and right == 0:
+                return expr
+            return self.literal(NUMBER_OPERATORS[ttype](left, right))
+
+        if ttype == LoxTokenType.PLUS and type(left) is str and type(right) is str:
+            return self.literal(left + right)
+
+        return expr
+
+    def visit_call_expr(self, expr):
+        expr.callee = expr.callee.accept(self)
+        expr.arguments = [argument.accept(self) for argument in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr):
+        expr.objekt = expr.objekt.accept(self)
+        return expr
+
+    def visit_grouping_expr(self, expr):
+        # Grouping only matters to the parser.
+        return expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr):
+        return expr
+
+    def visit_logical_expr(self, expr):
+        expr.left = expr.left.accept(self)
+        expr.right = expr.right.accept(self)
+
+        if not isinstance(expr.left, LiteralExpr):
+            return expr
+
+        is_or = expr.operator.ttype == LoxTokenType.OR
+        if self.is_truthy(expr.left.value) == is_or:
+            return expr.left
+
+        return expr.right
+
+    def visit_set_expr(self, expr):
+        expr.objekt = expr.objekt.accept(self)
+        expr.value = expr.value.accept(self)
+        return expr
+
+    def visit_super_expr(self, expr):
+        return expr
+
+    def visit_this_expr(self, expr):
+        return expr
+
+    def visit_unary_expr(self, expr):
+        expr.right = expr.right.accept(self)
+        right = expr.right
+
+        if expr.operator.ttype == LoxTokenType.BANG:
+            if isinstance(right, LiteralExpr):
+                return self.literal(not self.is_truthy(right.value))
+
+            if self.is_not(right) and self.is_boolean(right.right):
+                return right.right
+        elif isinstance(right, LiteralExpr) and type(right.value) is float:
+            return self.literal(-right.value)
+
+        return expr
+
+    def visit_variable_expr(self, expr):
+        return expr
+
+    def literal(self, value):
+        return LiteralExpr(value=value)
+
+    def is_not(self, expr):
+        return (
+            isinstance(expr, UnaryExpr) and expr.operator.ttype == LoxTokenType.BANG
+        )
+
+    def is_boolean(self, expr):
+        if isinstance(expr, LiteralExpr):
+            return type(expr.value) is bool
+
+        if isinstance(expr, BinaryExpr):
+            return expr.operator.ttype in BOOLEAN_OPERATORS
+
+        return self.is_not(expr)
+
+    def is_truthy(self, value):
+        return value is not None and value is not False
@@ -1,69 +1,287 @@
 from enum import Enum, auto
 
+from lox_token_type import LoxTokenType
+from lox_ast import (
+    FunctionStmt,
+    ForStmt,
+    VarStmt,
+    AssignExpr,
+    BinaryExpr,
+    LiteralExpr,
+    VariableExpr,
+)
+
 
 FunctionType = Enum("FunctionType", "NONE FUNCTION METHOD INITIALIZER")
+Storage = Enum("Storage", "GLOBAL LOCAL CELL UPVALUE UPVALUE_CELL")
 ClassType = Enum("ClassType", "NONE CLASS SUBCLASS")
 
+COUNTED_COMPARISONS = (
+    LoxTokenType.GREATER,
+    LoxTokenType.GREATER_EQUAL,
+    LoxTokenType.LESS,
+    LoxTokenType.LESS_EQUAL,
+)
+
+
+class Local:
+    def __init__(self, scope):
+        self.scope = scope
+        self.captured = False
+        self.assignments = 0
+        self.initializing = False
+        self.captured_initializing = False
+        self.is_param = False
+        self.declarations = []
+        self.uses = []
+        self.slot = None
+
+    @property
+    def assigned(self):
+        return self.assignments > 0
+
+    @property
+    def cell(self):
+        # Closures copy the variables they capture when they are created,
+        # which only works if the variable can't change afterwards and
+        # already has its final value. A function or class capturing its
+        # own name doesn't, and neither does a variable that is assigned.
+        # Those live in a shared Cell.
+        return self.captured and (self.assigned or self.captured_initializing)
+
+
+class Scope:
+    def __init__(self, parent, function, node):
+        self.parent = parent
+        # The function whose body the scope is part of, None at top level.
+        self.function = function
+        # The block, class or function that introduces the scope.
+        self.node = node
+        self.locals = {}
+        self.children = []
+        self.frame_size = 0
+        # For the scope of a for loop that looks like a counted loop, its
+        # variable and the local holding the bound, if it isn't a literal.
+        self.counter = None
+        self.bound = None
+
+        if parent is not None:
+            parent.children.append(self)
+
 
 class Resolver:
-    def __init__(self, interpreter):
-        self.interpreter = interpreter
+    """Checks scoping rules and annotates the syntax tree with where each
+    variable lives.
+
+    Every function call gets one frame: a list holding the function's
+    parameters and the locals of all the blocks in its body, with sibling
+    blocks sharing slots. Method frames hold "this" in slot 0. Locals in
+    blocks at top level get a frame for the outermost block, or class
+    holding "super", they are in.
+
+    Closures are flat: when a function is created it copies the variables
+    it uses from enclosing functions into its `upvalues`, directly or via
+    the enclosing function's own upvalues. Variables that can change after
+    being captured are stored in a Cell instead, and the Cell is copied.
+    Nothing else of an enclosing call's frame is kept alive.
+
+    Nodes that declare a variable get `storage` (GLOBAL, LOCAL or CELL)
+    and `slot`; a class with a superclass also gets `super_slot`. Nodes
+    that use a variable get `storage` and `slot` where it is found; a super
+    expression also gets `this_storage` and `this_slot`. `slot` is None for
+    globals until the interpreter caches the global's slot in the global
+    table there the first time it finds it. Functions get `frame_size`,
+    `cell_params` (the slots of parameters to move into Cells) and
+    `captures`, which says where each upvalue comes from: pairs of a flag
+    that is true for a slot of the enclosing frame, false for an upvalue of
+    the enclosing function, and its index. The outermost blocks, for loops
+    and classes at top level get `frame_size` too; it is None for any
+    other block, for loop or class. For loops also get `counted`, true for
+    a counted loop the interpreter can run with the loop variable and
+    bound kept in Python variables (see find_counter()). As storage is
+    only known once a variable's scope ends, the annotations are made when
+    the outermost scope ends.
+
+    A function whose body the parser skipped (see LoxParser) gets
+    `deferred`, what resolve_body() needs to resolve the body the same way
+    once it has been parsed. The parser only skips the bodies of functions
+    at top level and methods of classes there, which can't use anything of
+    the frames around them but "super".
+
+    Calls get a `method_cache` for the interpreter to cache the method a
+    method call finds, along with the receiver's shape, and an `inlined`
+    and `inline_base` of None for the Inliner to fill in. Property gets
+    and sets get a `property_cache` for the slot they find a field in.
+
+    Rather than visit a finished tree, the resolver can also be driven by
+    a ResolvingParser as it makes the nodes, through the begin_ and end_
+    methods and the ones for a single node. The parser has it hold back
+    its errors with `hold_errors`, to report them once parsing is done.
+    """
+
+    def __init__(self, hold_errors=False):
         self.scopes = []
+        self.local_scopes = []
+        self.function_node = None
+        self.enclosing_functions = {}
+        self.upvalues = {}
         self.current_function = FunctionType.NONE
         self.current_class = ClassType.NONE
+        # The token and message of the errors found so far, when they are
+        # held back for report_errors() instead of being reported right away.
+        self.held_errors = [] if hold_errors else None
+
+    def error(self, token, message):
+        if self.held_errors is not None:
+            self.held_errors.append((token, message))
+            return
+
+        from lox import Lox
+
+        Lox.token_error(token, message)
+
+    def report_errors(self):
+        from lox import Lox
+
+        for token, message in self.held_errors:
+            Lox.token_error(token, message)
 
     def visit_block_stmt(self, stmt):
-        self.begin_scope()
+        self.begin_scope(stmt)
         self.resolve(stmt.statements)
         self.end_scope()
 
     def visit_class_stmt(self, stmt):
+        enclosing_class, local = self.begin_class(stmt)
+
+        for method in stmt.methods:
+            self.resolve_function(method, self.method_type(method))
+
+        self.end_class(stmt, enclosing_class, local)
+
+    def begin_class(self, stmt):
+        # Returns what end_class() needs once the methods are resolved.
         enclosing_class = self.current_class
         self.current_class = ClassType.CLASS
 
-        self.declare(stmt.name)
+        stmt.frame_size = None
+        local = self.declare(stmt.name, stmt)
         self.define(stmt.name)
 
         if (
             stmt.superclass is not None
             and stmt.name.lexeme == stmt.superclass.name.lexeme
         ):
-            from lox import Lox
-
-            Lox.error(stmt.superclass.name, "A class can't inherit from itself.")
+            self.error(stmt.superclass.name, "A class can't inherit from itself.")
 
         if stmt.superclass is not None:
             self.current_class = ClassType.SUBCLASS
             self.resolve_expr(stmt.superclass)
 
         if stmt.superclass is not None:
-            self.begin_scope()
-            self.scopes[-1]["super"] = True
+            self.begin_scope(stmt)
+            self.declare_implicit("super").declarations.append((stmt, "super_"))
 
-        self.begin_scope()
-        self.scopes[-1]["this"] = True
+        if local is not None:
+            local.initializing = True
 
-        for method in stmt.methods:
-            declaration = FunctionType.METHOD
-            if method.name.lexeme == "init":
-                declaration = FunctionType.INITIALIZER
-            self.resolve_function(method, declaration)
+        return enclosing_class, local
 
-        self.end_scope()
+    def end_class(self, stmt, enclosing_class, local):
+        if local is not None:
+            local.initializing = False
 
         if stmt.superclass is not None:
             self.end_scope()
 
         self.current_class = enclosing_class
 
+    def method_type(self, method):
+        if method.name.lexeme == "init":
+            return FunctionType.INITIALIZER
+
+        return FunctionType.METHOD
+
     def visit_expression_stmt(self, stmt):
         self.resolve_expr(stmt.expression)
 
+    def visit_for_stmt(self, stmt):
+        self.begin_scope(stmt)
+
+        if stmt.initializer is not None:
+            self.resolve_stmt(stmt.initializer)
+
+        self.resolve_expr(stmt.condition)
+        self.resolve_stmt(stmt.body)
+
+        if stmt.increment is not None:
+            self.find_counter(stmt)
+            self.resolve_expr(stmt.increment)
+
+        self.end_scope()
+
+    def find_counter(self, stmt):
+        """Records the variable and bound of a for loop that looks like
+        `for (var i = a; i < b; i = i + c)` with the body resolved.
+
+        Whether it is a counted loop is only known once the scopes of the
+        variables involved have ended: i must only be assigned by the
+        increment and not captured, and b must be a number literal or a
+        local that is never assigned.
+        """
+        initializer = stmt.initializer
+        condition = stmt.condition
+        increment = stmt.increment
+
+        if not isinstance(initializer, VarStmt) or initializer.initializer is None:
+            return
+
+        name = initializer.name.lexeme
+        if not (
+            isinstance(condition, BinaryExpr)
+            and condition.operator.ttype in COUNTED_COMPARISONS
+            and self.is_variable(condition.left, name)
+            and isinstance(increment, AssignExpr)
+            and increment.name.lexeme == name
+            and isinstance(increment.value, BinaryExpr)
+            and increment.value.operator.ttype
+            in (LoxTokenType.PLUS, LoxTokenType.MINUS)
+            and self.is_variable(increment.value.left, name)
+            and self.is_number(increment.value.right)
+        ):
+            return
+
+        scope = self.local_scopes[-1]
+        bound = condition.right
+        if self.is_number(bound):
+            scope.counter = scope.locals[name]
+        elif isinstance(bound, VariableExpr):
+            scope.bound = self.find_local(bound.name.lexeme)
+            if scope.bound is not None:
+                scope.counter = scope.locals[name]
+
+    def is_variable(self, expr, name):
+        return isinstance(expr, VariableExpr) and expr.name.lexeme == name
+
+    def is_number(self, expr):
+        return isinstance(expr, LiteralExpr) and type(expr.value) is float
+
     def visit_function_stmt(self, stmt):
-        self.declare(stmt.name)
+        local = self.declare_function(stmt)
+        self.resolve_function(stmt, FunctionType.FUNCTION)
+
+        if local is not None:
+            local.initializing = False
+
+    def declare_function(self, stmt):
+        # The function is initializing until its body has been resolved.
+        local = self.declare(stmt.name, stmt)
         self.define(stmt.name)
 
-        self.resolve_function(stmt, FunctionType.FUNCTION)
+        if local is not None:
+            local.initializing = True
+
+        return local
 
     def visit_if_stmt(self, stmt):
         self.resolve_expr(stmt.condition)
@@ -76,21 +294,20 @@ class Resolver:
         self.resolve_expr(stmt.expression)
 
     def visit_return_stmt(self, stmt):
-        if self.current_function == FunctionType.NONE:
-            from lox import Lox
-
-            Lox.error(stmt.keyword, "Can't return from toplevel code.")
+        self.check_return(stmt.keyword, stmt.value is not None)
 
         if stmt.value is not None:
-            if self.current_function == FunctionType.INITIALIZER:
-                from lox import Lox
+            self.resolve_expr(stmt.value)
 
-                Lox.error("Can't return a value from an initializer.")
+    def check_return(self, keyword, has_value):
+        if self.current_function == FunctionType.NONE:
+            self.error(keyword, "Can't return from toplevel code.")
 
-            self.resolve_expr(stmt.value)
+        if has_value and self.current_function == FunctionType.INITIALIZER:
+            self.error(keyword, "Can't return a value from an initializer.")
 
     def visit_var_stmt(self, stmt):
-        self.declare(stmt.name)
+        self.declare(stmt.name, stmt)
 
         if stmt.initializer is not None:
             self.resolve_expr(stmt.initializer)
@@ -103,19 +320,31 @@ class Resolver:
 
     def visit_assign_expr(self, expr):
         self.resolve_expr(expr.value)
-        self.resolve_local(expr, expr.name)
+        self.assign(expr)
+
+    def assign(self, expr):
+        local = self.resolve_local(expr, expr.name.lexeme)
+        if local is not None:
+            local.assignments = local.assignments + 1
 
     def visit_binary_expr(self, expr):
         self.resolve_expr(expr.left)
         self.resolve_expr(expr.right)
 
     def visit_call_expr(self, expr):
+        self.annotate_call(expr)
         self.resolve_expr(expr.callee)
 
         for argument in expr.arguments:
             self.resolve_expr(argument)
 
+    def annotate_call(self, expr):
+        expr.method_cache = None
+        expr.inlined = None
+        expr.inline_base = None
+
     def visit_get_expr(self, expr):
+        self.annotate_property(expr)
         self.resolve_expr(expr.objekt)
 
     def visit_grouping_expr(self, expr):
@@ -129,40 +358,39 @@ class Resolver:
         self.resolve_expr(expr.right)
 
     def visit_set_expr(self, expr):
+        self.annotate_property(expr)
         self.resolve_expr(expr.value)
         self.resolve_expr(expr.objekt)
 
+    def annotate_property(self, expr):
+        expr.property_cache = None
+
     def visit_super_expr(self, expr):
         if self.current_class == ClassType.NONE:
-            from lox import Lox
-
-            Lox.error("Can't use 'super' outside of a class.")
+            self.error(expr.keyword, "Can't use 'super' outside of a class.")
         elif self.current_class != ClassType.SUBCLASS:
-            from lox import Lox
-
-            Lox.error("Can't use 'super' in a class with no superclass.")
+            self.error(
+                expr.keyword, "Can't use 'super' in a class with no superclass."
+            )
 
-        self.resolve_local(expr, expr.keyword)
+        self.resolve_local(expr, "super")
+        self.resolve_local(expr, "this", "this_")
 
     def visit_this_expr(self, expr):
         if self.current_class == ClassType.NONE:
-            from lox import Lox
-
-            Lox.error(expr.keyword, "Can't use 'this' outside of a class.")
+            self.error(expr.keyword, "Can't use 'this' outside of a class.")
             return None
 
-        self.resolve_local(expr, expr.keyword)
+        self.resolve_local(expr, "this")
 
     def visit_unary_expr(self, expr):
         self.resolve_expr(expr.right)
 
     def visit_variable_expr(self, expr):
         if len(self.scopes) > 0 and self.scopes[-1].get(expr.name.lexeme) is False:
-            from lox import Lox
-
-            Lox.error(expr.name, "Can't read local variable in its own initializer.")
+            self.error(expr.name, "Can't read local variable in its own initializer.")
 
-        self.resolve_local(expr, expr.name)
+        self.resolve_local(expr, expr.name.lexeme)
 
     def resolve(self, statements):
         for stmt in statements:
@@ -175,38 +403,110 @@ class Resolver:
         expr.accept(self)
 
     def resolve_function(self, function, fntype):
-        enclosing_function = self.current_function
+        enclosing = self.begin_function(function, fntype)
+
+        if function.body is None:
+            self.defer(function, fntype)
+        else:
+            self.resolve(function.body)
+
+        self.end_function(enclosing)
+
+    def begin_function(self, function, fntype):
+        # Returns what end_function() needs once the body is resolved.
+        enclosing = (self.current_function, self.function_node)
         self.current_function = fntype
+        self.enclosing_functions[function] = self.function_node
+        self.upvalues[function] = {}
+        self.function_node = function
+
+        self.begin_scope(function)
 
-        self.begin_scope()
+        if fntype == FunctionType.METHOD or fntype == FunctionType.INITIALIZER:
+            self.declare_implicit("this")
 
         for param in function.params:
-            self.declare(param)
+            self.declare(param).is_param = True
             self.define(param)
 
-        self.resolve(function.body)
+        return enclosing
+
+    def end_function(self, enclosing):
         self.end_scope()
+        self.current_function, self.function_node = enclosing
+
+    def defer(self, function, fntype):
+        klass = None
+        if self.current_class == ClassType.SUBCLASS:
+            klass = self.local_scopes[-2].node
+            # Whether the body uses "super" isn't known yet, so the method
+            # captures it either way.
+            self.capture(self.find_local("super"))
+
+        function.deferred = (fntype, self.current_class, klass)
+
+    def resolve_body(self, function):
+        """Resolves the body of a function the parser skipped, once it has
+        been parsed, in the same scopes it was declared in."""
+        fntype, self.current_class, klass = function.deferred
+        captures = function.captures
+
+        if klass is not None:
+            self.begin_scope(klass)
+            self.declare_implicit("super")
 
-        self.current_function = enclosing_function
+        self.resolve_function(function, fntype)
 
-    def begin_scope(self):
+        if klass is not None:
+            self.end_scope()
+
+        # The function's closures were made with the upvalues it was
+        # deferred with, "super" among them if it is a method of a
+        # subclass, wherever the body turned out to find it.
+        function.captures = captures
+
+    def begin_scope(self, node):
+        parent = self.local_scopes[-1] if self.local_scopes else None
         self.scopes.append({})
+        self.local_scopes.append(Scope(parent, self.function_node, node))
 
     def end_scope(self):
         self.scopes.pop()
+        scope = self.local_scopes.pop()
+
+        if len(self.local_scopes) == 0:
+            self.allocate(scope, None, 0)
+            self.annotate(scope)
 
-    def declare(self, name):
+    def declare(self, name, node=None):
         if len(self.scopes) == 0:
-            return
+            if node is not None:
+                node.storage = Storage.GLOBAL
+                node.slot = None
+            return None
 
         scope = self.scopes[-1]
 
-        if name in scope:
-            from lox import Lox
-
-            Lox.error(name, "Variable with this name already exists in this scope.")
+        if name.lexeme in scope:
+            self.error(name, "Variable with this name already exists in this scope.")
 
         scope[name.lexeme] = False
+        local = self.local(name.lexeme)
+        if node is not None:
+            local.declarations.append((node, ""))
+
+        return local
+
+    def declare_implicit(self, name):
+        self.scopes[-1][name] = True
+        return self.local(name)
+
+    def local(self, name):
+        scope = self.local_scopes[-1]
+        if name not in scope.locals:
+            scope.locals[name] = Local(scope)
+
+        return scope.locals[name]
 
     def define(self, name):
         if len(self.scopes) == 0:
@@ -214,7 +514,106 @@ class Resolver:
 
         self.scopes[-1][name.lexeme] = True
 
-    def resolve_local(self, expr, name):
+    def resolve_local(self, expr, name, prefix=""):
+        local = self.find_local(name)
+        if local is not None:
+            if local.scope.function is not self.function_node:
+                self.capture(local)
+            local.uses.append((expr, self.function_node, prefix))
+            return local
+
+        setattr(expr, prefix + "storage", Storage.GLOBAL)
+        setattr(expr, prefix + "slot", None)
+        return None
+
+    def find_local(self, name):
         for i in range(len(self.scopes) - 1, -1, -1):
-            if name.lexeme in self.scopes[i]:
-                self.interpreter.resolve(expr, len(self.scopes) - 1 - i)
+            if name in self.scopes[i]:
+                return self.local_scopes[i].locals[name]
+
+        return None
+
+    def capture(self, local):
+        local.captured = True
+        if local.initializing:
+            local.captured_initializing = True
+
+        function = self.function_node
+        while function is not local.scope.function:
+            upvalues = self.upvalues[function]
+            if local not in upvalues:
+                upvalues[local] = len(upvalues)
+            function = self.enclosing_functions[function]
+
+    def allocate(self, scope, home, base):
+        """Assigns every local a slot in the frame it's stored in."""
+        if home is None or isinstance(scope.node, FunctionStmt):
+            home = scope
+            base = 0
+
+        for local in scope.locals.values():
+            local.slot = base
+            base = base + 1
+
+        if base > home.frame_size:
+            home.frame_size = base
+
+        for child in scope.children:
+            self.allocate(child, home, base)
+
+    def annotate(self, scope):
+        node = scope.node
+
+        if isinstance(node, FunctionStmt):
+            node.frame_size = scope.frame_size
+            node.cell_params = tuple(
+                local.slot
+                for local in scope.locals.values()
+                if local.is_param and local.cell
+            )
+            node.captures = tuple(
+                self.location(local, self.enclosing_functions[node])
+                for local in self.upvalues[node]
+            )
+        elif scope.parent is None:
+            node.frame_size = scope.frame_size
+        else:
+            node.frame_size = None
+
+        if isinstance(node, ForStmt):
+            counter = scope.counter
+            bound = scope.bound
+            node.counted = (
+                counter is not None
+                and counter.assignments == 1
+                and not counter.captured
+                and (bound is None or not bound.assigned)
+            )
+
+        for local in scope.locals.values():
+            storage = Storage.CELL if local.cell else Storage.LOCAL
+
+            for declaration, prefix in local.declarations:
+                setattr(declaration, prefix + "storage", storage)
+                setattr(declaration, prefix + "slot", local.slot)
+
+            for use, function, prefix in local.uses:
+                if function is local.scope.function:
+                    setattr(use, prefix + "storage", storage)
+                    setattr(use, prefix + "slot", local.slot)
+                else:
+                    upvalue_storage = Storage.UPVALUE
+                    if local.cell:
+                        upvalue_storage = Storage.UPVALUE_CELL
+                    setattr(use, prefix + "storage", upvalue_storage)
+                    setattr(use, prefix + "slot", self.upvalues[function][local])
+
+        for child in scope.children:
+            self.annotate(child)
+
+    def location(self, local, function):
+        """Where function finds local when a closure inside it captures it."""
+        if local.scope.function is function:
+            return (True, local.slot)
+
+        return (False, self.upvalues[function][local])
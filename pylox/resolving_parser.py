@@ -0,0 +1,180 @@
+from lox_token_type import LoxTokenType
+from lox_token_buffer import TOKEN_CODES
+from lox_parser import LoxParser
+from lox_ast import (
+    AssignExpr,
+    SetExpr,
+    SuperExpr,
+    ThisExpr,
+    VariableExpr,
+    BlockStmt,
+    ForStmt,
+    LiteralExpr,
+    VarStmt,
+)
+from resolver import Resolver, FunctionType
+
+
+EQUAL = TOKEN_CODES[LoxTokenType.EQUAL]
+
+
+class ResolvingParser(LoxParser):
+    """A LoxParser that resolves the syntax tree as it parses it, instead
+    of leaving it to a Resolver to go over the finished tree.
+
+    The parser drives a Resolver's scopes itself: it enters and leaves
+    them as it enters and leaves blocks, functions, classes and for
+    loops, declares variables as it parses their declarations and has
+    each variable use, assignment, `this` and `super` resolved as soon as
+    its node is made. A variable followed by `=` is left for assignment()
+    to resolve as an assignment.
+
+    The tree and its annotations are the same as after a Resolver pass,
+    but for the order closures number their upvalues in. So are the
+    errors: `resolver` holds them back, to be reported after parsing if
+    there were no syntax errors, as a Resolver isn't run otherwise, and
+    they are in the order a Resolver finds them. That isn't the order of
+    the source in two places. A property assignment's value is resolved
+    before its object, and a for loop's increment after its body, so
+    errors found in the object or the increment are moved after the
+    others.
+    """
+
+    def __init__(self, tokens, lazy=False, check_bodies=False):
+        super().__init__(tokens, lazy, check_bodies)
+        self.resolver = Resolver(hold_errors=True)
+        self.errors = self.resolver.held_errors
+        # The expression at the end of the chain of calls and property
+        # accesses being parsed, and how many errors there were before it.
+        self.chain = (None, 0)
+
+    def move_errors(self, start, end):
+        # Moves the errors found from start to end after the ones since.
+        errors = self.errors
+        errors[start:] = errors[end:] + errors[start:end]
+
+    def class_body(self, stmt):
+        enclosing_class, local = self.resolver.begin_class(stmt)
+        super().class_body(stmt)
+        self.resolver.end_class(stmt, enclosing_class, local)
+
+    def for_statement(self):
+        stmt = ForStmt(initializer=None, condition=None, increment=None, body=None)
+        self.resolver.begin_scope(stmt)
+
+        self.consume(LoxTokenType.LEFT_PAREN, "Expect '(' after 'for'.")
+
+        if self.match(LoxTokenType.SEMICOLON):
+            pass
+        elif self.match(LoxTokenType.VAR):
+            stmt.initializer = self.var_declaration()
+        else:
+            stmt.initializer = self.expression_statement()
+
+        if not self.check(LoxTokenType.SEMICOLON):
+            stmt.condition = self.expression()
+
+        self.consume(LoxTokenType.SEMICOLON, "Expect ';' after loop condition.")
+
+        start = len(self.errors)
+        if not self.check(LoxTokenType.RIGHT_PAREN):
+            stmt.increment = self.expression()
+        end = len(self.errors)
+
+        self.consume(LoxTokenType.RIGHT_PAREN, "Expect ')' after for clauses.")
+
+        stmt.body = self.statement()
+
+        if stmt.condition is None:
+            stmt.condition = LiteralExpr(value=True)
+
+        if stmt.increment is not None:
+            self.resolver.find_counter(stmt)
+            self.move_errors(start, end)
+
+        self.resolver.end_scope()
+        return stmt
+
+    def return_statement(self):
+        has_value = not self.check(LoxTokenType.SEMICOLON)
+        self.resolver.check_return(self.previous(), has_value)
+        return super().return_statement()
+
+    def var_declaration(self):
+        name = self.consume(LoxTokenType.IDENTIFIER, "Expect variable name.")
+        stmt = VarStmt(name=name, initializer=None)
+        self.resolver.declare(name, stmt)
+
+        if self.match(LoxTokenType.EQUAL):
+            stmt.initializer = self.expression()
+
+        self.consume(LoxTokenType.SEMICOLON, "Expect ';' after variable declaration.")
+        self.resolver.define(name)
+        return stmt
+
+    def function_body(self, function, kind):
+        resolver = self.resolver
+        local = None
+
+        if kind == "method":
+            fntype = resolver.method_type(function)
+        else:
+            fntype = FunctionType.FUNCTION
+            local = resolver.declare_function(function)
+
+        enclosing = resolver.begin_function(function, fntype)
+        super().function_body(function, kind)
+
+        if function.body is None:
+            resolver.defer(function, fntype)
+
+        resolver.end_function(enclosing)
+
+        if local is not None:
+            local.initializing = False
+
+    def block(self):
+        stmt = BlockStmt(statements=[])
+        self.resolver.begin_scope(stmt)
+        stmt.statements = self.block_statement()
+        self.resolver.end_scope()
+        return stmt
+
+    def assignment(self, target, equals):
+        start = self.chain[1]
+        end = len(self.errors)
+        expr = super().assignment(target, equals)
+
+        if expr.__class__ is AssignExpr:
+            self.resolver.assign(expr)
+        elif expr.__class__ is SetExpr:
+            self.resolver.annotate_property(expr)
+            self.move_errors(start, end)
+
+        return expr
+
+    def prefix(self):
+        start = len(self.errors)
+        expr = super().prefix()
+        node_class = expr.__class__
+
+        if node_class is VariableExpr:
+            if self.types[self.current] != EQUAL:
+                self.resolver.visit_variable_expr(expr)
+        elif node_class is ThisExpr or node_class is SuperExpr:
+            expr.accept(self.resolver)
+
+        self.chain = (expr, start)
+        return expr
+
+    def postfix(self, expr, ttype):
+        start = self.chain[1]
+        expr = super().postfix(expr, ttype)
+
+        if ttype == LoxTokenType.LEFT_PAREN:
+            self.resolver.annotate_call(expr)
+        else:
+            self.resolver.annotate_property(expr)
+
+        self.chain = (expr, start)
+        return expr
@@ -0,0 +1,870 @@
+import os
+from hashlib import sha1
+from importlib.machinery import SourceFileLoader
+
+from lox_ast import Expr, GetExpr, ThisExpr, AssignExpr, SetExpr
+from lox_token_type import LoxTokenType
+from lox_runtime_error import LoxRuntimeError
+from lox_token import LoxToken
+
+
+NUMBER_OPERATORS = {
+    LoxTokenType.MINUS: ("-", "num"),
+    LoxTokenType.SLASH: ("/", "num"),
+    LoxTokenType.STAR: ("*", "num"),
+    LoxTokenType.GREATER: (">", "bool"),
+    LoxTokenType.GREATER_EQUAL: (">=", "bool"),
+    LoxTokenType.LESS: ("<", "bool"),
+    LoxTokenType.LESS_EQUAL: ("<=", "bool"),
+}
+
+HEADER = "from transpiler_runtime import *"
+
+# Brackets the Lox line marked on a piece of generated code. Markers are
+# taken out again as the code is emitted.
+MARK = "\x00"
+
+
+class Variable:
+    """A Lox variable and the Python name it is translated to."""
+
+    def __init__(self, py_name, owner, is_global=False):
+        self.py_name = py_name
+        self.owner = owner
+        self.is_global = is_global
+        self.captured = False
+        self.assigned = False
+        self.self_referenced = False
+        self.declaring = False
+
+    @property
+    def boxed(self):
+        # Closures receive captured variables when they are created. That
+        # only works by value if the variable can't change afterwards and
+        # already holds its final value, which isn't the case for a function
+        # or class referring to itself. Everything else captured goes in a
+        # one-element list that the closure shares.
+        return self.captured and (self.assigned or self.self_referenced)
+
+
+class FunctionInfo:
+    def __init__(self, enclosing):
+        self.enclosing = enclosing
+        # Captured variables this function (or a function nested in it)
+        # uses, in first-use order. They become keyword-only parameters
+        # whose defaults are evaluated when the function is defined.
+        self.free = {}
+        self.assigned_globals = set()
+
+
+class ScopeAnalyzer:
+    """Works out which Python variable every Lox variable maps to.
+
+    Block scoping is flattened by giving every local declaration a unique
+    Python name, so a whole Lox function body becomes one Python function
+    body.
+    """
+
+    def __init__(self):
+        self.scopes = []
+        self.main = FunctionInfo(None)
+        self.function = self.main
+        self.globals = {}
+        self.counter = 0
+
+        self.refs = {}
+        self.decls = {}
+        self.params = {}
+        self.functions = {}
+        self.this_of = {}
+        self.super_of = {}
+        self.super_this = {}
+
+    def analyze(self, statements):
+        for stmt in statements:
+            stmt.accept(self)
+
+    def visit_block_stmt(self, stmt):
+        self.scopes.append({})
+        for statement in stmt.statements:
+            statement.accept(self)
+        self.scopes.pop()
+
+    def visit_class_stmt(self, stmt):
+        if stmt.superclass is not None:
+            stmt.superclass.accept(self)
+
+        variable = self.declare(stmt.name.lexeme)
+        self.decls[stmt] = variable
+        variable.declaring = True
+
+        if stmt.superclass is not None:
+            self.scopes.append({})
+            self.super_of[stmt] = self.declare("super")
+
+        for method in stmt.methods:
+            self.function_body(method, is_method=True)
+
+        if stmt.superclass is not None:
+            self.scopes.pop()
+
+        variable.declaring = False
+
+    def visit_expression_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_function_stmt(self, stmt):
+        variable = self.declare(stmt.name.lexeme)
+        self.decls[stmt] = variable
+        variable.declaring = True
+        self.function_body(stmt, is_method=False)
+        variable.declaring = False
+
+    def visit_if_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.then_branch.accept(self)
+        if stmt.else_branch is not None:
+            stmt.else_branch.accept(self)
+
+    def visit_print_stmt(self, stmt):
+        stmt.expression.accept(self)
+
+    def visit_return_stmt(self, stmt):
+        if stmt.value is not None:
+            stmt.value.accept(self)
+
+    def visit_var_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        self.decls[stmt] = self.declare(stmt.name.lexeme)
+
+    def visit_for_stmt(self, stmt):
+        self.scopes.append({})
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+        if stmt.increment is not None:
+            stmt.increment.accept(self)
+        self.scopes.pop()
+
+    def visit_while_stmt(self, stmt):
+        stmt.condition.accept(self)
+        stmt.body.accept(self)
+
+    def visit_assign_expr(self, expr):
+        expr.value.accept(self)
+        variable = self.lookup(expr.name.lexeme)
+        self.refs[expr] = variable
+
+        if variable.is_global:
+            self.function.assigned_globals.add(variable.py_name)
+        else:
+            variable.assigned = True
+
+    def visit_binary_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_call_expr(self, expr):
+        expr.callee.accept(self)
+        for argument in expr.arguments:
+            argument.accept(self)
+
+    def visit_get_expr(self, expr):
+        expr.objekt.accept(self)
+
+    def visit_grouping_expr(self, expr):
+        expr.expression.accept(self)
+
+    def visit_literal_expr(self, expr):
+        pass
+
+    def visit_logical_expr(self, expr):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visit_set_expr(self, expr):
+        expr.objekt.accept(self)
+        expr.value.accept(self)
+
+    def visit_super_expr(self, expr):
+        self.refs[expr] = self.lookup("super")
+        self.super_this[expr] = self.lookup("this")
+
+    def visit_this_expr(self, expr):
+        self.refs[expr] = self.lookup("this")
+
+    def visit_unary_expr(self, expr):
+        expr.right.accept(self)
+
+    def visit_variable_expr(self, expr):
+        self.refs[expr] = self.lookup(expr.name.lexeme)
+
+    def function_body(self, stmt, is_method):
+        info = FunctionInfo(self.function)
+        self.functions[stmt] = info
+        enclosing = self.function
+        self.function = info
+        self.scopes.append({})
+
+        if is_method:
+            self.this_of[stmt] = self.declare("this")
+
+        self.params[stmt] = [self.declare(param.lexeme) for param in stmt.params]
+
+        for statement in stmt.body:
+            statement.accept(self)
+
+        self.scopes.pop()
+        self.function = enclosing
+
+    def declare(self, name):
+        if len(self.scopes) == 0:
+            variable = self.globals.get(name)
+            if variable is None:
+                variable = Variable("g_" + name, None, True)
+                self.globals[name] = variable
+            self.function.assigned_globals.add(variable.py_name)
+            return variable
+
+        self.counter = self.counter + 1
+        if name == "this" or name == "super":
+            py_name = f"{name}_{self.counter}"
+        else:
+            py_name = f"l_{name}_{self.counter}"
+
+        variable = Variable(py_name, self.function)
+        self.scopes[-1][name] = variable
+        return variable
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            variable = scope.get(name)
+            if variable is None:
+                continue
+
+            if variable.owner is not self.function:
+                variable.captured = True
+                if variable.declaring:
+                    variable.self_referenced = True
+
+                function = self.function
+                while function is not variable.owner:
+                    function.free[variable] = None
+                    function = function.enclosing
+
+            return variable
+
+        variable = self.globals.get(name)
+        if variable is None:
+            variable = Variable("g_" + name, None, True)
+            self.globals[name] = variable
+
+        return variable
+
+
+class Transpiler:
+    """Translates a resolved Lox program into the source of a Python module.
+
+    The module imports transpiler_runtime and defines _main(), which runs
+    the program's top-level statements. Runtime type checks are emitted
+    inline as conditional expressions that fall back to raising a
+    LoxRuntimeError, and are left out where the operand types are already
+    known from the syntax. _LOX_LINES maps each line of the module back to
+    the Lox line it came from.
+
+    Reading an undefined global or property isn't checked inline but
+    raises a NameError or AttributeError, and a line of the module can
+    read several. _LOX_COLUMNS maps the lines that do, by number, to the
+    Lox line of each read, by the column it ends at.
+    """
+
+    def __init__(self):
+        self.analysis = ScopeAnalyzer()
+        self.lines = []
+        self.line_map = []
+        self.column_map = {}
+        self.line = 0
+        self.indent = 0
+        self.temps = 0
+        self.function = None
+        self.this = None
+        self.is_initializer = False
+
+    def transpile(self, statements):
+        self.analysis.analyze(statements)
+
+        self.emit(HEADER)
+        self.emit("")
+        self.emit("")
+        self.emit("def _main():")
+        self.indent = self.indent + 1
+        self.function = self.analysis.main
+        self.emit_globals(self.function)
+        self.suite(statements)
+        self.indent = self.indent - 1
+
+        self.emit("")
+        self.emit("")
+        source_lines = self.lines + [
+            f"_LOX_LINES = {tuple(self.line_map)!r}",
+            f"_LOX_COLUMNS = {self.column_map!r}",
+            "",
+        ]
+        return "\n".join(source_lines)
+
+    def emit(self, text):
+        text = "    " * self.indent + text
+
+        if MARK in text:
+            # Columns are counted in bytes, like in code positions.
+            parts = text.split(MARK)
+            text = parts[0]
+            columns = {}
+            for i in range(1, len(parts), 2):
+                columns[len(text.encode())] = int(parts[i])
+                text = text + parts[i + 1]
+            self.column_map[len(self.lines) + 1] = columns
+
+        self.lines.append(text)
+        self.line_map.append(self.line)
+
+    def mark(self, code, token):
+        """Marks code that reads a global or property as reading it on the
+        line of token."""
+        return f"{code}{MARK}{token.line}{MARK}"
+
+    def emit_globals(self, function):
+        if function.assigned_globals:
+            self.emit("global " + ", ".join(sorted(function.assigned_globals)))
+
+    def suite(self, statements):
+        emitted = len(self.lines)
+        for stmt in statements:
+            stmt.accept(self)
+
+        if len(self.lines) == emitted:
+            self.emit("pass")
+
+    def temp(self):
+        self.temps = self.temps + 1
+        return f"_t{self.temps}"
+
+    def expression(self, expr):
+        return expr.accept(self)
+
+    def condition(self, expr):
+        code, kind = self.expression(expr)
+        if kind == "bool":
+            return code
+
+        t = self.temp()
+        return f"({t} := {code}) is not None and {t} is not False"
+
+    def visit_block_stmt(self, stmt):
+        for statement in stmt.statements:
+            statement.accept(self)
+
+    def visit_class_stmt(self, stmt):
+        self.line = stmt.name.line
+        variable = self.analysis.decls[stmt]
+
+        superclass = "None"
+        if stmt.superclass is not None:
+            code, _ = self.expression(stmt.superclass)
+            self.line = stmt.superclass.name.line
+            superclass = self.analysis.super_of[stmt].py_name
+            self.emit(f"{superclass} = _superclass({code}, {self.line})")
+
+        self.line = stmt.name.line
+        if variable.boxed:
+            self.emit(f"{variable.py_name} = [None]")
+        else:
+            self.emit(f"{variable.py_name} = None")
+
+        methods = {}
+        for method in stmt.methods:
+            methods[method.name.lexeme] = self.function_def(method)
+
+        entries = ", ".join(f"{'f_' + name!r}: {code}" for name, code in methods.items())
+        klass = f"_make_class({stmt.name.lexeme!r}, {superclass}, {{{entries}}})"
+        self.line = stmt.name.line
+        self.assign_statement(variable, klass)
+
+    def visit_expression_stmt(self, stmt):
+        self.expression_statement(stmt.expression)
+
+    def expression_statement(self, expression):
+        if isinstance(expression, AssignExpr):
+            value, _ = self.expression(expression.value)
+            self.line = expression.name.line
+            variable = self.analysis.refs[expression]
+            if variable.is_global and not self.strictly_reads(
+                expression.value, variable
+            ):
+                check = self.mark(variable.py_name, expression.name)
+                value = f"({value}, {check})[0]"
+            self.assign_statement(variable, value)
+        elif isinstance(expression, SetExpr):
+            objekt = self.instance(
+                expression.objekt, "Only instances have fields.", expression.name
+            )
+            value, _ = self.expression(expression.value)
+            self.line = expression.name.line
+            self.emit(f"{objekt}.f_{expression.name.lexeme} = {value}")
+        else:
+            code, _ = self.expression(expression)
+            self.emit(code)
+
+    def visit_function_stmt(self, stmt):
+        self.line = stmt.name.line
+        variable = self.analysis.decls[stmt]
+
+        if variable.boxed:
+            self.emit(f"{variable.py_name} = [None]")
+
+        name = self.function_def(stmt)
+        self.line = stmt.name.line
+        self.assign_statement(variable, name)
+
+    def visit_if_stmt(self, stmt):
+        self.emit(f"if {self.condition(stmt.condition)}:")
+        self.indent = self.indent + 1
+        self.suite([stmt.then_branch])
+        self.indent = self.indent - 1
+
+        if stmt.else_branch is not None:
+            self.emit("else:")
+            self.indent = self.indent + 1
+            self.suite([stmt.else_branch])
+            self.indent = self.indent - 1
+
+    def visit_print_stmt(self, stmt):
+        code, kind = self.expression(stmt.expression)
+        if kind == "str":
+            self.emit(f"print({code})")
+        else:
+            self.emit(f"print(_str({code}))")
+
+    def visit_return_stmt(self, stmt):
+        self.line = stmt.keyword.line
+
+        if self.is_initializer:
+            self.emit(f"return {self.this.py_name}")
+        elif stmt.value is None:
+            self.emit("return None")
+        else:
+            code, _ = self.expression(stmt.value)
+            self.emit(f"return {code}")
+
+    def visit_var_stmt(self, stmt):
+        value = "None"
+        if stmt.initializer is not None:
+            value, _ = self.expression(stmt.initializer)
+
+        self.line = stmt.name.line
+        variable = self.analysis.decls[stmt]
+        if variable.boxed:
+            self.emit(f"{variable.py_name} = [{value}]")
+        else:
+            self.emit(f"{variable.py_name} = {value}")
+
+    def visit_for_stmt(self, stmt):
+        if stmt.initializer is not None:
+            stmt.initializer.accept(self)
+
+        self.emit(f"while {self.condition(stmt.condition)}:")
+        self.indent = self.indent + 1
+        self.suite([stmt.body])
+        if stmt.increment is not None:
+            self.expression_statement(stmt.increment)
+        self.indent = self.indent - 1
+
+    def visit_while_stmt(self, stmt):
+        self.emit(f"while {self.condition(stmt.condition)}:")
+        self.indent = self.indent + 1
+        self.suite([stmt.body])
+        self.indent = self.indent - 1
+
+    def visit_assign_expr(self, expr):
+        value, kind = self.expression(expr.value)
+        self.line = expr.name.line
+        variable = self.analysis.refs[expr]
+        name = variable.py_name
+
+        if variable.is_global:
+            if not self.strictly_reads(expr.value, variable):
+                value = f"({value}, {self.mark(name, expr.name)})[0]"
+            return f"({name} := {value})", kind
+
+        if variable.boxed:
+            return f"_set_box({name}, {value})", kind
+
+        return f"({name} := {value})", kind
+
+    def visit_binary_expr(self, expr):
+        left, left_kind = self.expression(expr.left)
+        right, right_kind = self.expression(expr.right)
+        self.line = expr.operator.line
+        ttype = expr.operator.ttype
+
+        if ttype == LoxTokenType.EQUAL_EQUAL:
+            return f"({left} == {right})", "bool"
+
+        if ttype == LoxTokenType.BANG_EQUAL:
+            return f"({left} != {right})", "bool"
+
+        if ttype == LoxTokenType.PLUS:
+            if left_kind == right_kind and left_kind in ("num", "str"):
+                return f"({left} + {right})", left_kind
+
+            a = self.temp()
+            b = self.temp()
+            return (
+                f"({a} + {b} if type({a} := {left}) is type({b} := {right}) "
+                f"and (type({a}) is float or type({a}) is str) "
+                f"else _fail({self.line}, "
+                "'Operands must be two numbers or two strings.'))",
+                None,
+            )
+
+        operator, kind = NUMBER_OPERATORS[ttype]
+
+        if left_kind == "num" and right_kind == "num":
+            return f"({left} {operator} {right})", kind
+
+        error = f"_fail({self.line}, 'Operands must be numbers.')"
+
+        # A literal operand can't have side effects, so only the other one
+        # needs checking.
+        if right_kind == "num" and expr.right.__class__.__name__ == "LiteralExpr":
+            a = self.temp()
+            return (
+                f"({a} {operator} {right} if type({a} := {left}) is float "
+                f"else {error})",
+                kind,
+            )
+
+        if left_kind == "num" and expr.left.__class__.__name__ == "LiteralExpr":
+            b = self.temp()
+            return (
+                f"({left} {operator} {b} if type({b} := {right}) is float "
+                f"else {error})",
+                kind,
+            )
+
+        a = self.temp()
+        b = self.temp()
+        return (
+            f"({a} {operator} {b} if type({a} := {left}) is type({b} := {right}) "
+            f"is float else {error})",
+            kind,
+        )
+
+    def visit_call_expr(self, expr):
+        callee, _ = self.expression(expr.callee)
+        arguments = [self.expression(argument)[0] for argument in expr.arguments]
+        self.line = expr.paren.line
+
+        t = self.temp()
+        temps = [self.temp() for _ in arguments]
+        argc = len(arguments)
+
+        # Method calls are bound methods, whose code also counts the receiver.
+        if isinstance(expr.callee, GetExpr):
+            fast_check = (
+                f"type({t}) is MethodType and {t}.__code__.co_argcount == {argc + 1}"
+            )
+        else:
+            fast_check = (
+                f"type({t}) is FunctionType and {t}.__code__.co_argcount == {argc}"
+            )
+
+        evaluate = ", ".join(
+            [f"({t} := {callee})"]
+            + [f"({temp} := {argument})" for temp, argument in zip(temps, arguments)]
+        )
+        passed = ", ".join(temps)
+        slow_arguments = "".join(f", {temp}" for temp in temps)
+
+        return (
+            f"({t}({passed}) if ({evaluate},) and {fast_check} "
+            f"else _call({t}, {self.line}{slow_arguments}))",
+            None,
+        )
+
+    def visit_get_expr(self, expr):
+        objekt = self.instance(
+            expr.objekt, "Only instances have properties.", expr.name
+        )
+        return self.mark(f"{objekt}.f_{expr.name.lexeme}", expr.name), None
+
+    def visit_grouping_expr(self, expr):
+        return self.expression(expr.expression)
+
+    def visit_literal_expr(self, expr):
+        value = expr.value
+
+        if value is None:
+            return "None", None
+
+        if isinstance(value, bool):
+            return repr(value), "bool"
+
+        if isinstance(value, float):
+            return repr(value), "num"
+
+        return repr(value), "str"
+
+    def visit_logical_expr(self, expr):
+        left, left_kind = self.expression(expr.left)
+        right, right_kind = self.expression(expr.right)
+        kind = left_kind if left_kind == right_kind else None
+
+        if expr.operator.ttype == LoxTokenType.OR:
+            if left_kind == "bool":
+                return f"({left} or {right})", kind
+
+            t = self.temp()
+            return (
+                f"({t} if ({t} := {left}) is not None and {t} is not False "
+                f"else {right})",
+                kind,
+            )
+
+        if left_kind == "bool":
+            return f"({left} and {right})", kind
+
+        t = self.temp()
+        return f"({t} if ({t} := {left}) is None or {t} is False else {right})", kind
+
+    def visit_set_expr(self, expr):
+        value, kind = self.expression(expr.value)
+        self.line = expr.name.line
+        field = f"'f_{expr.name.lexeme}'"
+
+        if isinstance(expr.objekt, ThisExpr):
+            objekt, _ = self.expression(expr.objekt)
+            return f"_set_field({objekt}, {field}, {value})", kind
+
+        objekt, _ = self.expression(expr.objekt)
+        self.line = expr.name.line
+        t = self.temp()
+        return (
+            f"(_set_field({t}, {field}, {value}) "
+            f"if isinstance({t} := {objekt}, LoxObject) "
+            f"else _fail({self.line}, 'Only instances have fields.'))",
+            kind,
+        )
+
+    def visit_super_expr(self, expr):
+        self.line = expr.method.line
+        superclass = self.analysis.refs[expr].py_name
+        this = self.analysis.super_this[expr].py_name
+        return (
+            f"_super({superclass}, {this}, 'f_{expr.method.lexeme}', {self.line})",
+            None,
+        )
+
+    def visit_this_expr(self, expr):
+        self.line = expr.keyword.line
+        return self.analysis.refs[expr].py_name, None
+
+    def visit_unary_expr(self, expr):
+        right, kind = self.expression(expr.right)
+        self.line = expr.operator.line
+
+        if expr.operator.ttype == LoxTokenType.BANG:
+            if kind == "bool":
+                return f"(not {right})", "bool"
+
+            t = self.temp()
+            return f"(({t} := {right}) is None or {t} is False)", "bool"
+
+        if kind == "num":
+            return f"(-{right})", "num"
+
+        t = self.temp()
+        return (
+            f"(-{t} if type({t} := {right}) is float "
+            f"else _fail({self.line}, 'Operand must be a number.'))",
+            "num",
+        )
+
+    def visit_variable_expr(self, expr):
+        self.line = expr.name.line
+        variable = self.analysis.refs[expr]
+
+        if variable.boxed:
+            return f"{variable.py_name}[0]", None
+
+        if variable.is_global:
+            return self.mark(variable.py_name, expr.name), None
+
+        return variable.py_name, None
+
+    def instance(self, expr, message, token):
+        """Returns code for expr that fails with message on the line of
+        token unless it's an instance.
+
+        Code for "this" is returned as is; it is always an instance.
+        """
+        code, _ = self.expression(expr)
+        self.line = token.line
+        if isinstance(expr, ThisExpr):
+            return code
+
+        t = self.temp()
+        return (
+            f"({t} if isinstance({t} := {code}, LoxObject) "
+            f"else _fail({self.line}, {message!r}))"
+        )
+
+    def assign_statement(self, variable, value):
+        if variable.boxed:
+            self.emit(f"{variable.py_name}[0] = {value}")
+        else:
+            self.emit(f"{variable.py_name} = {value}")
+
+    def function_def(self, stmt):
+        """Emits a def for a function or method and returns its Python name."""
+        info = self.analysis.functions[stmt]
+        this = self.analysis.this_of.get(stmt)
+
+        parameters = [variable.py_name for variable in self.analysis.params[stmt]]
+        if this is not None:
+            parameters.insert(0, this.py_name)
+
+        if info.free:
+            parameters.append("*")
+            parameters.extend(f"{v.py_name}={v.py_name}" for v in info.free)
+
+        name = "f_" + stmt.name.lexeme
+        self.line = stmt.name.line
+        self.emit(f"def {name}({', '.join(parameters)}):")
+
+        enclosing = (self.function, self.this, self.is_initializer, self.temps)
+        self.function = info
+        self.this = this
+        self.is_initializer = this is not None and stmt.name.lexeme == "init"
+        self.temps = 0
+        self.indent = self.indent + 1
+
+        self.emit_globals(info)
+        for variable in self.analysis.params[stmt]:
+            if variable.boxed:
+                self.emit(f"{variable.py_name} = [{variable.py_name}]")
+
+        self.suite(stmt.body)
+        if self.is_initializer:
+            self.emit(f"return {this.py_name}")
+
+        self.indent = self.indent - 1
+        self.function, self.this, self.is_initializer, self.temps = enclosing
+        return name
+
+    def strictly_reads(self, expr, variable):
+        """Whether evaluating expr always reads variable.
+
+        Reading an undefined global raises the same error as assigning it,
+        so an assignment like "x = x + 1" needs no separate check.
+        """
+        if not isinstance(expr, Expr):
+            return False
+
+        name = expr.__class__.__name__
+        if name == "VariableExpr":
+            return self.analysis.refs[expr] is variable
+        if name == "BinaryExpr":
+            return self.strictly_reads(expr.left, variable) or self.strictly_reads(
+                expr.right, variable
+            )
+        if name == "UnaryExpr":
+            return self.strictly_reads(expr.right, variable)
+        if name == "GroupingExpr":
+            return self.strictly_reads(expr.expression, variable)
+        if name == "LogicalExpr":
+            return self.strictly_reads(expr.left, variable)
+
+        return False
+
+
+class PythonInterpreter:
+    """Runs programs by transpiling them to Python and executing the result.
+
+    With output_dir set, each generated module is written there, named
+    after a hash of its source, and loaded through the standard source
+    loader so that CPython caches its bytecode in __pycache__.
+    """
+
+    def __init__(self, output_dir=None):
+        self.output_dir = output_dir
+        self.namespace = {"__name__": "__lox__"}
+        exec(HEADER, self.namespace)
+        self.line_tables = {}
+        self.column_tables = {}
+        self.programs = 0
+
+    def interpret(self, statements):
+        source = Transpiler().transpile(statements)
+        code = self.load(source)
+
+        try:
+            exec(code, self.namespace)
+            self.line_tables[code.co_filename] = self.namespace["_LOX_LINES"]
+            self.column_tables[code.co_filename] = self.namespace["_LOX_COLUMNS"]
+            self.namespace["_main"]()
+        except LoxRuntimeError as error:
+            self.report(error)
+        except NameError as error:
+            if error.name is None or not error.name.startswith("g_"):
+                raise
+            self.report(self.error(error, f"Undefined variable {error.name[2:]}."))
+        except AttributeError as error:
+            if error.name is None or not error.name.startswith("f_"):
+                raise
+            self.report(self.error(error, f"Undefined property '{error.name[2:]}'."))
+
+    def load(self, source):
+        if self.output_dir is None:
+            self.programs = self.programs + 1
+            return compile(source, f"<lox-{self.programs}>", "exec")
+
+        name = "lox_" + sha1(source.encode()).hexdigest()[:16]
+        path = os.path.join(self.output_dir, name + ".py")
+
+        if not os.path.exists(path):
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(path, "w") as f:
+                f.write(source)
+
+        return SourceFileLoader(name, path).get_code(name)
+
+    def error(self, exception, message):
+        # The innermost frame that belongs to generated code is where the
+        # Lox error happened.
+        line = 0
+        traceback = exception.__traceback__
+        while traceback is not None:
+            code = traceback.tb_frame.f_code
+            table = self.line_tables.get(code.co_filename)
+            if table is not None:
+                line = table[traceback.tb_lineno - 1]
+                columns = self.column_tables[code.co_filename].get(
+                    traceback.tb_lineno
+                )
+                if columns is not None and hasattr(code, "co_positions"):
+                    # The read that failed is the one its instruction ends at.
+                    positions = list(code.co_positions())
+                    end = positions[traceback.tb_lasti // 2][3]
+                    line = columns.get(end, line)
+            traceback = traceback.tb_next
+
+        return LoxRuntimeError(LoxToken(LoxTokenType.EOF, "", None, line), message)
+
+    def report(self, error):
+        from lox import Lox
+
+        Lox.runtime_error(error)
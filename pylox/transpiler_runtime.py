@@ -0,0 +1,150 @@
+# Support code imported by the Python modules the Transpiler generates:
+# value formatting, the slow paths of calls, class construction and the
+# runtime errors that inline guards fall back to.
+
+from time import time_ns
+from types import FunctionType, MethodType
+
+from lox_runtime_error import LoxRuntimeError
+from lox_token import LoxToken
+from lox_token_type import LoxTokenType
+
+
+__all__ = [
+    "FunctionType",
+    "MethodType",
+    "LoxObject",
+    "_fail",
+    "_str",
+    "_call",
+    "_set_field",
+    "_set_box",
+    "_superclass",
+    "_super",
+    "_make_class",
+    "g_clock",
+]
+
+
+class LoxObject:
+    """Base class of every Python class generated from a Lox class.
+
+    Lox fields and methods are stored as Python attributes with an "f_"
+    prefix, so an instance field shadows a method of the same name just
+    like it does in Lox.
+    """
+
+    arity = 0
+
+    def __str__(self):
+        return type(self).__name__ + " instance"
+
+
+def _error(line, message):
+    return LoxRuntimeError(LoxToken(LoxTokenType.EOF, "", None, line), message)
+
+
+def _fail(line, message):
+    raise _error(line, message)
+
+
+def _str(value):
+    if value is None:
+        return "nil"
+
+    if value is True:
+        return "true"
+
+    if value is False:
+        return "false"
+
+    kind = type(value)
+
+    if kind is float:
+        text = str(value)
+        if text.endswith(".0"):
+            text = text[: len(text) - 2]
+        return text
+
+    if value is f_clock:
+        return "<native fn>"
+
+    if kind is FunctionType or kind is MethodType:
+        return f"<fn {value.__name__[2:]}>"
+
+    if isinstance(value, type):
+        return value.__name__
+
+    return str(value)
+
+
+def _arity(callee, line):
+    kind = type(callee)
+
+    if kind is FunctionType:
+        return callee.__code__.co_argcount
+
+    if kind is MethodType:
+        return callee.__code__.co_argcount - 1
+
+    if isinstance(callee, type) and issubclass(callee, LoxObject):
+        return callee.arity
+
+    raise _error(line, "Can only call functions and classes.")
+
+
+def _call(callee, line, *arguments):
+    arity = _arity(callee, line)
+
+    if len(arguments) != arity:
+        raise _error(line, f"Expected {arity} arguments but got {len(arguments)}.")
+
+    return callee(*arguments)
+
+
+def _set_field(instance, name, value):
+    setattr(instance, name, value)
+    return value
+
+
+def _set_box(box, value):
+    box[0] = value
+    return value
+
+
+def _superclass(value, line):
+    if isinstance(value, type) and issubclass(value, LoxObject):
+        return value
+
+    raise _error(line, "Superclass must be a class.")
+
+
+def _super(superclass, instance, name, line):
+    method = getattr(superclass, name, None)
+
+    if method is None:
+        raise _error(line, f"Undefined property '{name[2:]}'.")
+
+    return MethodType(method, instance)
+
+
+def _make_class(name, superclass, methods):
+    klass = type(name, (superclass or LoxObject,), methods)
+    initializer = getattr(klass, "f_init", None)
+
+    if initializer is not None:
+        klass.arity = initializer.__code__.co_argcount - 1
+
+        def __init__(self, *arguments):
+            initializer(self, *arguments)
+
+        klass.__init__ = __init__
+
+    return klass
+
+
+def f_clock():
+    return float(time_ns() // 1000_000)
+
+
+g_clock = f_clock
@@ -0,0 +1,450 @@
+from compiler import Compiler
+from lox_chunk import OpCode
+from lox_class import LoxClass
+from lox_instance import LoxInstance
+from lox_native import Clock
+from lox_runtime_error import LoxRuntimeError
+from lox_token import LoxToken
+from lox_token_type import LoxTokenType
+
+
+FRAMES_MAX = 256
+
+OP_CONSTANT = OpCode.CONSTANT.value
+OP_NIL = OpCode.NIL.value
+OP_TRUE = OpCode.TRUE.value
+OP_FALSE = OpCode.FALSE.value
+OP_POP = OpCode.POP.value
+OP_GET_LOCAL = OpCode.GET_LOCAL.value
+OP_SET_LOCAL = OpCode.SET_LOCAL.value
+OP_GET_GLOBAL = OpCode.GET_GLOBAL.value
+OP_DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+OP_SET_GLOBAL = OpCode.SET_GLOBAL.value
+OP_GET_UPVALUE = OpCode.GET_UPVALUE.value
+OP_SET_UPVALUE = OpCode.SET_UPVALUE.value
+OP_GET_PROPERTY = OpCode.GET_PROPERTY.value
+OP_SET_PROPERTY = OpCode.SET_PROPERTY.value
+OP_GET_SUPER = OpCode.GET_SUPER.value
+OP_EQUAL = OpCode.EQUAL.value
+OP_NOT_EQUAL = OpCode.NOT_EQUAL.value
+OP_GREATER = OpCode.GREATER.value
+OP_GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+OP_LESS = OpCode.LESS.value
+OP_LESS_EQUAL = OpCode.LESS_EQUAL.value
+OP_ADD = OpCode.ADD.value
+OP_SUBTRACT = OpCode.SUBTRACT.value
+OP_MULTIPLY = OpCode.MULTIPLY.value
+OP_DIVIDE = OpCode.DIVIDE.value
+OP_NOT = OpCode.NOT.value
+OP_NEGATE = OpCode.NEGATE.value
+OP_PRINT = OpCode.PRINT.value
+OP_JUMP = OpCode.JUMP.value
+OP_JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+OP_CALL = OpCode.CALL.value
+OP_INVOKE = OpCode.INVOKE.value
+OP_SUPER_INVOKE = OpCode.SUPER_INVOKE.value
+OP_CLOSURE = OpCode.CLOSURE.value
+OP_CLOSE_UPVALUE = OpCode.CLOSE_UPVALUE.value
+OP_RETURN = OpCode.RETURN.value
+OP_CLASS = OpCode.CLASS.value
+OP_INHERIT = OpCode.INHERIT.value
+OP_METHOD = OpCode.METHOD.value
+
+
+class Upvalue:
+    """A captured variable.
+
+    While the variable is still live on the VM stack, location is the
+    stack itself and index its slot. Closing the upvalue moves the value
+    into a one-element list of its own, so reads and writes are the same
+    indexing operation either way.
+    """
+
+    __slots__ = ("location", "index")
+
+    def __init__(self, stack, index):
+        self.location = stack
+        self.index = index
+
+    def close(self):
+        self.location = [self.location[self.index]]
+        self.index = 0
+
+
+class Closure:
+    __slots__ = ("function", "upvalues")
+
+    def __init__(self, function, upvalues):
+        self.function = function
+        self.upvalues = upvalues
+
+    def __str__(self):
+        return str(self.function)
+
+
+class BoundMethod:
+    __slots__ = ("receiver", "method")
+
+    def __init__(self, receiver, method):
+        self.receiver = receiver
+        self.method = method
+
+    def __str__(self):
+        return str(self.method)
+
+
+class VM:
+    def __init__(self):
+        self.globals = {"clock": Clock()}
+        self.stack = []
+        self.open_upvalues = {}
+
+    def interpret(self, statements):
+        function = Compiler().compile(statements)
+
+        try:
+            self.run(Closure(function, []))
+        except LoxRuntimeError as error:
+            from lox import Lox
+
+            Lox.runtime_error(error)
+        finally:
+            del self.stack[:]
+            self.open_upvalues.clear()
+
+    def run(self, closure):
+        stack = self.stack
+        globals_ = self.globals
+        frames = []
+
+        stack.append(closure)
+        function = closure.function
+        code = function.chunk.code
+        constants = function.chunk.constants
+        upvalues = closure.upvalues
+        base = 0
+        ip = 0
+
+        try:
+            while True:
+                op = code[ip]
+                ip = ip + 1
+
+                if op == OP_GET_LOCAL:
+                    stack.append(stack[base + code[ip]])
+                    ip = ip + 1
+                elif op == OP_CONSTANT:
+                    stack.append(constants[code[ip]])
+                    ip = ip + 1
+                elif op == OP_GET_GLOBAL:
+                    name = constants[code[ip]]
+                    ip = ip + 1
+                    try:
+                        stack.append(globals_[name])
+                    except KeyError:
+                        raise LoxRuntimeError(None, f"Undefined variable {name}.")
+                elif op == OP_POP:
+                    stack.pop()
+                elif op == OP_JUMP_IF_FALSE:
+                    value = stack[-1]
+                    if value is None or value is False:
+                        ip = code[ip]
+                    else:
+                        ip = ip + 1
+                elif op == OP_JUMP:
+                    ip = code[ip]
+                elif op == OP_SET_LOCAL:
+                    stack[base + code[ip]] = stack[-1]
+                    ip = ip + 1
+                elif op == OP_ADD:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is float and type(b) is float:
+                        stack[-1] = a + b
+                    elif type(a) is str and type(b) is str:
+                        stack[-1] = a + b
+                    else:
+                        raise LoxRuntimeError(
+                            None, "Operands must be two numbers or two strings."
+                        )
+                elif op == OP_SUBTRACT:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(None, "Operands must be numbers.")
+                    stack[-1] = a - b
+                elif op == OP_LESS:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(None, "Operands must be numbers.")
+                    stack[-1] = a < b
+                elif op == OP_LESS_EQUAL:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(None, "Operands must be numbers.")
+                    stack[-1] = a <= b
+                elif op == OP_GREATER:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(None, "Operands must be numbers.")
+                    stack[-1] = a > b
+                elif op == OP_GREATER_EQUAL:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(None, "Operands must be numbers.")
+                    stack[-1] = a >= b
+                elif op == OP_MULTIPLY:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(None, "Operands must be numbers.")
+                    stack[-1] = a * b
+                elif op == OP_DIVIDE:
+                    b = stack.pop()
+                    a = stack[-1]
+                    if type(a) is not float or type(b) is not float:
+                        raise LoxRuntimeError(None, "Operands must be numbers.")
+                    stack[-1] = a / b
+                elif op == OP_EQUAL:
+                    b = stack.pop()
+                    stack[-1] = stack[-1] == b
+                elif op == OP_NOT_EQUAL:
+                    b = stack.pop()
+                    stack[-1] = stack[-1] != b
+                elif op == OP_GET_UPVALUE:
+                    upvalue = upvalues[code[ip]]
+                    stack.append(upvalue.location[upvalue.index])
+                    ip = ip + 1
+                elif op == OP_SET_UPVALUE:
+                    upvalue = upvalues[code[ip]]
+                    upvalue.location[upvalue.index] = stack[-1]
+                    ip = ip + 1
+                elif op == OP_CALL or op == OP_INVOKE or op == OP_SUPER_INVOKE:
+                    if op == OP_CALL:
+                        argc = code[ip]
+                        ip = ip + 1
+                        callee = stack[-1 - argc]
+                        if type(callee) is not Closure:
+                            callee = self.call_value(callee, argc)
+                    elif op == OP_INVOKE:
+                        name = constants[code[ip]]
+                        argc = code[ip + 1]
+                        ip = ip + 2
+                        callee = self.invoke(name, argc)
+                    else:
+                        name = constants[code[ip]]
+                        argc = code[ip + 1]
+                        ip = ip + 2
+                        callee = self.find_method(stack.pop(), name)
+
+                    # Natives and classes without an initializer complete
+                    # immediately; everything else pushes a new frame.
+                    if callee is not None:
+                        function = callee.function
+                        if argc != function.arity:
+                            raise LoxRuntimeError(
+                                None,
+                                f"Expected {function.arity} arguments but got {argc}.",
+                            )
+                        if len(frames) == FRAMES_MAX:
+                            raise LoxRuntimeError(None, "Stack overflow.")
+
+                        frames.append((closure, ip, base))
+                        closure = callee
+                        code = function.chunk.code
+                        constants = function.chunk.constants
+                        upvalues = callee.upvalues
+                        base = len(stack) - argc - 1
+                        ip = 0
+                elif op == OP_RETURN:
+                    result = stack.pop()
+                    if self.open_upvalues:
+                        self.close_upvalues(base)
+
+                    del stack[base:]
+                    if not frames:
+                        return
+
+                    stack.append(result)
+                    closure, ip, base = frames.pop()
+                    function = closure.function
+                    code = function.chunk.code
+                    constants = function.chunk.constants
+                    upvalues = closure.upvalues
+                elif op == OP_NIL:
+                    stack.append(None)
+                elif op == OP_TRUE:
+                    stack.append(True)
+                elif op == OP_FALSE:
+                    stack.append(False)
+                elif op == OP_NOT:
+                    value = stack[-1]
+                    stack[-1] = value is None or value is False
+                elif op == OP_NEGATE:
+                    value = stack[-1]
+                    if type(value) is not float:
+                        raise LoxRuntimeError(None, "Operand must be a number.")
+                    stack[-1] = -value
+                elif op == OP_PRINT:
+                    print(self.stringify(stack.pop()))
+                elif op == OP_SET_GLOBAL:
+                    name = constants[code[ip]]
+                    ip = ip + 1
+                    if name not in globals_:
+                        raise LoxRuntimeError(None, f"Undefined variable {name}.")
+                    globals_[name] = stack[-1]
+                elif op == OP_DEFINE_GLOBAL:
+                    globals_[constants[code[ip]]] = stack.pop()
+                    ip = ip + 1
+                elif op == OP_GET_PROPERTY:
+                    instance = stack[-1]
+                    if not isinstance(instance, LoxInstance):
+                        raise LoxRuntimeError(None, "Only instances have properties.")
+
+                    name = constants[code[ip]]
+                    ip = ip + 1
+                    slot = instance.shape.slots.get(name)
+                    if slot is not None:
+                        stack[-1] = instance.values[slot]
+                    else:
+                        stack[-1] = BoundMethod(
+                            instance, self.find_method(instance.shape.klass, name)
+                        )
+                elif op == OP_SET_PROPERTY:
+                    value = stack.pop()
+                    instance = stack[-1]
+                    if not isinstance(instance, LoxInstance):
+                        raise LoxRuntimeError(None, "Only instances have fields.")
+
+                    instance.set_field(constants[code[ip]], value)
+                    stack[-1] = value
+                    ip = ip + 1
+                elif op == OP_GET_SUPER:
+                    superclass = stack.pop()
+                    method = self.find_method(superclass, constants[code[ip]])
+                    stack[-1] = BoundMethod(stack[-1], method)
+                    ip = ip + 1
+                elif op == OP_CLOSURE:
+                    function = constants[code[ip]]
+                    ip = ip + 1
+                    captured = []
+                    for _ in range(function.upvalue_count):
+                        if code[ip]:
+                            captured.append(self.capture_upvalue(base + code[ip + 1]))
+                        else:
+                            captured.append(upvalues[code[ip + 1]])
+                        ip = ip + 2
+                    stack.append(Closure(function, captured))
+                elif op == OP_CLOSE_UPVALUE:
+                    self.close_upvalues(len(stack) - 1)
+                    stack.pop()
+                elif op == OP_CLASS:
+                    stack.append(LoxClass(constants[code[ip]], None, {}))
+                    ip = ip + 1
+                elif op == OP_INHERIT:
+                    superclass = stack[-2]
+                    if not isinstance(superclass, LoxClass):
+                        raise LoxRuntimeError(None, "Superclass must be a class.")
+
+                    stack.pop().inherit(superclass)
+                elif op == OP_METHOD:
+                    method = stack.pop()
+                    stack[-1].add_method(constants[code[ip]], method)
+                    ip = ip + 1
+                else:
+                    raise RuntimeError(f"Unknown opcode {op}.")
+        except LoxRuntimeError as error:
+            if error.token is None:
+                line = closure.function.chunk.lines[ip - 1]
+                error.token = LoxToken(LoxTokenType.EOF, "", None, line)
+            raise
+
+    def call_value(self, callee, argc):
+        """Prepares a call to anything that isn't a plain closure.
+
+        Returns the closure to run in a new frame, or None if the call has
+        already completed and its result replaced the callee on the stack.
+        """
+        stack = self.stack
+
+        if isinstance(callee, BoundMethod):
+            stack[-1 - argc] = callee.receiver
+            return callee.method
+
+        if isinstance(callee, LoxClass):
+            stack[-1 - argc] = LoxInstance(callee)
+            initializer = callee.initializer
+            if initializer is not None:
+                return initializer
+
+            if argc != 0:
+                raise LoxRuntimeError(None, f"Expected 0 arguments but got {argc}.")
+
+            return None
+
+        if hasattr(callee, "call"):
+            if argc != callee.arity():
+                raise LoxRuntimeError(
+                    None, f"Expected {callee.arity()} arguments but got {argc}."
+                )
+
+            arguments = stack[len(stack) - argc :]
+            del stack[len(stack) - argc - 1 :]
+            stack.append(callee.call(self, arguments))
+            return None
+
+        raise LoxRuntimeError(None, "Can only call functions and classes.")
+
+    def invoke(self, name, argc):
+        receiver = self.stack[-1 - argc]
+        if not isinstance(receiver, LoxInstance):
+            raise LoxRuntimeError(None, "Only instances have properties.")
+
+        # A field shadows a method of the same name.
+        slot = receiver.shape.slots.get(name)
+        if slot is not None:
+            callee = receiver.values[slot]
+            self.stack[-1 - argc] = callee
+            if type(callee) is Closure:
+                return callee
+            return self.call_value(callee, argc)
+
+        return self.find_method(receiver.shape.klass, name)
+
+    def find_method(self, klass, name):
+        method = klass.find_method(name)
+        if method is None:
+            raise LoxRuntimeError(None, f"Undefined property '{name}'.")
+
+        return method
+
+    def capture_upvalue(self, slot):
+        upvalue = self.open_upvalues.get(slot)
+        if upvalue is None:
+            upvalue = Upvalue(self.stack, slot)
+            self.open_upvalues[slot] = upvalue
+
+        return upvalue
+
+    def close_upvalues(self, last):
+        for slot in [slot for slot in self.open_upvalues if slot >= last]:
+            self.open_upvalues.pop(slot).close()
+
+    def stringify(self, value):
+        if value is None:
+            return "nil"
+
+        if isinstance(value, float):
+            text = str(value)
+            if text.endswith(".0"):
+                text = text[: len(text) - 2]
+            return text
+
+        if isinstance(value, bool):
+            return str(value).lower()
+
+        return str(value)
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+LOX = os.path.join(os.path.dirname(__file__), os.pardir, "pylox", "lox.py")
+
+
+@pytest.fixture
+def run_lox(tmp_path):
+    """Runs a Lox program with the given command-line options and returns
+    the completed process, with its output as text."""
+
+    def run(source, *options):
+        script = tmp_path / "script.lox"
+        script.write_text(source)
+        return subprocess.run(
+            [sys.executable, LOX, "--no-cache", *options, str(script)],
+            capture_output=True,
+            text=True,
+        )
+
+    return run
@@ -0,0 +1,42 @@
+import pytest
+
+
+ENGINES = ["tree", "vm", "closure", "python"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("optimize", [[], ["--no-optimize"]])
+def test_negative_zero_keeps_its_sign(run_lox, engine, optimize):
+    # The VM mustn't share a constant slot between 0 and the -0 the
+    # optimizer folds -0 into.
+    result = run_lox("var a = 0;\nprint -0;\nprint a;\n", "--engine", engine, *optimize)
+
+    assert result.returncode == 0
+    assert result.stdout == "-0\n0\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_functions_print_alike(run_lox, engine):
+    source = "fun f() {}\nclass A { m() {} }\nprint f;\nprint clock;\nprint A().m;\n"
+    result = run_lox(source, "--engine", engine)
+
+    assert result.returncode == 0
+    assert result.stdout == "<fn f>\n<native fn>\n<fn m>\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "source, error",
+    [
+        (
+            "class A {}\nvar obj = A();\nobj\n.missing\n();\n",
+            "Undefined property 'missing'.\n[line 4]\n",
+        ),
+        ("nope\n=\nnope;\n", "Undefined variable nope.\n[line 3]\n"),
+    ],
+)
+def test_runtime_errors_report_the_same_line(run_lox, engine, source, error):
+    result = run_lox(source, "--engine", engine)
+
+    assert result.returncode == 70
+    assert result.stdout == error
@@ -0,0 +1,38 @@
+SCOPE_ERROR = """\
+fun f() { var a = a; }
+print "before";
+f();
+print "after";
+"""
+
+
+def test_lazy_body_scope_error_stops_the_run(run_lox):
+    eager = run_lox(SCOPE_ERROR)
+    lazy = run_lox(SCOPE_ERROR, "--lazy")
+
+    assert eager.returncode == 65
+    assert lazy.returncode == 65
+    assert "Can't read local variable in its own initializer." in lazy.stdout
+    assert "after" not in lazy.stdout
+    assert "Traceback" not in lazy.stderr
+
+
+def test_lazy_body_syntax_error_stops_the_run(run_lox):
+    result = run_lox('fun f() { var a = ; }\nf();\nprint "after";\n', "--lazy")
+
+    assert result.returncode == 65
+    assert "Expect expression." in result.stdout
+    assert "after" not in result.stdout
+    assert "Traceback" not in result.stderr
+
+
+def test_check_syntax_reports_every_error_in_bodies(run_lox):
+    source = 'fun f() {\n  var a = ;\n  print 1;\n}\nvar = 2;\nprint "after";\n'
+    result = run_lox(source, "--lazy", "--check-syntax")
+
+    assert result.returncode == 65
+    assert result.stdout == (
+        "[line 2] Error  at ';': Expect expression.\n"
+        "[line 5] Error  at '=': Expect variable name.\n"
+    )
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,54 @@
+import pytest
+
+
+MODES = [[], ["--one-pass"]]
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize(
+    "source, error",
+    [
+        (
+            "class A { init() { return 1; } }\n",
+            "[line 1] Error  at 'return': Can't return a value from an initializer.\n",
+        ),
+        (
+            "print super.x;\n",
+            "[line 1] Error  at 'super': Can't use 'super' outside of a class.\n",
+        ),
+        (
+            "class A { m() { return super.m(); } }\n",
+            "[line 1] Error  at 'super': "
+            "Can't use 'super' in a class with no superclass.\n",
+        ),
+        (
+            "fun f() {\n  var a = 1;\n  var a = 2;\n}\n",
+            "[line 3] Error  at 'a': "
+            "Variable with this name already exists in this scope.\n",
+        ),
+        (
+            "fun f(a, a) {}\n",
+            "[line 1] Error  at 'a': "
+            "Variable with this name already exists in this scope.\n",
+        ),
+        (
+            "{ var a = a; }\n",
+            "[line 1] Error  at 'a': "
+            "Can't read local variable in its own initializer.\n",
+        ),
+    ],
+)
+def test_resolver_errors_are_reported(run_lox, mode, source, error):
+    result = run_lox(source, *mode)
+
+    assert result.returncode == 65
+    assert result.stdout == error
+    assert "Traceback" not in result.stderr
+
+
+@pytest.mark.parametrize("mode", MODES)
+def test_globals_can_be_redeclared(run_lox, mode):
+    result = run_lox("var a = 1;\nvar a = 2;\nprint a;\n", *mode)
+
+    assert result.returncode == 0
+    assert result.stdout == "2\n"
@@ -0,0 +1,10 @@
+def test_stream_reports_every_syntax_error(run_lox):
+    result = run_lox("print 1;\nvar = 2;\nprint 3;\nvar = 4;\n", "--stream")
+
+    assert result.returncode == 65
+    assert result.stdout == (
+        "1\n"
+        "[line 2] Error  at '=': Expect variable name.\n"
+        "[line 4] Error  at '=': Expect variable name.\n"
+    )
+    assert "Traceback" not in result.stderr